@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import sys
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from project import Music_Theory, Note
+
+# Output formats of the analysis: one line per song, or one record per chord
+ANALYSIS_FORMATS = ["text", "ndjson", "csv"]
+
+# Symbols ignored between the chords of a song (bar lines, repeat signs)
+SEPARATORS = {"|", "||", "|:", ":|", "/", "-", "%"}
+
+# One analysed chord: (song number, position in the song, key, chord, degree or None)
+Chord_Label = Tuple[int, int, Tuple[str, str], str, Optional[str]]
+
+
+def parse_key(text: str) -> Tuple[str, str]:
+    # "G major", "F# minor", "Eb harmonic minor", "A harmonic"... as (tonic, scale type)
+    tonic, _, variant = text.strip().partition(" ")
+    variant = " ".join(variant.split()) or "major"
+    variant = Music_Theory.normalize_scale_type(variant)
+    tonic = Note.normalize(tonic)
+
+    # Check the tonic now, rather than on the first chord of the song
+    Music_Theory.get_degree_table(tonic, variant)
+    return tonic, variant
+
+
+def read_songs(
+    lines: Iterable[str], sections: bool = False
+) -> Iterator[Tuple[int, Tuple[str, str] | None, List[str]]]:
+    # Split the input in songs, lazily: one song per line, or with sections=True, one song
+    # per group of lines separated by blank lines (then yielded line by line, so that a long
+    # section is never held in memory). Yields (song number, key, chords of that line).
+    #
+    # A "key: G major" line sets the key of the songs that follow. Comments start with "#".
+    key: Tuple[str, str] | None = None
+    song = 0
+    in_section = False
+
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            in_section = False
+            continue
+        if line.startswith("#"):
+            continue
+
+        if line[:4].lower() == "key:":
+            try:
+                key = parse_key(line[4:])
+            except ValueError as e:
+                raise ValueError(f"Line {line_number}: invalid key ({e})") from None
+            in_section = False
+            continue
+
+        if not (sections and in_section):
+            song += 1
+            in_section = True
+
+        yield song, key, [chord for chord in line.split() if chord not in SEPARATORS]
+
+
+def analyze(
+    lines: Iterable[str],
+    key: Tuple[str, str] | None = None,
+    sections: bool = False,
+) -> Iterator[Chord_Label]:
+    # Label every chord with its degree in the key of its song (None when out of key, or not
+    # a triad nor a seventh chord), as the lines are read. `key` is used for the songs before the first "key:" line, if any.
+    position = 0
+    previous_song = 0
+
+    for song, song_key, chords in read_songs(lines, sections):
+        song_key = song_key or key
+        if song_key is None:
+            raise ValueError(f"Song {song}: no key given")
+        if song != previous_song:
+            previous_song = song
+            position = 0
+
+        tonic, variant = song_key
+        for chord in chords:
+            position += 1
+            yield (
+                song,
+                position,
+                song_key,
+                chord,
+                Music_Theory.get_chord_degree(chord, tonic, variant),
+            )
+
+
+def write_analysis(labels: Iterable[Chord_Label], output_format: str = "text") -> int:
+    # Write the analysis as it is computed. In text format, each song is one line of degrees,
+    # with the chords that are out of key shown in brackets, and the chords that can't be
+    # classified (neither a triad nor a seventh chord, eg: "Gsus4", "G9") in braces: whether
+    # those are in the key is unknown ("in_key" is empty in csv, null in ndjson). Returns the
+    # number of chords out of key.
+    write = sys.stdout.write
+    out_of_key = 0
+
+    if output_format == "csv":
+        write("song,position,key,chord,degree,in_key\r\n")
+
+    song = 0
+    for song_number, position, (tonic, variant), chord, degree in labels:
+        in_key: bool | None = True
+        if degree is None:
+            in_key = None
+            if Music_Theory.classify_chord(chord) is not None:
+                in_key = False
+                out_of_key += 1
+
+        if output_format == "ndjson":
+            write(
+                json.dumps(
+                    {
+                        "song": song_number,
+                        "position": position,
+                        "key": f"{tonic} {variant}",
+                        "chord": chord,
+                        "degree": degree,
+                        "in_key": in_key,
+                    }
+                )
+                + "\n"
+            )
+        elif output_format == "csv":
+            # Chord symbols may contain a comma in some corpora, quote them if needed
+            if "," in chord or '"' in chord:
+                chord = '"' + chord.replace('"', '""') + '"'
+            write(
+                f"{song_number},{position},{tonic} {variant},{chord},{degree or ''},"
+                f"{'' if in_key is None else 'true' if in_key else 'false'}\r\n"
+            )
+        else:
+            if song_number != song:
+                if song:
+                    write("\n")
+                write(f"{tonic} {variant}:")
+                song = song_number
+            if in_key is None:
+                write(f" {{{chord}}}")
+            else:
+                write(f" {degree}" if in_key else f" [{chord}]")
+
+    if output_format == "text" and song:
+        write("\n")
+    return out_of_key
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Roman numeral analysis of chord progressions: label every chord with its degree in the key of the song, and flag the chords out of key. The file is read lazily, so it can be of any size."
+    )
+    parser.add_argument(
+        "file",
+        help="FILE of chord progressions ('-' for stdin), one song per line (or per section, with --sections). A 'key: G major' line sets the key of the songs that follow",
+    )
+    parser.add_argument(
+        "-k",
+        "--key",
+        dest="key",
+        help="KEY of the songs before the first 'key:' line (eg: 'Eb major', 'C# harmonic')",
+    )
+    parser.add_argument(
+        "--sections",
+        dest="sections",
+        action="store_true",
+        help="Songs are SECTIONS of lines, separated by blank lines",
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        dest="format",
+        choices=ANALYSIS_FORMATS,
+        default="text",
+        help="Output FORMAT (default: text, one line per song, chords out of key in brackets, chords that can't be classified in braces)",
+    )
+    args = parser.parse_args()
+
+    try:
+        key = parse_key(args.key) if args.key else None
+    except ValueError as e:
+        print(f"Invalid key: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        if args.file == "-":
+            write_analysis(analyze(sys.stdin, key, args.sections), args.format)
+        else:
+            with open(args.file, encoding="utf-8") as file:
+                write_analysis(analyze(file, key, args.sections), args.format)
+    except OSError as e:
+        print(f"Unable to read the file: {e}", file=sys.stderr)
+        sys.exit(4)
+    except ValueError as e:
+        print(f"Unable to analyse the file: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
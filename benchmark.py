@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+import project
+from project import (
+    Music_Theory,
+    Note,
+    get_chord_notes,
+    get_diatonic_chords,
+    get_scale,
+    prepare_pretty_display,
+)
+
+# Folder containing project.py, so that the benchmark can be started from anywhere
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Commands measured by the startup benchmark. Most of the time spent by a short-lived process
+# is interpreter startup and imports, not music theory, so these catch import regressions.
+STARTUP_COMMANDS = {
+    "python (empty)": [sys.executable, "-c", "pass"],
+    "import project": [sys.executable, "-c", "import project"],
+    "-s C -t major": [sys.executable, "project.py", "-s", "C", "-t", "major"],
+    "-s C -t major -d": [sys.executable, "project.py", "-s", "C", "-t", "major", "-d"],
+    "-c C#o": [sys.executable, "project.py", "-c", "C#o"],
+    "-s C -t major -d -f json": [
+        sys.executable,
+        "project.py",
+        *("-s", "C", "-t", "major", "-d", "-f", "json"),
+    ],
+}
+
+
+# Same tonics, scale types and chords as in run_all.sh
+TONICS = "C C# Db D D# Eb E F F# Gb G G# Ab A A# Bb B".split()
+TYPES = ["major", "minor", "harmonic", "melodic"]
+CHORDS = """C Cm Co C+ B#m B#o C# C#m C#o C#+ Db Dbm Dbo Db+ D Dm Do D+ Ebb C##m C##o D# D#m D#o D#+
+Eb Ebm Ebo Eb+ E Em Eo E+ Fb Fb+ E# E#m E#o F Fm Fo F+ F# F#m F#o F#+ Gb Gbm Gbo Gb+ G Gm Go G+
+F##m F##o G# G#m G#o G#+ Ab Abm Abo Ab+ A Am Ao A+ G##o Bbb Bbb+ A# A#m A#o A#+ Bb Bbm Bbo Bb+ B Bm
+Bo B+ Cb Cbm Cb+""".split()
+
+# Chords and numbers of voices of the voicing benchmark, voiced between C2 and C6 within two
+# octaves (the defaults of Music_Theory.get_voicings)
+VOICINGS = [
+    ("Cmaj7", 4),
+    ("G7b9", 5),
+    ("Cmaj7", 5),
+    ("C9", 5),
+    ("Cmaj7", 6),
+    ("C9", 6),
+    ("C11", 6),
+]
+
+# Command lines used for the end-to-end main() benchmark, same as run_all.sh
+MAIN_ARGUMENTS = [
+    ["-s", tonic, "-t", scale_type, *extra]
+    for tonic in TONICS
+    for scale_type in TYPES
+    for extra in ([], ["-d"], ["-d", "-v"])
+] + [["-c", chord, *extra] for chord in CHORDS for extra in ([], ["-v"])]
+
+
+def time_to_first_output(command: List[str]) -> float:
+    # Start the command and return the number of seconds until it prints its first byte
+    # (or exits, for commands that print nothing)
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        command, cwd=PROJECT_DIR, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    assert process.stdout is not None
+    process.stdout.read(1)
+    elapsed = time.perf_counter() - started
+
+    _, errors = process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(
+            f"{' '.join(command)} failed: {errors.decode(errors='replace')}"
+        )
+    return elapsed
+
+
+def bench_startup(runs: int) -> Dict[str, Dict[str, float]]:
+    # Run each command `runs` times (after one warm-up run), report the times in milliseconds
+    results = {}
+    for name, command in STARTUP_COMMANDS.items():
+        time_to_first_output(command)
+        times = [time_to_first_output(command) * 1000 for _ in range(runs)]
+        results[name] = {
+            "min_ms": min(times),
+            "median_ms": statistics.median(times),
+            "max_ms": max(times),
+        }
+    return results
+
+
+def bench_get_scales(copies: int) -> Dict[str, float]:
+    # Compare Music_Theory.get_scales() with the scalar compute_scale(), on a grid made of
+    # `copies` copies of every tonic spelling (up to triple sharps/flats) times every scale type
+    # of the major and minor keys (KEY_SCALES).
+    # Raises an AssertionError if the results are not identical. Times are in milliseconds.
+    tonics = [
+        Note.render(letter, accidentals)
+        for accidentals in range(-3, 4)
+        for letter in range(7)
+    ] * copies
+    variants = list(Music_Theory.KEY_SCALES)
+
+    # Warm-up, so that the time needed to import numpy is not included
+    Music_Theory.get_scales(tonics[:1], variants).to_lists()
+
+    started = time.perf_counter()
+    expected = [
+        Music_Theory.compute_scale(tonic, variant)
+        for tonic in tonics
+        for variant in variants
+    ]
+    scalar = time.perf_counter() - started
+
+    started = time.perf_counter()
+    table = Music_Theory.get_scales(tonics, variants)
+    arrays = time.perf_counter() - started
+    notes = table.to_lists()
+    rendered = time.perf_counter() - started
+
+    assert notes == expected, "get_scales() and compute_scale() results differ"
+    return {
+        "scales": len(table),
+        "scalar_ms": scalar * 1000,
+        "arrays_ms": arrays * 1000,
+        "rendered_ms": rendered * 1000,
+    }
+
+
+def bench_voicings(runs: int) -> Dict[str, Dict[str, float]]:
+    # Time to the first voicing and time to enumerate all of them, for each chord of VOICINGS
+    # (median of `runs` runs, in milliseconds), along with the number of voicings
+    results = {}
+    for chord, voices in VOICINGS:
+        first_times = []
+        total_times = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            voicings = Music_Theory.get_voicings(chord, voices)
+            count = 0
+            for _ in voicings:
+                if not count:
+                    first_times.append(time.perf_counter() - started)
+                count += 1
+            total_times.append(time.perf_counter() - started)
+
+        results[f"{chord} ({voices} voices)"] = {
+            "voicings": count,
+            "first_ms": statistics.median(first_times) * 1000 if first_times else 0.0,
+            "total_ms": statistics.median(total_times) * 1000,
+        }
+    return results
+
+
+def run_main(arguments: List[str]) -> None:
+    # Run project.main() in this process, as if started with these command-line arguments,
+    # discarding the output
+    saved = sys.argv
+    sys.argv = ["project.py", *arguments]
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            project.main()
+    except SystemExit as e:
+        if e.code:
+            raise RuntimeError(f"project.py {' '.join(arguments)} failed")
+    finally:
+        sys.argv = saved
+
+
+def get_suite() -> Dict[str, Tuple[Callable, List[tuple], int]]:
+    # The benchmarks of the suite: for each name, the function, the list of arguments it is
+    # called with, and how many times each call is repeated (to measure very short calls)
+    scales = [
+        (tonic, Music_Theory.normalize_scale_type(scale_type))
+        for tonic in TONICS
+        for scale_type in TYPES
+    ]
+    labels = CHORDS + [
+        degree
+        for scale_type in Music_Theory.KEY_SCALES
+        for degree in Music_Theory.SCALE_CHORD_QUALITIES[scale_type][1]
+    ]
+
+    return {
+        "get_scale": (get_scale, scales, 20),
+        "compute_scale (no cache)": (Music_Theory.compute_scale, scales, 20),
+        "get_diatonic_chords": (get_diatonic_chords, scales, 20),
+        "get_chord_notes": (get_chord_notes, [(chord,) for chord in CHORDS], 20),
+        "prepare_pretty_display": (
+            prepare_pretty_display,
+            [(label, verbose) for label in labels for verbose in (False, True)],
+            20,
+        ),
+        "main()": (run_main, [(arguments,) for arguments in MAIN_ARGUMENTS], 1),
+    }
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    # The samples must be sorted
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def bench_function(
+    function: Callable, calls: List[tuple], repeat: int, rounds: int
+) -> Dict[str, float]:
+    # Call the function with every set of arguments, `repeat` times in a row, for `rounds`
+    # rounds. Each group of repeated calls gives one sample, used for the percentiles.
+    samples = []
+    total = 0.0
+    for _ in range(rounds):
+        for arguments in calls:
+            started = time.perf_counter()
+            for _ in range(repeat):
+                function(*arguments)
+            elapsed = time.perf_counter() - started
+            samples.append(elapsed / repeat)
+            total += elapsed
+    samples.sort()
+
+    # Memory is measured separately, as tracing the allocations slows everything down
+    tracemalloc.start()
+    for arguments in calls:
+        function(*arguments)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "ops_per_sec": len(samples) * repeat / total,
+        "p50_us": percentile(samples, 0.5) * 1e6,
+        "p90_us": percentile(samples, 0.9) * 1e6,
+        "p99_us": percentile(samples, 0.99) * 1e6,
+        "peak_kib": peak / 1024,
+    }
+
+
+def bench_suite(rounds: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for name, (function, calls, repeat) in get_suite().items():
+        # Warm-up round (caches, lazy imports...)
+        for arguments in calls:
+            function(*arguments)
+        results[name] = bench_function(function, calls, repeat, rounds)
+    return results
+
+
+def compare_results(
+    baseline: Dict[str, Dict[str, float]], results: Dict[str, Dict[str, float]]
+) -> Dict[str, float]:
+    # Change in ops/sec (in percent) for every benchmark also found in the baseline
+    changes = {
+        name: (result["ops_per_sec"] / baseline[name]["ops_per_sec"] - 1) * 100
+        for name, result in results.items()
+        if name in baseline
+    }
+    return changes
+
+
+def find_regressions(changes: Dict[str, float], threshold: float) -> List[str]:
+    # Benchmarks slower than the baseline by more than `threshold` percent
+    return [name for name, change in changes.items() if change < -threshold]
+
+
+def print_suite(
+    results: Dict[str, Dict[str, float]], changes: Dict[str, float]
+) -> None:
+    print(
+        f"{'Benchmark':<26} {'ops/sec':>10} {'p50':>10} {'p90':>10} {'p99':>10} "
+        f"{'memory':>10} {'change':>8}"
+    )
+    for name, result in results.items():
+        change = f"{changes[name]:>+7.1f}%" if name in changes else ""
+        print(
+            f"{name:<26} {result['ops_per_sec']:>10.0f} {result['p50_us']:>8.2f}us "
+            f"{result['p90_us']:>8.2f}us {result['p99_us']:>8.2f}us "
+            f"{result['peak_kib']:>7.1f}KiB {change:>8}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark suite for the Music_Theory class and project.py. By default, measure the main functions and end-to-end main() invocations (with the tonics and chords of run_all.sh): ops/sec, latency percentiles and peak memory."
+    )
+    parser.add_argument(
+        "-n",
+        dest="runs",
+        type=int,
+        help="Number of ROUNDS over all the inputs of each benchmark (default: 5), or of RUNS of each command with --startup or of each enumeration with --voicings (default: 20)",
+    )
+    parser.add_argument(
+        "--save",
+        dest="save",
+        metavar="FILE",
+        help="SAVE the results of the suite to FILE (JSON), to be used as a baseline",
+    )
+    parser.add_argument(
+        "--compare",
+        dest="compare",
+        metavar="FILE",
+        help="COMPARE the results of the suite with the baseline saved in FILE, and fail in case of a regression",
+    )
+    parser.add_argument(
+        "--threshold",
+        dest="threshold",
+        type=float,
+        default=10.0,
+        help="Ops/sec drop (in percent) considered a regression by --compare (default: 10)",
+    )
+    parser.add_argument(
+        "--startup",
+        dest="startup",
+        action="store_true",
+        help="Instead of the suite, measure the startup time of project.py: cold import time and time to first output for -s, -d and -c",
+    )
+    parser.add_argument(
+        "--max-ms",
+        dest="max_ms",
+        type=float,
+        help="With --startup, fail if the median startup time of any command, minus the time of an empty python process, is above MAX_MS milliseconds",
+    )
+    parser.add_argument(
+        "--scales",
+        dest="copies",
+        type=int,
+        help="Instead of the suite, compare Music_Theory.get_scales() with the scalar path, on a grid of COPIES copies of every tonic spelling and scale type",
+    )
+    parser.add_argument(
+        "--voicings",
+        dest="voicings",
+        action="store_true",
+        help="Instead of the suite, measure Music_Theory.get_voicings(): time to the first voicing and time to enumerate all the voicings of 4 to 6 voices chords",
+    )
+    args = parser.parse_args()
+
+    if args.voicings:
+        print(f"{'Chord':<22} {'voicings':>9} {'first':>10} {'total':>10}")
+        for name, result in bench_voicings(max(1, args.runs or 20)).items():
+            print(
+                f"{name:<22} {result['voicings']:>9.0f} {result['first_ms']:>8.3f}ms "
+                f"{result['total_ms']:>8.2f}ms"
+            )
+        return
+
+    if args.copies:
+        stats = bench_get_scales(args.copies)
+        print(f"{stats['scales']} scales, identical results")
+        print(f"compute_scale() loop:    {stats['scalar_ms']:>9.1f}ms")
+        print(
+            f"get_scales() arrays:     {stats['arrays_ms']:>9.1f}ms "
+            f"({stats['scalar_ms'] / stats['arrays_ms']:.1f}x faster)"
+        )
+        print(
+            f"get_scales() note names: {stats['rendered_ms']:>9.1f}ms "
+            f"({stats['scalar_ms'] / stats['rendered_ms']:.1f}x faster)"
+        )
+        return
+
+    if args.startup:
+        results = bench_startup(max(1, args.runs or 20))
+        baseline = results["python (empty)"]["median_ms"]
+
+        print(f"{'Command':<26} {'min':>9} {'median':>9} {'max':>9} {'overhead':>9}")
+        for name, result in results.items():
+            print(
+                f"{name:<26} {result['min_ms']:>7.1f}ms {result['median_ms']:>7.1f}ms "
+                f"{result['max_ms']:>7.1f}ms {result['median_ms'] - baseline:>7.1f}ms"
+            )
+
+        if args.max_ms is not None:
+            slow = [
+                name
+                for name, result in results.items()
+                if result["median_ms"] - baseline > args.max_ms
+            ]
+            if slow:
+                print(f"Startup regression (above {args.max_ms}ms): {', '.join(slow)}")
+                sys.exit(1)
+        return
+
+    # Load the baseline first, so that a missing file is reported before running the suite
+    baseline = {}
+    if args.compare:
+        try:
+            with open(args.compare, encoding="utf-8") as file:
+                baseline = json.load(file)["results"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Unable to read the baseline: {e}")
+            sys.exit(2)
+
+    suite = bench_suite(max(1, args.runs or 5))
+    changes = compare_results(baseline, suite)
+    print_suite(suite, changes)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump(
+                {"python": sys.version.split()[0], "results": suite}, file, indent=2
+            )
+
+    regressions = find_regressions(changes, args.threshold)
+    if regressions:
+        print(f"Regression (above {args.threshold}%): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import fnmatch
+import functools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from analysis import read_songs
+from project import Music_Theory
+
+# Output formats: one line per song, or one record per song for programs
+DETECTION_FORMATS = ["text", "ndjson", "csv"]
+
+# Result for one file: (path, [(song number, tonic, scale type, score)], error or None)
+File_Result = Tuple[str, List[Tuple[int, str, str, float]], Optional[str]]
+
+
+def find_files(paths: Iterable[str], pattern: str = "*.txt") -> List[str]:
+    # Every file given, and the files matching the pattern in the directories given (recursively),
+    # in a stable order so that the results always come out in the same order
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        for directory, subdirectories, names in os.walk(path):
+            subdirectories.sort()
+            files.extend(
+                os.path.join(directory, name)
+                for name in sorted(names)
+                if fnmatch.fnmatch(name, pattern)
+            )
+    return files
+
+
+def read_progressions(
+    lines: Iterable[str], sections: bool = False
+) -> Iterator[Tuple[int, List[str]]]:
+    # The chords of each song, one song at a time (see analysis.read_songs for the format,
+    # the "key:" lines are ignored). Songs without any chord are skipped.
+    song = 0
+    chords: List[str] = []
+    for number, _, line_chords in read_songs(lines, sections):
+        if number != song:
+            if chords:
+                yield song, chords
+            song, chords = number, []
+        chords.extend(line_chords)
+    if chords:
+        yield song, chords
+
+
+def detect_file(path: str, sections: bool = False) -> File_Result:
+    # Work unit executed by the worker processes: the best key of every song in a file.
+    # Errors are returned rather than raised, so that one bad file doesn't stop the others.
+    results = []
+    try:
+        with open(path, encoding="utf-8") as file:
+            for song, chords in read_progressions(file, sections):
+                tonic, scale, score = Music_Theory.detect_key(chords)[0]
+                results.append((song, tonic, scale, score))
+    except (OSError, ValueError) as e:
+        return path, results, str(e)
+    return path, results, None
+
+
+def detect_files(
+    files: List[str], jobs: int, chunk_size: int = 0, sections: bool = False
+) -> Iterator[File_Result]:
+    # Detect the keys of all the files, with a pool of `jobs` processes. The files are sent to
+    # the workers in chunks of `chunk_size` files (by default, about 4 chunks per worker), and
+    # the results are gathered in the same order as the files.
+    work = functools.partial(detect_file, sections=sections)
+    if jobs <= 1:
+        yield from map(work, files)
+        return
+
+    chunk_size = chunk_size or max(1, len(files) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(work, files, chunksize=chunk_size)
+
+
+def write_results(
+    results: Iterable[File_Result], output_format: str = "text"
+) -> Dict[str, int]:
+    # Write the key of every song as the results come in. Errors are reported on stderr.
+    # Returns the number of files, songs and errors.
+    write = sys.stdout.write
+    counts = {"files": 0, "songs": 0, "errors": 0}
+
+    if output_format == "csv":
+        write("file,song,tonic,scale,score\r\n")
+
+    for path, songs, error in results:
+        counts["files"] += 1
+        counts["songs"] += len(songs)
+        if error:
+            counts["errors"] += 1
+            print(f"{path}: {error}", file=sys.stderr)
+
+        for song, tonic, scale, score in songs:
+            if output_format == "ndjson":
+                write(
+                    json.dumps(
+                        {
+                            "file": path,
+                            "song": song,
+                            "tonic": tonic,
+                            "scale": scale,
+                            "score": round(score, 4),
+                        }
+                    )
+                    + "\n"
+                )
+            elif output_format == "csv":
+                if "," in path or '"' in path:
+                    path = '"' + path.replace('"', '""') + '"'
+                write(f"{path},{song},{tonic},{scale},{score:.4f}\r\n")
+            else:
+                write(f"{path}:{song}\t{tonic} {scale}\t{score:.0%}\n")
+
+    return counts
+
+
+def measure_scaling(
+    files: List[str], max_jobs: int, chunk_size: int = 0, sections: bool = False
+) -> List[Dict[str, float]]:
+    # Run the whole detection with 1, 2, 4... up to max_jobs worker processes, and report the
+    # throughput, the speedup over a single process and the efficiency (speedup / workers)
+    workers = [1]
+    while workers[-1] * 2 <= max_jobs:
+        workers.append(workers[-1] * 2)
+    if workers[-1] != max_jobs:
+        workers.append(max_jobs)
+
+    stats: List[Dict[str, float]] = []
+    for jobs in workers:
+        started = time.perf_counter()
+        songs = sum(
+            len(result[1]) for result in detect_files(files, jobs, chunk_size, sections)
+        )
+        elapsed = time.perf_counter() - started
+
+        speedup = stats[0]["seconds"] / elapsed if stats else 1.0
+        stats.append(
+            {
+                "jobs": jobs,
+                "songs": songs,
+                "seconds": elapsed,
+                "songs_per_second": songs / elapsed,
+                "speedup": speedup,
+                "efficiency": speedup / jobs,
+            }
+        )
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Estimate the key (tonic and scale type) of every song in files of chord progressions (see analysis.py for the format), using a pool of processes."
+    )
+    parser.add_argument(
+        "paths",
+        nargs="+",
+        metavar="PATH",
+        help="Files of chord progressions, or DIRECTORIES to search (recursively) for files matching --pattern",
+    )
+    parser.add_argument(
+        "--pattern",
+        dest="pattern",
+        default="*.txt",
+        help="PATTERN of the file names searched in the directories (default: *.txt)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        dest="jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of worker processes (JOBS), default: the number of cores",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        dest="chunk_size",
+        type=int,
+        default=0,
+        help="Number of files sent at once to a worker (default: about 4 chunks per worker)",
+    )
+    parser.add_argument(
+        "--sections",
+        dest="sections",
+        action="store_true",
+        help="Songs are SECTIONS of lines, separated by blank lines (default: one song per line)",
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        dest="format",
+        choices=DETECTION_FORMATS,
+        default="text",
+        help="Output FORMAT (default: text)",
+    )
+    parser.add_argument(
+        "--scaling",
+        dest="scaling",
+        action="store_true",
+        help="Instead of writing the keys, measure the SCALING: throughput, speedup and efficiency with 1, 2, 4... up to JOBS processes",
+    )
+    args = parser.parse_args()
+
+    files = find_files(args.paths, args.pattern)
+    if not files:
+        print("No files to analyse", file=sys.stderr)
+        sys.exit(1)
+    jobs = max(1, args.jobs)
+
+    if args.scaling:
+        print(
+            f"{'Jobs':>4} {'Songs/sec':>12} {'Seconds':>9} {'Speedup':>8} {'Efficiency':>10}"
+        )
+        for stats in measure_scaling(files, jobs, args.chunk_size, args.sections):
+            print(
+                f"{stats['jobs']:>4.0f} {stats['songs_per_second']:>12.0f} "
+                f"{stats['seconds']:>9.2f} {stats['speedup']:>7.2f}x {stats['efficiency']:>10.0%}"
+            )
+        return
+
+    started = time.perf_counter()
+    counts = write_results(
+        detect_files(files, jobs, args.chunk_size, args.sections), args.format
+    )
+    elapsed = time.perf_counter() - started
+
+    # The throughput goes to stderr, along with the errors, to keep the output clean
+    print(
+        f"{counts['files']} files, {counts['songs']} songs in {elapsed:.2f}s: "
+        f"{counts['songs'] / elapsed:.0f} songs/sec with {jobs} processes",
+        file=sys.stderr,
+    )
+    if counts["errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import os
+import sys
+import time
+from typing import Iterable, List, Tuple
+
+from project import Music_Theory, Note, parse_query, validate_arguments
+
+# Resolution of the files, in ticks per quarter note (beat)
+TICKS_PER_BEAT = 480
+
+# Length of the scale notes and of the chords, in beats
+NOTE_BEATS = 1
+CHORD_BEATS = 2
+
+DEFAULT_TEMPO = 120
+DEFAULT_OCTAVE = 4
+VELOCITY = 80
+
+# Initial size of the buffer of a writer: enough for a scale and its diatonic chords, or a
+# progression of about 200 triads. The buffer grows if needed, and is reused for every file.
+BUFFER_SIZE = 4096
+
+
+class Midi_Writer:
+    """
+    Writes Standard MIDI Files (format 0: a single track), one at a time, into a preallocated
+    buffer. Every event is encoded in place, byte by byte, so that no object is created per
+    note, and the same buffer is reused for the next file (see reset).
+
+    Notes are played one after another (add_notes) or together (add_chord), on the first
+    channel. Note-off events are written as note-on events with a velocity of 0, so that
+    every event after the first one can use the running status (no status byte).
+
+    """
+
+    __slots__ = ("buffer", "position", "delta", "status")
+
+    # "MThd" chunk (format 0, 1 track, ticks per beat), followed by the "MTrk" chunk header,
+    # whose length is only known once the track is finished
+    HEADER = (
+        b"MThd"
+        + (6).to_bytes(4, "big")
+        + (0).to_bytes(2, "big")
+        + (1).to_bytes(2, "big")
+        + TICKS_PER_BEAT.to_bytes(2, "big")
+        + b"MTrk"
+        + bytes(4)
+    )
+
+    NOTE_ON = 0x90
+
+    def __init__(self, size: int = BUFFER_SIZE) -> None:
+        self.buffer = bytearray(max(size, len(self.HEADER) + 64))
+        self.position = 0
+        # Ticks since the last event, written before the next one
+        self.delta = 0
+        # Status byte of the last event (for the running status)
+        self.status = 0
+
+    def reset(self, name: str = "", tempo: int = DEFAULT_TEMPO) -> None:
+        # Start a new file: the header, the tempo (in beats per minute) and the track name
+        self.buffer[: len(self.HEADER)] = self.HEADER
+        self.position = len(self.HEADER)
+        self.delta = 0
+        self.status = 0
+
+        # The tempo is stored as microseconds per beat, on 3 bytes (from 4 beats per minute)
+        microseconds = 60_000_000 // tempo if tempo > 0 else 0
+        if not 0 < microseconds < 1 << 24:
+            raise ValueError(f"Invalid tempo: {tempo}")
+        self.write_meta(0x51, microseconds.to_bytes(3, "big"))
+        if name:
+            self.write_meta(0x03, name.encode("utf-8"))
+
+    def reserve(self, size: int) -> None:
+        # Make room for `size` more bytes. The buffer is replaced rather than resized, as the
+        # previous file may still be referenced by a memoryview (see finish).
+        if self.position + size > len(self.buffer):
+            buffer = bytearray(max(2 * len(self.buffer), self.position + size))
+            buffer[: self.position] = self.buffer[: self.position]
+            self.buffer = buffer
+
+    def write_delta(self) -> None:
+        # Variable-length quantity: 7 bits per byte, most significant first, with the high bit
+        # set on every byte but the last one
+        buffer = self.buffer
+        delta = self.delta
+        self.delta = 0
+        if delta < 0x80:
+            buffer[self.position] = delta
+            self.position += 1
+            return
+
+        shift = (delta.bit_length() - 1) // 7 * 7
+        while shift:
+            buffer[self.position] = 0x80 | (delta >> shift) & 0x7F
+            self.position += 1
+            shift -= 7
+        buffer[self.position] = delta & 0x7F
+        self.position += 1
+
+    def write_meta(self, kind: int, data: bytes) -> None:
+        self.reserve(len(data) + 12)
+        self.write_delta()
+        buffer = self.buffer
+        buffer[self.position] = 0xFF
+        buffer[self.position + 1] = kind
+        self.position += 2
+        # (The length is a variable-length quantity too)
+        self.delta = len(data)
+        self.write_delta()
+        buffer[self.position : self.position + len(data)] = data
+        self.position += len(data)
+        # Meta events cancel the running status
+        self.status = 0
+
+    def write_note(self, note: int, velocity: int) -> None:
+        # A note-on event (a note-off event when the velocity is 0)
+        self.reserve(8)
+        self.write_delta()
+        buffer = self.buffer
+        position = self.position
+        if self.status != self.NOTE_ON:
+            buffer[position] = self.status = self.NOTE_ON
+            position += 1
+        buffer[position] = note
+        buffer[position + 1] = velocity
+        self.position = position + 2
+
+    def add_chord(
+        self, notes: Iterable[int], ticks: int, velocity: int = VELOCITY
+    ) -> None:
+        # Play the (MIDI) notes together for a number of ticks
+        notes = list(notes)
+        for note in notes:
+            if not 0 <= note <= 127:
+                raise ValueError(f"Invalid MIDI note: {note}")
+            self.write_note(note, velocity)
+        self.delta += ticks
+        for note in notes:
+            self.write_note(note, 0)
+
+    def add_notes(
+        self, notes: Iterable[int], ticks: int, velocity: int = VELOCITY
+    ) -> None:
+        # Play the (MIDI) notes one after another, for a number of ticks each
+        for note in notes:
+            self.add_chord((note,), ticks, velocity)
+
+    def add_rest(self, ticks: int) -> None:
+        self.delta += ticks
+
+    def finish(self) -> memoryview:
+        # End the track and return the whole file. The view is only valid until the next
+        # call to reset.
+        self.write_meta(0x2F, b"")
+        length = self.position - len(self.HEADER)
+        self.buffer[len(self.HEADER) - 4 : len(self.HEADER)] = length.to_bytes(4, "big")
+        return memoryview(self.buffer)[: self.position]
+
+
+def get_midi_notes(notes: Iterable[str], start: int = 60) -> List[int]:
+    # MIDI note numbers of notes played upwards (eg: a scale, or a chord from its bass): the
+    # first note is the lowest one at or above `start` (60 is middle C), and every other note
+    # is the lowest one above the previous note
+    midi: List[int] = []
+    for name in notes:
+        pitch = Note.parse(name).pitch
+        lowest = midi[-1] + 1 if midi else start
+        midi.append(lowest + (pitch - lowest) % 12)
+    if midi and (midi[0] < 0 or midi[-1] > 127):
+        raise ValueError("Notes out of the MIDI range")
+    return midi
+
+
+def get_octave_start(octave: int) -> int:
+    # MIDI note number of the C of an octave (C4 is 60)
+    return 12 * (octave + 1)
+
+
+def write_scale(
+    writer: Midi_Writer,
+    tonic: str,
+    scale: str,
+    diatonic_chords: bool = False,
+    octave: int = DEFAULT_OCTAVE,
+    tempo: int = DEFAULT_TEMPO,
+) -> memoryview:
+    # The notes of a scale, going up, then (optionally) its diatonic chords, each one on its
+    # degree of the scale
+    writer.reset(f"{tonic} {scale}", tempo)
+    notes = get_midi_notes(
+        Music_Theory.get_scale(tonic, scale), get_octave_start(octave)
+    )
+    writer.add_notes(notes, NOTE_BEATS * TICKS_PER_BEAT)
+
+    if diatonic_chords:
+        writer.add_rest(NOTE_BEATS * TICKS_PER_BEAT)
+        for chord in Music_Theory.get_diatonic_harmony(tonic, scale):
+            writer.add_chord(
+                get_midi_notes(chord.notes, notes[chord.root]),
+                CHORD_BEATS * TICKS_PER_BEAT,
+            )
+    return writer.finish()
+
+
+def write_chords(
+    writer: Midi_Writer,
+    chords: Iterable[str],
+    octave: int = DEFAULT_OCTAVE,
+    tempo: int = DEFAULT_TEMPO,
+) -> memoryview:
+    # A chord, or a progression: each chord from its bass (the root, unless it's a slash
+    # chord), starting in the given octave
+    chords = list(chords)
+    writer.reset(" ".join(chords), tempo)
+    for chord in chords:
+        writer.add_chord(
+            get_midi_notes(
+                Music_Theory.get_chord_notes(chord), get_octave_start(octave)
+            ),
+            CHORD_BEATS * TICKS_PER_BEAT,
+        )
+    return writer.finish()
+
+
+def write_query(
+    writer: Midi_Writer,
+    args: argparse.Namespace,
+    octave: int = DEFAULT_OCTAVE,
+    tempo: int = DEFAULT_TEMPO,
+) -> memoryview:
+    # The file for a query, with the same arguments as project.py (see parse_query). The
+    # chord may be a progression: chords separated by spaces.
+    if not validate_arguments(args):
+        raise ValueError("Invalid combination of arguments")
+    if args.scale:
+        return write_scale(
+            writer,
+            Note.normalize(args.scale),
+            Music_Theory.normalize_scale_type(args.type),
+            args.diatonic_chords,
+            octave,
+            tempo,
+        )
+    return write_chords(writer, args.chord.split(), octave, tempo)
+
+
+def write_batch(
+    lines: Iterable[str],
+    directory: str,
+    octave: int = DEFAULT_OCTAVE,
+    tempo: int = DEFAULT_TEMPO,
+) -> Tuple[int, int]:
+    # One file per query (options or a JSON object, as the batch queries of project.py),
+    # named after the line number of the query (eg: "00012.mid"), all encoded in the same
+    # buffer. Blank lines and comments (starting with "#") are skipped. A bad query is
+    # reported on stderr and the next queries are still processed.
+    # Returns the number of files written and the number of errors.
+    writer = Midi_Writer()
+    files = errors = 0
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            data = write_query(writer, parse_query(line), octave, tempo)
+            with open(os.path.join(directory, f"{line_number:05d}.mid"), "wb") as file:
+                file.write(data)
+            files += 1
+        except (OSError, ValueError) as e:
+            print(f"Line {line_number}: {e}", file=sys.stderr)
+            errors += 1
+    return files, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export scales, diatonic chords, chords and chord progressions as Standard MIDI Files (format 0, one track). Scale notes last a beat, chords two beats."
+    )
+    parser.add_argument(
+        "-s",
+        dest="scale",
+        help="Export the notes of this SCALE (eg: 'C#'), with -t",
+    )
+    parser.add_argument(
+        "-t", dest="type", help="TYPE of scale (eg: 'major', 'harmonic', 'dorian')"
+    )
+    parser.add_argument(
+        "-d",
+        dest="diatonic_chords",
+        action="store_true",
+        help="Also export the DIATONIC chords of the scale, after the scale",
+    )
+    parser.add_argument(
+        "-c",
+        dest="chord",
+        help="Export a CHORD, or a progression of chords separated by spaces (eg: 'C Am7 F G7/B')",
+    )
+    parser.add_argument(
+        "-b",
+        "--batch",
+        dest="batch",
+        metavar="FILE",
+        help="BATCH mode. Read one query per line from FILE ('-' for stdin), with the same options as project.py --batch (eg: '-s C -t major -d', \"-c 'C Am F G'\") and write one file per query in the output DIRECTORY, named after the line number (eg: 00012.mid)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        dest="output",
+        required=True,
+        help="OUTPUT file (a DIRECTORY in batch mode)",
+    )
+    parser.add_argument(
+        "--octave",
+        dest="octave",
+        type=int,
+        default=DEFAULT_OCTAVE,
+        help=f"OCTAVE of the first note (default: {DEFAULT_OCTAVE}, the octave of middle C)",
+    )
+    parser.add_argument(
+        "--tempo",
+        dest="tempo",
+        type=int,
+        default=DEFAULT_TEMPO,
+        help=f"TEMPO in beats per minute (default: {DEFAULT_TEMPO})",
+    )
+    args = parser.parse_args()
+
+    if args.batch:
+        started = time.perf_counter()
+        try:
+            if args.batch == "-":
+                files, errors = write_batch(
+                    sys.stdin, args.output, args.octave, args.tempo
+                )
+            else:
+                with open(args.batch, encoding="utf-8") as file:
+                    files, errors = write_batch(
+                        file, args.output, args.octave, args.tempo
+                    )
+        except OSError as e:
+            print(f"Unable to read the batch file: {e}", file=sys.stderr)
+            sys.exit(4)
+        elapsed = time.perf_counter() - started
+
+        # The throughput goes to stderr, along with the errors
+        print(
+            f"{files} files written in {elapsed:.2f}s: {files / elapsed:.0f} files/sec",
+            file=sys.stderr,
+        )
+        if errors:
+            sys.exit(1)
+        return
+
+    try:
+        data = write_query(Midi_Writer(), args, args.octave, args.tempo)
+        with open(args.output, "wb") as file:
+            file.write(data)
+    except OSError as e:
+        print(f"Unable to write the file: {e}", file=sys.stderr)
+        sys.exit(4)
+    except ValueError as e:
+        print(f"Unable to export: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
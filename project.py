@@ -1,11 +1,440 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import argparse
-import re
+from __future__ import annotations
+
 import sys
-from tabulate import tabulate
-from typing import List
+
+# Only the modules needed by every code path are imported at startup. The others (argparse,
+# json, shlex, tabulate...) are imported by the functions that use them, as importing them
+# takes longer than computing a scale. See benchmark.py to measure the startup time.
+# Even typing is only imported by the type checkers (mypy recognizes this constant).
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import argparse
+    import numpy as np
+    from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+    from snapshot import Theory_Snapshot
+
+
+class Note:
+    """
+    A note name, stored as a letter index (0 == "C", 1 == "D", ... 6 == "B") and a signed
+    number of accidentals (positive for sharps, negative for flats). eg: "Ebb" is Note(2, -2)
+
+    Strings are only parsed when entering Music_Theory and rendered back when returning results.
+    In between, respelling a note on another letter is simple arithmetic on the pitch class,
+    whatever the number of accidentals, so no table of enharmonic equivalents is needed.
+
+    Parsed notes are remembered and shared: a Note is never modified once created.
+
+    """
+
+    __slots__ = ("letter", "accidentals")
+
+    LETTERS = "CDEFGAB"
+
+    # Position of each natural note (letter) in the chromatic scale
+    NATURAL_PITCHES = (0, 2, 4, 5, 7, 9, 11)
+
+    # Position of each natural note on the circle of fifths, counted from C (F is one fifth
+    # below C), and the letters in the order of the sharps of a key signature
+    FIFTHS = (0, 2, 4, -1, 1, 3, 5)
+    SHARPS_ORDER = (3, 0, 4, 1, 5, 2, 6)
+
+    # Accidental symbols accepted in note names, and the number of half-steps they add
+    ACCIDENTALS = {
+        "#": 1,
+        "b": -1,
+        "\N{MUSIC SHARP SIGN}": 1,
+        "\N{MUSIC FLAT SIGN}": -1,
+    }
+
+    # Parsed notes, keyed on the name as given, up to this number of names
+    _parsed: Dict[str, "Note"] = {}
+    PARSE_CACHE_LIMIT = 4096
+
+    # Pre-rendered names for up to triple sharps/flats, indexed by [letter][accidentals + 3]
+    NAMES = tuple(
+        tuple(
+            letter + ("#" * accidentals if accidentals > 0 else "b" * -accidentals)
+            for accidentals in range(-3, 4)
+        )
+        for letter in LETTERS
+    )
+
+    def __init__(self, letter: int, accidentals: int = 0) -> None:
+        self.letter = letter
+        self.accidentals = accidentals
+
+    @classmethod
+    def parse(cls, name: str) -> "Note":
+        note = cls._parsed.get(name)
+        if note is not None:
+            return note
+
+        if not name or name[0] not in cls.LETTERS:
+            raise ValueError(f"Invalid note: {name}")
+
+        # Only a run of sharps or a run of flats is allowed after the letter ("#" and "\u266F"
+        # can be mixed, as well as "b" and "\u266D")
+        alterations = [cls.ACCIDENTALS.get(symbol, 0) for symbol in name[1:]]
+        if alterations and (0 in alterations or len(set(alterations)) > 1):
+            raise ValueError(f"Invalid note: {name}")
+
+        note = cls(cls.LETTERS.index(name[0]), sum(alterations))
+        if len(cls._parsed) < cls.PARSE_CACHE_LIMIT:
+            cls._parsed[name] = note
+        return note
+
+    @classmethod
+    def normalize(cls, name: str) -> str:
+        # The usual spelling of a note name typed by a user: the letter may be in lower case,
+        # the accidentals in upper case (eg: "eB") or written with the Unicode symbols
+        return str(cls.parse(name[:1].upper() + name[1:].lower()))
+
+    @classmethod
+    def render(cls, letter: int, accidentals: int) -> str:
+        if -3 <= accidentals <= 3:
+            return cls.NAMES[letter][accidentals + 3]
+        return cls.LETTERS[letter] + (
+            "#" * accidentals if accidentals > 0 else "b" * -accidentals
+        )
+
+    @classmethod
+    def accidentals_for(cls, letter: int, pitch: int) -> int:
+        # Number of accidentals needed for the given letter to sound the given pitch class,
+        # always picking the smallest number of sharps or flats (between -6 and +5)
+        return (pitch - cls.NATURAL_PITCHES[letter] + 6) % 12 - 6
+
+    @property
+    def pitch(self) -> int:
+        # Pitch class, as a position in the chromatic scale starting at C
+        return (self.NATURAL_PITCHES[self.letter] + self.accidentals) % 12
+
+    def respell(self, letter: int) -> "Note":
+        # Same pitch, using another letter (ie: the enharmonic equivalent)
+        return Note(letter, self.accidentals_for(letter, self.pitch))
+
+    def transpose(self, steps: int, half_steps: int) -> "Note":
+        # Move up by a number of letters and a number of half-steps. eg: a minor third is (2, 3)
+        letter = (self.letter + steps) % 7
+        return Note(letter, self.accidentals_for(letter, self.pitch + half_steps))
+
+    def __str__(self) -> str:
+        return self.render(self.letter, self.accidentals)
+
+    def __repr__(self) -> str:
+        return f"Note({str(self)!r})"
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Note):
+            return NotImplemented
+        return self.letter == other.letter and self.accidentals == other.accidentals
+
+    def __hash__(self) -> int:
+        return hash((self.letter, self.accidentals))
+
+
+class Chord_Symbol:
+    """
+    A chord name, as parsed by Music_Theory.parse_chord():
+
+        root: the root note (a Note)
+        suffix: what follows the root, as written (eg: "m7b5", "6/9")
+        quality: the quality read from the suffix, as found in CHORD_FORMULAS (eg: "m7")
+        modifiers: the (modifier, degree) pairs that follow the quality (eg: ("b", 5))
+        bass: the bass note of a slash chord (eg: "C/G"), or None
+        formula: (letter steps, half-steps) from the root to each note of the chord
+
+    The name is the usual spelling of the chord, with "#" and "b" for the accidentals of the
+    root and bass notes. Chord names are only parsed once, and the names that differ only by
+    the spelling of these accidentals (eg: "C#m7" and "C\u266fm7") share the same object.
+
+    """
+
+    __slots__ = ("name", "root", "suffix", "quality", "modifiers", "bass", "formula")
+
+    def __init__(
+        self,
+        root: Note,
+        suffix: str,
+        quality: str,
+        modifiers: Tuple[Tuple[str, int], ...],
+        bass: Note | None,
+        formula: Tuple[Tuple[int, int], ...],
+    ) -> None:
+        self.root = root
+        self.suffix = suffix
+        self.quality = quality
+        self.modifiers = modifiers
+        self.bass = bass
+        self.formula = formula
+        self.name = str(root) + suffix + ("/" + str(bass) if bass else "")
+
+    def __str__(self) -> str:
+        return self.name
+
+    def __repr__(self) -> str:
+        return f"Chord_Symbol({self.name!r})"
+
+
+class Diatonic_Chord:
+    """
+    A chord of a key, as returned by Music_Theory.get_diatonic_harmony():
+
+        degree: the Roman numeral of the chord (eg: "ii", "vii\u00b0" is "viio", "V7")
+        name: the chord name (eg: "Dm", "Bo", "G7")
+        root: the index of the root in the scale (0 for the tonic)
+        quality: the quality of the chord, as found in CHORD_FORMULAS (eg: "m", "o", "7")
+        notes: the notes of the chord, as spelled in the scale
+
+    """
+
+    __slots__ = ("degree", "name", "root", "quality", "notes")
+
+    def __init__(
+        self, degree: str, name: str, root: int, quality: str, notes: Tuple[str, ...]
+    ) -> None:
+        self.degree = degree
+        self.name = name
+        self.root = root
+        self.quality = quality
+        self.notes = notes
+
+    def __repr__(self) -> str:
+        return f"Diatonic_Chord({self.degree!r}, {self.name!r}, {list(self.notes)!r})"
+
+
+class Scale_Table:
+    """
+    The notes of many scales at once, as returned by Music_Theory.get_scales().
+
+    The notes are stored in two 2-D arrays of small integers (letter index and number of
+    accidentals, as in the Note class), with one row per (tonic, scale type) pair and one
+    column per degree. Rows are ordered by tonic, then by scale type. Note names are only
+    rendered when requested.
+
+    """
+
+    __slots__ = ("tonics", "variants", "letters", "accidentals")
+
+    def __init__(
+        self,
+        tonics: List[str],
+        variants: List[str],
+        letters: np.ndarray,
+        accidentals: np.ndarray,
+    ) -> None:
+        self.tonics = tonics
+        self.variants = variants
+        self.letters = letters
+        self.accidentals = accidentals
+
+    def __len__(self) -> int:
+        return len(self.letters)
+
+    def key(self, row: int) -> Tuple[str, str]:
+        # The (tonic, scale type) pair of a row
+        return (
+            self.tonics[row // len(self.variants)],
+            self.variants[row % len(self.variants)],
+        )
+
+    def keys(self) -> List[Tuple[str, str]]:
+        return [(tonic, variant) for tonic in self.tonics for variant in self.variants]
+
+    def notes(self, row: int) -> List[str]:
+        return [
+            Note.render(letter, accidentals)
+            for letter, accidentals in zip(
+                self.letters[row].tolist(), self.accidentals[row].tolist()
+            )
+        ]
+
+    def to_lists(self) -> List[List[str]]:
+        import numpy as np
+
+        if not len(self):
+            return []
+
+        # Render every (letter, accidentals) combination present in the table once, then
+        # look up all the names at once
+        lowest = int(self.accidentals.min())
+        highest = int(self.accidentals.max())
+        names = np.array(
+            [
+                [
+                    Note.render(letter, accidentals)
+                    for accidentals in range(lowest, highest + 1)
+                ]
+                for letter in range(7)
+            ],
+            dtype=object,
+        )
+        return names[self.letters, self.accidentals - lowest].tolist()
+
+    def to_dict(self) -> Dict[Tuple[str, str], List[str]]:
+        return dict(zip(self.keys(), self.to_lists()))
+
+
+class Scale_Definition:
+    """
+    A registered scale type (see Music_Theory.register_scale). Everything about the scale type
+    is derived from its intervals once, when it is registered, so that requesting a scale
+    never has to look at the intervals again:
+
+        steps: letter steps from the tonic to each degree (including the octave)
+        offsets: half-steps from the tonic to each degree (including the octave)
+        spellings: for each natural tonic (by letter), the letter and accidentals of each degree
+        signature: the key signature of the scale on C (sharps > 0, flats < 0)
+        chords: (degree index, quality, Roman numeral) of each diatonic triad
+        preferred_tonics: for each pitch class, the tonic spelling with the fewest accidentals
+
+    """
+
+    __slots__ = (
+        "name",
+        "intervals",
+        "parent",
+        "steps",
+        "offsets",
+        "spellings",
+        "signature",
+        "chords",
+        "preferred_tonics",
+    )
+
+    # Letter steps used to spell the scales that don't have 7 notes, keyed on the half-steps
+    # from the tonic: the degrees of a major scale, with flats for the notes in between
+    # (eg: a minor third is spelled "Eb" in C, and the tritone "Gb" rather than "F#")
+    STEPS_BY_OFFSET = (0, 1, 1, 2, 2, 3, 4, 4, 5, 5, 6, 6)
+
+    # Triad qualities, keyed on the half-steps from the root to the third and to the fifth
+    TRIAD_QUALITIES = {(4, 7): "M", (3, 7): "m", (3, 6): "o", (4, 8): "+"}
+
+    ROMAN_NUMERALS = ("I", "II", "III", "IV", "V", "VI", "VII")
+
+    # Intervals of the diatonic scales (the major scale and its modes), written with the key
+    # signature of their own collection of notes
+    DIATONIC_INTERVALS = (2, 2, 1, 2, 2, 2, 1)
+
+    def __init__(
+        self, name: str, intervals: List[int], parent: str | None = None
+    ) -> None:
+        self.name = name
+        self.intervals = tuple(intervals)
+        # The scale type this one is a mode (rotation) of, if any
+        self.parent = parent
+
+        offsets = [0]
+        for interval in intervals:
+            offsets.append(offsets[-1] + interval)
+        self.offsets = tuple(offsets)
+
+        # Scales of 7 notes use each letter once. The others are spelled as alterations of
+        # the major scale degrees.
+        if len(intervals) == 7:
+            self.steps = tuple(range(8))
+        else:
+            self.steps = tuple(
+                self.STEPS_BY_OFFSET[offset] for offset in offsets[:-1]
+            ) + (7,)
+
+        # A tonic with accidentals moves every degree by the same number of accidentals as
+        # the natural tonic on its letter (one sharp is 7 fifths up the circle of fifths, ie:
+        # one more sharp on each of the 7 letters), so the scale is only spelled for the 7
+        # natural tonics. This works for any number of accidentals (eg: "Fb" major has a
+        # "Bbb"), without ever having to pick between sharps and flats.
+        self.spellings = tuple(
+            tuple(
+                (
+                    (tonic + step) % 7,
+                    Note.accidentals_for(
+                        (tonic + step) % 7, Note.NATURAL_PITCHES[tonic] + offset
+                    ),
+                )
+                for step, offset in zip(self.steps, self.offsets)
+            )
+            for tonic in range(7)
+        )
+        self.signature = self.find_signature()
+
+        self.chords = tuple(self.find_chords())
+        self.preferred_tonics = tuple(
+            self.find_preferred_tonic(pitch) for pitch in range(12)
+        )
+
+    def find_chords(self) -> Iterator[Tuple[int, str, str]]:
+        # Scales of 7 notes have one triad per degree, stacking thirds (every other degree),
+        # when it is one of the supported qualities. Other scales have every triad that can
+        # be built from their notes, on any degree (zero, one or more per degree).
+        pitches = self.offsets[:-1]
+        size = len(pitches)
+        for degree, root in enumerate(pitches):
+            if size == 7:
+                candidates = [
+                    (
+                        (pitches[(degree + 2) % 7] - root) % 12,
+                        (pitches[(degree + 4) % 7] - root) % 12,
+                    )
+                ]
+            else:
+                candidates = [
+                    (third, fifth)
+                    for third, fifth in self.TRIAD_QUALITIES
+                    if (root + third) % 12 in pitches and (root + fifth) % 12 in pitches
+                ]
+
+            for intervals in candidates:
+                quality = self.TRIAD_QUALITIES.get(intervals)
+                if quality is None:
+                    continue
+                if size == 7:
+                    numeral = self.ROMAN_NUMERALS[degree]
+                else:
+                    # Numbered as the degrees of a major scale, to be meaningful whatever the
+                    # number of notes (eg: "bIII" for "Eb" in a C minor pentatonic scale)
+                    step = self.steps[degree]
+                    alteration = root - Note.NATURAL_PITCHES[step]
+                    numeral = "b" * -alteration + "#" * alteration
+                    numeral += self.ROMAN_NUMERALS[step]
+                if quality in ("m", "o"):
+                    numeral = numeral.lower()
+                yield degree, quality, numeral + ("" if quality in "Mm" else quality)
+
+    def find_signature(self) -> int:
+        # The diatonic scales are written with the key signature of their notes (eg: 2 flats
+        # for C dorian). The other scales use the key signature of the major or minor key with
+        # the same third (eg: 3 flats for C harmonic minor, C melodic minor and C blues).
+        intervals = self.DIATONIC_INTERVALS
+        if any(
+            self.intervals == intervals[mode:] + intervals[:mode] for mode in range(7)
+        ):
+            return sum(accidentals for _, accidentals in self.spellings[0][:-1])
+        return -3 if 3 in self.offsets and 4 not in self.offsets else 0
+
+    def find_preferred_tonic(self, pitch: int) -> str:
+        # Of the spellings of a pitch class with at most one sharp or flat, the one giving the
+        # fewest accidentals in the whole scale. On a tie, natural notes come first, then sharps.
+        spellings = []
+        for letter in range(7):
+            accidentals = Note.accidentals_for(letter, pitch)
+            if abs(accidentals) > 1:
+                continue
+            total = sum(
+                abs(degree_accidentals + accidentals)
+                for _, degree_accidentals in self.spellings[letter][:-1]
+            )
+            spellings.append(
+                ((total, abs(accidentals), accidentals < 0), letter, accidentals)
+            )
+
+        _, letter, accidentals = min(spellings)
+        return Note.render(letter, accidentals)
+
+    def __repr__(self) -> str:
+        return f"Scale_Definition({self.name!r}, {list(self.intervals)!r})"
 
 
 class Music_Theory:
@@ -19,43 +448,27 @@ class Music_Theory:
     The interesting methods are:
 
         get_scale: Used to compute the notes of the scales in any key.
-                   The supported scales are Major, (Natural) Minor, Harmonic Minor and Melodic Minor
+                   The supported scales are Major, (Natural) Minor, Harmonic Minor and Melodic Minor,
+                   the modes of Major and Melodic Minor, the pentatonic and blues scales, and
+                   any other scale added with register_scale (see BUILTIN_SCALES)
 
         get_diatonic_chords: Used to compute the list of diatonic chords in any of the supported scales.
                              Diatonic chords are chords that use notes exclusively from the scale.
 
-        get_chord_notes: Used to compute the notes that form a specific triad.
-                         The supported triads are:  Major, Minor, Diminished and Augmented
+        get_diatonic_harmony: Used to build the diatonic triads or seventh chords of a key,
+                              with their degree and notes, by stacking thirds on the scale.
 
-    """
+        get_chord_notes: Used to compute the notes that form a specific chord.
+                         The supported triads are:  Major, Minor, Diminished and Augmented,
+                         along with sevenths, extensions, suspensions, added and altered
+                         tones (see CHORD_FORMULAS)
 
-    # This dict is used to find alternate names for enharmonic notes. This is used in scales
-    # to make sure each note starts with a consecutive letter, with no duplicates.
-    # This means in some cases, we need to introduce double-sharps or double-flats.
-    ENHARMONIC_NOTES = {
-        "C": ["B#", "Dbb"],
-        "C#": ["Db", "B##"],
-        "Db": ["C#"],
-        "C##": ["D"],
-        "D": ["C##", "Ebb"],
-        "E": ["Fb", "D##"],
-        "E#": ["F"],
-        "Fb": ["E"],
-        "F": ["E#"],
-        "F#": ["Gb", "E##"],
-        "Gb": ["F#"],
-        "F##": ["G"],
-        "G": ["F##", "Abb"],
-        "G#": ["Ab", "F###"],
-        "G##": ["A"],
-        "A": ["G##", "Bbb"],
-        "B": ["Cb", "A##"],
-        "B#": ["C"],
-        "Cb": ["B"],
-        "Abb": ["G"],
-        "Bbb": ["A"],
-        "Ebb": ["D"],
-    }
+    Scales are cached after their first computation (see lookup_scale), since the same few
+    scales tend to be requested over and over. This cache is the only state kept by the class,
+    along with the registry of scale types and the profiling counters (see enable_profiling),
+    only updated when requested.
+
+    """
 
     # Notes of the chromatic scales (starting at C), using sharps or flats
     CHROMATIC_SCALE = {
@@ -63,80 +476,259 @@ class Music_Theory:
         "flats": ["C", "Db", "D", "Eb", "E", "F", "Gb", "G", "Ab", "A", "Bb", "B"],
     }
 
-    # List of major key signatures, grouped by whether they use sharps or flats
-    MAJOR_SCALES = {
-        # "C" is included here just to have a default value, even if it has no sharps nor flats
-        "sharps": ["C", "G", "D", "A", "E", "B", "F#", "C#"],
-        "flats": ["F", "Bb", "Eb", "Ab", "Db", "Gb", "Cb"],
+    # Built-in scale types: (name, intervals in half-steps, aliases, names of the modes).
+    # The modes are the rotations of the scale, starting on its second degree, then on its
+    # third degree, etc. A mode with the same intervals as another scale type (eg: "aeolian"
+    # and "natural minor") is an alias of that scale type.
+    # Harmonic minor has a 3 half-steps interval, this is not a typo. Melodic minor should in theory
+    # use different intervals when going down the scale, this has not been implemented.
+    BUILTIN_SCALES = [
+        (
+            "major",
+            [2, 2, 1, 2, 2, 2, 1],
+            ["ionian"],
+            ["dorian", "phrygian", "lydian", "mixolydian", "aeolian", "locrian"],
+        ),
+        ("natural minor", [2, 1, 2, 2, 1, 2, 2], ["minor", "natural"], []),
+        ("harmonic minor", [2, 1, 2, 2, 1, 3, 1], ["harmonic"], []),
+        (
+            "melodic minor",
+            [2, 1, 2, 2, 2, 2, 1],
+            ["melodic"],
+            [
+                "dorian b2",
+                "lydian augmented",
+                "lydian dominant",
+                "mixolydian b6",
+                "locrian #2",
+                "altered",
+            ],
+        ),
+        (
+            "major pentatonic",
+            [2, 2, 3, 2, 3],
+            ["pentatonic"],
+            ["suspended pentatonic", "man gong", "ritusen", "minor pentatonic"],
+        ),
+        ("blues", [3, 2, 1, 1, 3, 2], ["minor blues"], ["major blues"]),
+    ]
+
+    # Scale types of the keys considered by detect_key() (the major and minor keys)
+    KEY_SCALES = ["major", "natural minor", "harmonic minor", "melodic minor"]
+
+    # Registered scale types (see register_scale), keyed on their name and on their aliases,
+    # and keyed on their intervals (to find the scale types registered twice)
+    _scale_registry: Dict[str, Scale_Definition] = {}
+    _scales_by_intervals: Dict[Tuple[int, ...], Scale_Definition] = {}
+
+    # Views of the registry, updated by register_scale(). Every name accepted as a scale type,
+    # and for each scale type (without the aliases): its intervals in half-steps
+    # (1 == half-step, 2 == whole step), and its diatonic chords.
+    # "M" == major chord, "m" == minor chord, "o" == diminished chord, "+" == augmented chord
+    # For each scale type in SCALE_CHORD_QUALITIES, the first list contains our internal
+    # symbols and the second list contains the human readable version, ready to display
+    SUPPORTED_SCALES: List[str] = []
+    INTERVALS: Dict[str, List[int]] = {}
+    SCALE_CHORD_QUALITIES: Dict[str, List[List[str]]] = {}
+
+    # Cache of computed scales, keyed on (tonic, normalized scale type). The values are tuples so
+    # that they can be handed out directly without any risk of a caller modifying the cache.
+    _scale_cache: Dict[Tuple[str, str], Tuple[str, ...]] = {}
+    _scale_cache_hits = 0
+    _scale_cache_misses = 0
+
+    # Suffix used in chord names for each triad quality (the major suffix is implicit)
+    CHORD_SUFFIXES = {"M": "", "m": "m", "o": "o", "+": "+"}
+
+    # Chord formulas, keyed on the chord quality (as spelled by tokenize_chord_suffix). For each
+    # note, the degree counted from the root as in a major scale, and an alteration in
+    # half-steps: eg: (3, -1) is a minor third and (7, -2) a diminished seventh.
+    # Adding a quality here is all it takes to support it, see compile_chord_formula().
+    CHORD_FORMULAS = {
+        "": ((1, 0), (3, 0), (5, 0)),
+        "maj": ((1, 0), (3, 0), (5, 0)),
+        "m": ((1, 0), (3, -1), (5, 0)),
+        "o": ((1, 0), (3, -1), (5, -1)),
+        "+": ((1, 0), (3, 0), (5, 1)),
+        "5": ((1, 0), (5, 0)),
+        "6": ((1, 0), (3, 0), (5, 0), (6, 0)),
+        "m6": ((1, 0), (3, -1), (5, 0), (6, 0)),
+        "69": ((1, 0), (3, 0), (5, 0), (6, 0), (9, 0)),
+        "m69": ((1, 0), (3, -1), (5, 0), (6, 0), (9, 0)),
+        "7": ((1, 0), (3, 0), (5, 0), (7, -1)),
+        "maj7": ((1, 0), (3, 0), (5, 0), (7, 0)),
+        "m7": ((1, 0), (3, -1), (5, 0), (7, -1)),
+        "mmaj7": ((1, 0), (3, -1), (5, 0), (7, 0)),
+        "o7": ((1, 0), (3, -1), (5, -1), (7, -2)),
+        "ø": ((1, 0), (3, -1), (5, -1), (7, -1)),
+        "ø7": ((1, 0), (3, -1), (5, -1), (7, -1)),
+        "+7": ((1, 0), (3, 0), (5, 1), (7, -1)),
+        "+maj7": ((1, 0), (3, 0), (5, 1), (7, 0)),
+        "9": ((1, 0), (3, 0), (5, 0), (7, -1), (9, 0)),
+        "maj9": ((1, 0), (3, 0), (5, 0), (7, 0), (9, 0)),
+        "m9": ((1, 0), (3, -1), (5, 0), (7, -1), (9, 0)),
+        "mmaj9": ((1, 0), (3, -1), (5, 0), (7, 0), (9, 0)),
+        "11": ((1, 0), (3, 0), (5, 0), (7, -1), (9, 0), (11, 0)),
+        "maj11": ((1, 0), (3, 0), (5, 0), (7, 0), (9, 0), (11, 0)),
+        "m11": ((1, 0), (3, -1), (5, 0), (7, -1), (9, 0), (11, 0)),
+        "13": ((1, 0), (3, 0), (5, 0), (7, -1), (9, 0), (11, 0), (13, 0)),
+        "maj13": ((1, 0), (3, 0), (5, 0), (7, 0), (9, 0), (11, 0), (13, 0)),
+        "m13": ((1, 0), (3, -1), (5, 0), (7, -1), (9, 0), (11, 0), (13, 0)),
     }
 
-    # List of minor key signatures, grouped by whether they use sharps or flats.
-    # Note: harmonic minor and melodic minor have some exceptions.
-    MINOR_SCALES = {
-        # "A" is included here just to have a default value, even if it has no sharps not flats
-        "sharps": ["A", "E", "B", "F#", "C#", "G#", "D#", "A#"],
-        "flats": ["D", "G", "C", "F", "Bb", "Eb", "Ab"],
+    # Half-steps from the root to each degree of a major scale, including the extensions
+    DEGREE_HALF_STEPS = {
+        1: 0,
+        2: 2,
+        3: 4,
+        4: 5,
+        5: 7,
+        6: 9,
+        7: 11,
+        9: 14,
+        11: 17,
+        13: 21,
     }
 
-    # Chord qualities for each degree, by scale type.
-    # "M" == major chord, "m" == minor chord, "o" == diminished chord, "+" == augmented chord
-    #
-    # For each element, the first list contains our internal symbols and the second
-    # list contains the human readable version, ready to display
-    SCALE_CHORD_QUALITIES = {
-        "major": [
-            ["M", "m", "m", "M", "M", "m", "o"],
-            ["I", "ii", "iii", "IV", "V", "vi", "viio"],
-        ],
-        "natural minor": [
-            ["m", "o", "M", "m", "m", "M", "M"],
-            ["i", "iio", "III", "iv", "v", "VI", "VII"],
-        ],
-        "harmonic minor": [
-            ["m", "o", "+", "m", "M", "M", "o"],
-            ["i", "iio", "III+", "iv", "V", "VI", "viio"],
-        ],
-        "melodic minor": [
-            ["m", "m", "+", "M", "M", "o", "o"],
-            ["i", "ii", "III+", "IV", "V", "vio", "viio"],
-        ],
+    # Quality symbols accepted in chord names, with their spelling in CHORD_FORMULAS.
+    # "-" is a diminished chord, as in the rest of this program.
+    CHORD_TOKENS = {
+        "m": "m",
+        "mi": "m",
+        "min": "m",
+        "o": "o",
+        "-": "o",
+        "dim": "o",
+        "\N{DEGREE SIGN}": "o",
+        "+": "+",
+        "aug": "+",
+        "M": "maj",
+        "maj": "maj",
+        "\N{GREEK CAPITAL LETTER DELTA}": "maj",
+        "\N{LATIN SMALL LETTER O WITH STROKE}": "\N{LATIN SMALL LETTER O WITH STROKE}",
     }
 
-    # The list of supported scales
-    SUPPORTED_SCALES = [
-        "major",
-        "minor",  # Same as natural minor
-        "natural minor",
-        "harmonic minor",
-        "melodic minor",
+    # Same symbols, longest first, so that "maj" is not read as "m" followed by "aj"
+    CHORD_TOKEN_ORDER = sorted(CHORD_TOKENS, key=len, reverse=True)
+
+    # Modifiers that can follow the quality, each followed by a degree: "sus2", "add9", "no5",
+    # "b9", "#11"... ("omit" is the same as "no", and "sus" alone is "sus4")
+    CHORD_MODIFIERS = [
+        ("sus", "sus"),
+        ("add", "add"),
+        ("omit", "no"),
+        ("no", "no"),
+        ("b", "b"),
+        ("#", "#"),
+        ("\N{MUSIC FLAT SIGN}", "b"),
+        ("\N{MUSIC SHARP SIGN}", "#"),
     ]
 
-    # Intervals for all the supported scales, in number of half steps (1 == half-step, 2 == whole step)
-    # Harmonic minor has a 3 half-steps interval, this is not a typo. Melodic minor should in theory
-    # use different intervals when going down the scale, this has not been implemented.
-    INTERVALS = {
-        "major": [2, 2, 1, 2, 2, 2, 1],
-        "natural minor": [2, 1, 2, 2, 1, 2, 2],
-        "harmonic minor": [2, 1, 2, 2, 1, 3, 1],
-        "melodic minor": [2, 1, 2, 2, 2, 2, 1],
+    # Compiled chord formulas (see compile_chord_formula), keyed on the chord suffix, up to
+    # this number of suffixes
+    _chord_formula_cache: Dict[str, Tuple[Tuple[int, int], ...]] = {}
+    CHORD_FORMULA_LIMIT = 4096
+
+    # Parsed chord names (see parse_chord), keyed on the name as given and on the usual
+    # spelling of the name, up to this number of names
+    _chord_symbols: Dict[str, Chord_Symbol] = {}
+    CHORD_SYMBOL_LIMIT = 65536
+
+    # Triad qualities (see CHORD_SUFFIXES) of the chord qualities that are triads
+    TRIAD_QUALITIES = {"": "M", "m": "m", "o": "o", "+": "+"}
+
+    # Seventh chords, keyed on the half-steps from the root to the third, the fifth and the
+    # seventh: the chord quality (as found in CHORD_FORMULAS), and the suffix added to the
+    # Roman numeral of the triad, without its own "o" or "+" (eg: "V7", "ii7", "vii\u00f87")
+    SEVENTH_QUALITIES = {
+        (4, 7, 11): ("maj7", "maj7"),
+        (4, 7, 10): ("7", "7"),
+        (3, 7, 10): ("m7", "7"),
+        (3, 7, 11): ("mmaj7", "maj7"),
+        (3, 6, 10): (
+            "\N{LATIN SMALL LETTER O WITH STROKE}7",
+            "\N{LATIN SMALL LETTER O WITH STROKE}7",
+        ),
+        (3, 6, 9): ("o7", "o7"),
+        (4, 8, 11): ("+maj7", "+maj7"),
+        (4, 8, 10): ("+7", "+7"),
     }
 
+    # Reverse chord lookup, built on first use by build_chord_index(). The first dict is keyed on
+    # the exact spelling of the notes, the second one on their 12-bit pitch-class mask (bit 0 ==
+    # C, bit 1 == C#/Db, etc.). Values are lists of (chord name, quality) pairs.
+    _chord_index_by_spelling: Dict[frozenset, List[Tuple[str, str]]] = {}
+    _chord_index_by_mask: Dict[int, List[Tuple[str, str]]] = {}
+
+    # Diatonic chords of each key, computed once by get_diatonic_harmony(), keyed on (tonic,
+    # scale type, with seventh chords). Cleared along with the scale cache.
+    _harmony_cache: Dict[Tuple[str, str, bool], Tuple[Diatonic_Chord, ...]] = {}
+
+    # Prebuilt scales, diatonic triads and triads, read from a file by load_snapshot(), if any.
+    # Looked up before computing anything, and dropped when a scale type is registered.
+    _snapshot: Theory_Snapshot | None = None
+
+    # Roman numeral tables, built once per key by get_degree_table(): for each (tonic, scale
+    # type), the degree of each chord keyed on its name, and keyed on (root pitch class, quality)
+    _degree_tables: Dict[
+        Tuple[str, str], Tuple[Dict[str, str | None], Dict[Tuple[int, str], str]]
+    ] = {}
+
+    # Other chord names looked up in a key are remembered (even when not in the key), up to
+    # this number of names per key, so that memory stays bounded whatever the input
+    DEGREE_TABLE_LIMIT = 4096
+
+    # Key detection table, built on first use by build_key_index(). For every candidate key:
+    # (tonic, scale type, degree index keyed on (root pitch class, quality), names of the
+    # diatonic chords, number of accidentals in the scale)
+    _key_index: List[Tuple[str, str, Dict[Tuple[int, str], int], frozenset, int]] = []
+
+    # Scale finder table, built on first use by build_scale_index(). For each distinct 12-bit
+    # pitch-class mask, the scales using those pitches, with what is needed to rank them:
+    # (tonic, scale type, notes, set of parsed notes, pitch of the tonic, number of accidentals,
+    # whether the scale type is a mode of another one)
+    _scale_index: List[
+        Tuple[int, List[Tuple[str, str, Tuple[str, ...], frozenset, int, int, bool]]]
+    ] = []
+
+    # Profiling counters, only updated while profiling is enabled (see enable_profiling):
+    # number of calls and cumulative time (in seconds) of each class method, and number of
+    # get_enharmonic_note calls without an expected note name (fallback to the simplest spelling)
+    _profile_calls: Dict[str, int] = {}
+    _profile_seconds: Dict[str, float] = {}
+    _profile_fallbacks = 0
+
+    # Original class methods, while they are replaced by their profiled version
+    _profile_originals: Dict[str, classmethod] = {}
+
+    # Class methods never profiled (the profiling methods themselves)
+    UNPROFILED_METHODS = [
+        "enable_profiling",
+        "disable_profiling",
+        "is_profiling",
+        "get_profile",
+        "reset_profile",
+    ]
+
     @classmethod
     def get_enharmonic_note(cls, note: str, expected_note: str | None) -> str:
-        if note in cls.ENHARMONIC_NOTES:
-            if expected_note:
-                for n in cls.ENHARMONIC_NOTES[note]:
-                    if n[0] == expected_note:
-                        return n
-            else:
-                return cls.ENHARMONIC_NOTES[note][0]
+        current = Note.parse(note)
 
         if expected_note:
-            raise ValueError(
-                f"Unable to find enharmonic equivalent for {note} (trying to find {expected_note}"
-            )
-        else:
-            raise ValueError(f"Unable to find enharmonic equivalent for {note}")
+            if len(expected_note) != 1 or expected_note not in Note.LETTERS:
+                raise ValueError(
+                    f"Unable to find enharmonic equivalent for {note} (trying to find {expected_note})"
+                )
+            return str(current.respell(Note.LETTERS.index(expected_note)))
+
+        # Without an expected note name, use the simplest spelling with a different letter,
+        # preferring sharps when two spellings are as simple (eg: "C##" rather than "Ebb" for "D")
+        candidates = [
+            current.respell(letter) for letter in range(7) if letter != current.letter
+        ]
+        return str(
+            min(candidates, key=lambda n: (abs(n.accidentals), n.accidentals < 0))
+        )
 
     @classmethod
     def get_next_expected_note(cls, note: str) -> str:
@@ -154,14 +746,10 @@ class Music_Theory:
 
     @classmethod
     def get_intervals(cls, type: str) -> List[int]:
-        if type not in cls.SUPPORTED_SCALES:
-            raise ValueError("Unsupported scale type")
-
-        if type == "minor":
-            # "minor" is an alias for "natural minor"
-            type = "natural minor"
-
-        return cls.INTERVALS[type]
+        try:
+            return cls.INTERVALS[cls.normalize_scale_type(type)]
+        except ValueError:
+            raise ValueError("Unsupported scale type") from None
 
     @classmethod
     def get_note_position(cls, note: str, scale: List[str]) -> int:
@@ -171,156 +759,1189 @@ class Music_Theory:
         return -1
 
     @classmethod
-    def get_scale(cls, tonic: str, scale: str) -> List[str]:
-        if scale not in cls.SUPPORTED_SCALES:
-            raise ValueError("Unsupported scale")
-
-        if scale == "minor":
-            # "minor" is an alias for "natural minor"
-            scale = "natural minor"
-
-        # Pick the correct chromatic scale, with flats or sharps
-        # Note: some scales (eg: "D") use sharps in major and flats in minor, so
-        # we have to make a distinction here
-        if scale == "major":
-            if tonic in cls.MAJOR_SCALES["sharps"] or tonic.endswith("#"):
-                chromatic_scale = cls.CHROMATIC_SCALE["sharps"]
-            else:
-                chromatic_scale = cls.CHROMATIC_SCALE["flats"]
-        else:
-            if tonic in cls.MINOR_SCALES["sharps"] or tonic.endswith("#"):
-                chromatic_scale = cls.CHROMATIC_SCALE["sharps"]
-            else:
-                chromatic_scale = cls.CHROMATIC_SCALE["flats"]
+    def normalize_scale_type(cls, scale: str) -> str:
+        # The name of a registered scale type, for any of its names or aliases
+        # (eg: "natural minor" for "minor" or "aeolian")
+        return cls.get_scale_definition(scale).name
 
-        note_position = cls.get_note_position(tonic, chromatic_scale)
-        if note_position == -1:
-            # For the tonic, use the first enharmonic note (regular note, not double-flat nor double-sharp)
-            # as we are using this to find a starting in the chromatic scale
-            temp_tonic = cls.get_enharmonic_note(tonic, None)
-            note_position = cls.get_note_position(temp_tonic, chromatic_scale)
-            if note_position == -1:
-                raise ValueError("Unable to find enharmonic note")
+    @classmethod
+    def get_scale_definition(cls, scale: str) -> Scale_Definition:
+        definition = cls._scale_registry.get(scale)
+        if definition is None:
+            # Scale types are case insensitive (eg: "Dorian"), and so are their aliases
+            definition = cls._scale_registry.get(" ".join(scale.lower().split()))
+            if definition is None:
+                raise ValueError("Unsupported scale")
+        return definition
 
-        intervals = cls.get_intervals(scale)
+    @classmethod
+    def register_scale(
+        cls,
+        name: str,
+        intervals: Iterable[int],
+        aliases: Iterable[str] = (),
+        parent: str | None = None,
+    ) -> str:
+        # Add a scale type, from its intervals in half-steps (they must add up to an octave).
+        # Its spelling, diatonic chords and preferred tonics are derived now, once and for all
+        # (see Scale_Definition). A scale type with the same intervals as a registered one is
+        # added as an alias of that one. Returns the name of the scale type.
+        name = " ".join(name.lower().split())
+        intervals = list(intervals)
+        if not name or name[0].isdigit():
+            raise ValueError(f"Invalid scale name: {name!r}")
+        if (
+            not 2 <= len(intervals) <= 11
+            or not all(isinstance(interval, int) for interval in intervals)
+            or min(intervals) < 1
+            or sum(intervals) != 12
+        ):
+            raise ValueError(
+                f"Invalid intervals for the {name} scale: {intervals} (expecting half-steps adding up to 12)"
+            )
 
-        # The scale always begins with the tonic
-        notes = [tonic]
+        definition = cls._scales_by_intervals.get(tuple(intervals))
+        registered = cls._scale_registry.get(name)
+        if registered is not None and registered is not definition:
+            raise ValueError(f"Scale already registered: {name}")
+
+        if definition is None:
+            definition = Scale_Definition(name, intervals, parent)
+            cls._scales_by_intervals[definition.intervals] = definition
+            cls.INTERVALS[name] = intervals
+            cls.SCALE_CHORD_QUALITIES[name] = [
+                [quality for _, quality, _ in definition.chords],
+                [numeral for _, _, numeral in definition.chords],
+            ]
+            # The scale finder index must include the new scale, and the snapshot is stale
+            cls._scale_index = []
+            cls._snapshot = None
 
-        # Start the loop with previous_note already set to the tonic
-        previous_note = tonic
+        for alias in [name, *aliases]:
+            alias = " ".join(alias.lower().split())
+            if cls._scale_registry.get(alias, definition) is not definition:
+                raise ValueError(f"Scale already registered: {alias}")
+            if alias not in cls._scale_registry:
+                cls._scale_registry[alias] = definition
+                cls.SUPPORTED_SCALES.append(alias)
 
-        for interval in intervals:
-            # Move forward by the number of specified half-steps
-            expected_note_name = cls.get_next_expected_note(previous_note)
+        return definition.name
+
+    @classmethod
+    def register_modes(cls, scale: str, names: Iterable[str]) -> List[str]:
+        # Register the modes of a scale type: the rotations of its intervals, starting on the
+        # second degree for the first name, on the third degree for the next one, etc.
+        # Returns the names of the scale types (see register_scale).
+        definition = cls.get_scale_definition(scale)
+        intervals = list(definition.intervals)
+        modes = []
+        for degree, name in enumerate(names, start=1):
+            if degree >= len(intervals):
+                raise ValueError(f"Too many modes for the {definition.name} scale")
+            modes.append(
+                cls.register_scale(
+                    name,
+                    intervals[degree:] + intervals[:degree],
+                    parent=definition.name,
+                )
+            )
+        return modes
 
-            # Calculate what the next note is supposed to be
-            note_position = (note_position + interval) % len(chromatic_scale)
-            current_note = chromatic_scale[note_position]
+    @classmethod
+    def load_scales(cls, lines: Iterable[str]) -> List[str]:
+        # Register the scale types listed in a file, one per line: the name, a colon and the
+        # intervals, optionally followed by a "|" and the names of its modes, separated by
+        # commas. eg: "hungarian minor: 2 1 3 1 1 3 1 | ukrainian dorian, phrygian dominant"
+        # Blank lines and comments (starting with "#") are skipped.
+        # Returns the names of the scale types registered.
+        names = []
+        for line_number, line in enumerate(lines, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+
+            name, colon, rest = line.partition(":")
+            intervals, _, modes = rest.partition("|")
+            try:
+                if not colon:
+                    raise ValueError("expecting 'name: intervals'")
+                try:
+                    steps = [int(interval) for interval in intervals.split()]
+                except ValueError:
+                    raise ValueError(
+                        f"invalid intervals: {intervals.strip()}"
+                    ) from None
+                names.append(cls.register_scale(name, steps))
+                names.extend(
+                    cls.register_modes(
+                        name, [mode for mode in modes.split(",") if mode.strip()]
+                    )
+                )
+            except ValueError as e:
+                raise ValueError(f"Line {line_number}: {e}") from None
+
+        return names
+
+    @classmethod
+    def register_builtin_scales(cls) -> None:
+        # Register the scale types of BUILTIN_SCALES (done when the module is imported). The
+        # modes are registered last, so that a mode never takes the name of a built-in scale
+        # (eg: "aeolian" is an alias of "natural minor", not the other way around).
+        for name, intervals, aliases, _ in cls.BUILTIN_SCALES:
+            cls.register_scale(name, intervals, aliases)
+        for name, _, _, modes in cls.BUILTIN_SCALES:
+            cls.register_modes(name, modes)
+
+    @classmethod
+    def get_preferred_tonic(cls, note: str, scale: str) -> str:
+        # The usual spelling of a key: the spelling of the tonic (with at most one sharp or
+        # flat) giving the fewest accidentals in the scale. eg: "Db" for "C#" major, but "C#"
+        # for "Db" minor.
+        return cls.get_scale_definition(scale).preferred_tonics[Note.parse(note).pitch]
 
-            # Since a scale must contain notes with (non-repeating) consecutive note names,
-            # find the correct enharmonic if the note name doesn't match what we expect.
-            if current_note[0] != expected_note_name:
-                current_note = cls.get_enharmonic_note(current_note, expected_note_name)
-            notes.append(current_note)
-            previous_note = current_note
+    @classmethod
+    def get_key_signature(cls, tonic: str, scale: str) -> int:
+        # The number of sharps (positive) or flats (negative) of the key signature, from the
+        # circle of fifths: each fifth up adds a sharp, each sharp on the tonic adds 7. This
+        # works for the theoretical keys too, a double sharp counting as 2 (eg: 8 for G# major,
+        # -8 for Fb major, -15 for Dbb minor). See Scale_Definition.find_signature for the
+        # scales that are not diatonic.
+        root = Note.parse(tonic)
+        return (
+            Note.FIFTHS[root.letter]
+            + 7 * root.accidentals
+            + cls.get_scale_definition(scale).signature
+        )
 
+    @classmethod
+    def get_key_signature_notes(cls, tonic: str, scale: str) -> List[str]:
+        # The altered notes of the key signature, in the order they are written (sharps from
+        # F, flats from B). Beyond 7 sharps or flats, the notes altered first get a double
+        # sharp or double flat (eg: "F##", "C#", "G#", "D#", "A#", "E#", "B#" for G# major).
+        signature = cls.get_key_signature(tonic, scale)
+        order = Note.SHARPS_ORDER if signature >= 0 else Note.SHARPS_ORDER[::-1]
+        notes = []
+        for position, letter in enumerate(order):
+            # Number of times the key signature went around the 7 letters before this one
+            if signature >= 0:
+                accidentals = (signature - position + 6) // 7
+            else:
+                accidentals = -((-signature - position + 6) // 7)
+            if accidentals:
+                notes.append(Note.render(letter, accidentals))
         return notes
 
     @classmethod
-    def get_diatonic_chords(cls, tonic: str, variant: str) -> List[str]:
-        # Diatonic chords are chords that only use the specific notes from a scale.
-        # For each degree in a scale, use the quality found in the SCALE_CHORD_QUALITIES
-        # dict, based on the scale type. Use the first list, with our internal symbols
+    def lookup_scale(cls, tonic: str, scale: str) -> Tuple[str, ...]:
+        # Return the (immutable) notes of a scale, computing them only the first time
+        key = (tonic, cls.normalize_scale_type(scale))
+
+        notes = cls._scale_cache.get(key)
+        if notes is not None:
+            cls._scale_cache_hits += 1
+            return notes
+
+        cls._scale_cache_misses += 1
+        if cls._snapshot is not None:
+            notes = cls._snapshot.get_scale(*key)
+        if notes is None:
+            notes = tuple(cls.compute_scale(*key))
+        cls._scale_cache[key] = notes
+        return notes
 
-        if variant not in cls.SUPPORTED_SCALES:
-            raise ValueError("Unsupported scale")
+    @classmethod
+    def get_scale(cls, tonic: str, scale: str) -> List[str]:
+        # Return a fresh list on every call, so the caller is free to modify it
+        return list(cls.lookup_scale(tonic, scale))
 
-        if variant == "minor":
-            # "minor" is an alias for "natural minor"
-            variant = "natural minor"
+    @classmethod
+    def get_valid_tonics(cls) -> List[str]:
+        # Every tonic spelling up to double sharps and double flats. Any other spelling can also
+        # be used as a tonic, but these are the only ones likely to be requested.
+        return [
+            Note.render(letter, accidentals)
+            for accidentals in (0, 1, -1, 2, -2)
+            for letter in range(7)
+        ]
 
-        # Empty list to receive the chords (one per degree) as they get prepared
-        chords = []
+    @classmethod
+    def precompute_scales(cls) -> int:
+        # Eagerly fill the cache with every scale that can be computed, for every tonic spelling
+        # and every registered scale type. Returns the number of scales in the cache.
+        for tonic in cls.get_valid_tonics():
+            for scale in cls.INTERVALS:
+                if (tonic, scale) not in cls._scale_cache:
+                    cls._scale_cache[(tonic, scale)] = tuple(
+                        cls.compute_scale(tonic, scale)
+                    )
+
+        return len(cls._scale_cache)
 
-        # Find all the notes for the requested scale
-        notes = cls.get_scale(tonic, variant)
+    @classmethod
+    def load_snapshot(cls, path: str | None) -> bool:
+        # Answer from a snapshot of the tables built by snapshot.py, rather than computing
+        # them. A missing, damaged or stale snapshot (built for other scale types) is ignored,
+        # and None stops using any snapshot. Returns whether the snapshot is used.
+        if path is None:
+            cls._snapshot = None
+            return False
+
+        from snapshot import get_registry_checksum, open_snapshot
+
+        cls._snapshot = open_snapshot(
+            path, get_registry_checksum(cls.INTERVALS, cls.SCALE_CHORD_QUALITIES)
+        )
+        return cls._snapshot is not None
 
-        # For each degree, find the correct chord (with quality) based on the scale type
-        for i in range(len(cls.SCALE_CHORD_QUALITIES[variant][0])):
-            quality = cls.SCALE_CHORD_QUALITIES[variant][0][i]
+    @classmethod
+    def get_scale_cache_info(cls) -> Dict[str, int]:
+        return {
+            "hits": cls._scale_cache_hits,
+            "misses": cls._scale_cache_misses,
+            "size": len(cls._scale_cache),
+        }
+
+    @classmethod
+    def clear_scale_cache(cls) -> None:
+        cls._scale_cache.clear()
+        cls._harmony_cache.clear()
+        cls._scale_cache_hits = 0
+        cls._scale_cache_misses = 0
+
+    @classmethod
+    def enable_profiling(cls) -> None:
+        # Replace every public class method with a version that counts the calls and measures
+        # their duration. Nothing is measured until this is called, so that profiling costs
+        # nothing when disabled. Nested calls are included in the time of their caller.
+        import time
+
+        if cls._profile_originals:
+            return
+
+        for name, method in list(vars(cls).items()):
+            if (
+                not isinstance(method, classmethod)
+                or name.startswith("_")
+                or name in cls.UNPROFILED_METHODS
+            ):
+                continue
+            cls._profile_originals[name] = method
+            setattr(
+                cls,
+                name,
+                classmethod(profiled(name, method.__func__, time.perf_counter)),
+            )
 
-            if quality == "M":
-                # For Major chords, the "M" should be implicit, so don't include it
-                chord = notes[i]
+    @classmethod
+    def disable_profiling(cls) -> None:
+        # Restore the original class methods. The counters are kept, see reset_profile.
+        for name, method in cls._profile_originals.items():
+            setattr(cls, name, method)
+        cls._profile_originals.clear()
+
+    @classmethod
+    def is_profiling(cls) -> bool:
+        return bool(cls._profile_originals)
+
+    @classmethod
+    def get_profile(cls) -> Dict[str, object]:
+        # Snapshot of the counters, meant to be exported to a metrics system:
+        # {"methods": {name: {"calls": ..., "seconds": ...}}, "enharmonic_fallbacks": ...,
+        #  "scale_cache": {"hits": ..., "misses": ..., "size": ..., "hit_rate": ...}}
+        # The scale cache counters are always maintained, even when profiling is disabled.
+        cache: Dict[str, object] = {
+            "hits": cls._scale_cache_hits,
+            "misses": cls._scale_cache_misses,
+            "size": len(cls._scale_cache),
+        }
+        lookups = cls._scale_cache_hits + cls._scale_cache_misses
+        cache["hit_rate"] = cls._scale_cache_hits / lookups if lookups else 0.0
+
+        return {
+            "methods": {
+                name: {"calls": calls, "seconds": cls._profile_seconds[name]}
+                for name, calls in sorted(cls._profile_calls.items())
+            },
+            "enharmonic_fallbacks": cls._profile_fallbacks,
+            "scale_cache": cache,
+        }
+
+    @classmethod
+    def reset_profile(cls) -> None:
+        cls._profile_calls.clear()
+        cls._profile_seconds.clear()
+        cls._profile_fallbacks = 0
+
+    @classmethod
+    def compute_scale(cls, tonic: str, scale: str) -> List[str]:
+        # Run the full algorithm, bypassing the cache.
+        definition = cls.get_scale_definition(scale)
+
+        # The tonic is the only note that needs to be parsed. Every other degree is computed
+        # as a (letter, accidentals) pair of integers and only rendered as a string at the end.
+        root = Note.parse(tonic)
+
+        # The scale always begins with the tonic
+        notes = [tonic]
+
+        # Since a scale (of 7 notes) must contain notes with (non-repeating) consecutive note
+        # names, each degree uses the next letter (see Scale_Definition for the other scales).
+        # Its accidentals are those of the same degree with the natural tonic on the same
+        # letter, plus the accidentals of the tonic (see Scale_Definition.spellings).
+        # This may result in double-sharps or double-flats (or more), this is expected.
+        for letter, accidentals in definition.spellings[root.letter][1:]:
+            notes.append(Note.render(letter, accidentals + root.accidentals))
+
+        return notes
+
+    @classmethod
+    def get_scales(cls, tonics: Iterable[str], variants: Iterable[str]) -> Scale_Table:
+        # Compute the scales for every combination of tonic and scale type at once, with the
+        # same arithmetic as compute_scale(), applied to whole arrays (requires numpy).
+        # Rows are ordered by tonic, then by scale type. The scale types must all have the same
+        # number of notes.
+        import numpy as np
+
+        tonics = list(tonics)
+        definitions = [cls.get_scale_definition(variant) for variant in variants]
+        variants = [definition.name for definition in definitions]
+        width = len(definitions[0].steps) if definitions else 8
+        if any(len(definition.steps) != width for definition in definitions):
+            raise ValueError("Scales of different sizes can't be computed together")
+
+        # Grids usually repeat the same few tonics: only parse each of them once, then
+        # expand the results with an array of indices
+        unique = {tonic: i for i, tonic in enumerate(dict.fromkeys(tonics))}
+        roots = [Note.parse(tonic) for tonic in unique]
+        indices = np.array([unique[tonic] for tonic in tonics], dtype=np.intp)
+
+        root_letters = np.array([root.letter for root in roots], dtype=np.intp)[indices]
+        root_accidentals = np.array(
+            [root.accidentals for root in roots], dtype=np.int16
+        )[indices]
+
+        # Spelling of each scale type on each natural tonic, as arrays of shape
+        # (scale types, letters, degrees). The first column is the tonic itself and the last
+        # one is the octave.
+        spellings = np.array(
+            [definition.spellings for definition in definitions], dtype=np.int16
+        ).reshape(-1, 7, width, 2)
+        variant_indices = np.arange(len(definitions))
+
+        # Arrays of shape (tonics, scale types, degrees): the spelling on the letter of the
+        # tonic, moved by the accidentals of the tonic
+        spelled = spellings[variant_indices[None, :], root_letters[:, None]]
+        letters = spelled[..., 0]
+        accidentals = spelled[..., 1] + root_accidentals[:, None, None]
+
+        return Scale_Table(
+            tonics,
+            variants,
+            letters.reshape(-1, width).astype(np.int8),
+            accidentals.reshape(-1, width).astype(np.int8),
+        )
+
+    @classmethod
+    def get_diatonic_chords(cls, tonic: str, variant: str) -> List[str]:
+        # Diatonic chords are chords that only use the specific notes from a scale
+        # (see get_diatonic_harmony)
+        return [chord.name for chord in cls.get_diatonic_harmony(tonic, variant)]
+
+    @classmethod
+    def get_diatonic_harmony(
+        cls, tonic: str, variant: str, sevenths: bool = False
+    ) -> Tuple[Diatonic_Chord, ...]:
+        # The diatonic chords of a key, with their degree and their notes, found in a single
+        # pass over the notes of the scale: the triads (or seventh chords) stacked in thirds,
+        # from each degree. Computed once per key.
+        # The degree and quality of each triad were found when the scale type was registered
+        # (see Scale_Definition), in the same order as in SCALE_CHORD_QUALITIES. The scales
+        # that don't have 7 notes have no seventh chords: their triads are returned instead.
+        definition = cls.get_scale_definition(variant)
+        key = (tonic, definition.name, sevenths)
+        chords = cls._harmony_cache.get(key)
+        if chords is None and not sevenths and cls._snapshot is not None:
+            records = cls._snapshot.get_harmony(tonic, definition.name)
+            if records is not None:
+                chords = cls._harmony_cache[key] = tuple(
+                    [Diatonic_Chord(*record) for record in records]
+                )
+        if chords is not None:
+            return chords
+
+        # Find all the notes for the requested scale
+        notes = cls.lookup_scale(tonic, definition.name)[:-1]
+        size = len(notes)
+        offsets = definition.offsets
+        harmony = []
+        for degree, quality, numeral in definition.chords:
+            if size == 7:
+                # Every other note of the scale, from the root
+                triad = (
+                    notes[degree],
+                    notes[(degree + 2) % 7],
+                    notes[(degree + 4) % 7],
+                )
             else:
-                # For every other type of chord, append the quality
-                chord = notes[i] + quality
+                # The notes of the scale with the pitches of the triad
+                root = offsets[degree]
+                third, fifth = next(
+                    intervals
+                    for intervals, triad_quality in Scale_Definition.TRIAD_QUALITIES.items()
+                    if triad_quality == quality
+                    and (root + intervals[0]) % 12 in offsets
+                    and (root + intervals[1]) % 12 in offsets
+                )
+                triad = (
+                    notes[degree],
+                    notes[offsets.index((root + third) % 12)],
+                    notes[offsets.index((root + fifth) % 12)],
+                )
 
-            chords.append(chord)
+            if not sevenths or size != 7:
+                # For Major chords, the "M" is implicit (see CHORD_SUFFIXES)
+                suffix = cls.CHORD_SUFFIXES[quality]
+                harmony.append(
+                    Diatonic_Chord(
+                        numeral, notes[degree] + suffix, degree, suffix, triad
+                    )
+                )
+                continue
+
+            seventh = notes[(degree + 6) % 7]
+            intervals = tuple(
+                (offsets[(degree + step) % 7] - offsets[degree]) % 12
+                for step in (2, 4, 6)
+            )
+            if intervals not in cls.SEVENTH_QUALITIES:
+                continue
+            seventh_quality, numeral_suffix = cls.SEVENTH_QUALITIES[intervals]
+            harmony.append(
+                Diatonic_Chord(
+                    numeral.rstrip("o+") + numeral_suffix,
+                    notes[degree] + seventh_quality,
+                    degree,
+                    seventh_quality,
+                    triad + (seventh,),
+                )
+            )
 
+        chords = tuple(harmony)
+        cls._harmony_cache[key] = chords
         return chords
 
     @classmethod
-    def get_chord_notes(cls, chord: str) -> List[str]:
-        # Get the *major* scale whose tonic is equal to the root note of the requested chord.
-        # This will be used to identify the third and fifth notes
+    def parse_chord_symbol(cls, chord: str) -> Tuple[int, str] | None:
+        # (root pitch class, quality) of a triad symbol, ignoring a bass note ("C/G"), or None
+        # for anything else (sevenths, unknown symbols...)
+        try:
+            symbol = cls.parse_chord(chord)
+        except ValueError:
+            return None
+        quality = cls.TRIAD_QUALITIES.get(symbol.quality)
+        if quality is None or symbol.modifiers:
+            return None
+        return symbol.root.pitch, quality
 
-        # Get the root note from the chord name (ie: remove any quality)
-        root = re.sub(r"(m|o|\+|\-)$", "", chord)
-        major_scale = cls.get_scale(root, "major")
+    @classmethod
+    def classify_chord(cls, chord: str) -> Tuple[int, str] | None:
+        # (root pitch class, quality) of a triad or a seventh chord, read from its notes rather
+        # than from its name (eg: "Bm7b5" is half-diminished), ignoring a bass note. The
+        # qualities are those of Scale_Definition.TRIAD_QUALITIES and SEVENTH_QUALITIES.
+        # None for any other chord (sus, added notes, extensions...)
+        try:
+            symbol = cls.parse_chord(chord)
+        except ValueError:
+            return None
+        steps = tuple([step for step, _ in symbol.formula[1:]])
+        half_steps = tuple([half_step for _, half_step in symbol.formula[1:]])
+        if steps == (2, 4):
+            quality = Scale_Definition.TRIAD_QUALITIES.get(
+                (half_steps[0], half_steps[1])
+            )
+        elif steps == (2, 4, 6) and half_steps in cls.SEVENTH_QUALITIES:
+            quality = cls.SEVENTH_QUALITIES[half_steps][0]
+        else:
+            quality = None
+        if quality is None:
+            return None
+        return symbol.root.pitch, quality
 
-        # Empty list to receive the notes as they get prepared
-        notes = []
+    @classmethod
+    def get_degree_table(
+        cls, tonic: str, variant: str
+    ) -> Tuple[Dict[str, str | None], Dict[Tuple[int, str], str]]:
+        # The degree (Roman numeral, from SCALE_CHORD_QUALITIES) of every diatonic chord of a key,
+        # triads and seventh chords (eg: "V7"), keyed on the chord name and on (root pitch
+        # class, quality, see classify_chord). Built once per key.
+        definition = cls.get_scale_definition(variant)
+        key = (tonic, definition.name)
+
+        tables = cls._degree_tables.get(key)
+        if tables is None:
+            by_name: Dict[str, str | None] = dict(
+                zip(
+                    cls.get_diatonic_chords(*key),
+                    cls.SCALE_CHORD_QUALITIES[key[1]][1],
+                )
+            )
+            notes = cls.lookup_scale(*key)
+            by_pitch = {
+                (Note.parse(notes[degree]).pitch, quality): numeral
+                for degree, quality, numeral in definition.chords
+            }
+            # The scales that don't have 7 notes have no seventh chords
+            for chord in cls.get_diatonic_harmony(*key, sevenths=True):
+                if len(chord.notes) == 4:
+                    by_name[chord.name] = chord.degree
+                    pitch = Note.parse(chord.notes[0]).pitch
+                    by_pitch[(pitch, chord.quality)] = chord.degree
+            tables = (by_name, by_pitch)
+            cls._degree_tables[key] = tables
+        return tables
+
+    @classmethod
+    def get_chord_degree(cls, chord: str, tonic: str, variant: str) -> str | None:
+        # Degree of a chord in a key (eg: "V" for "G" and "V7" for "G7" in C major), or None if
+        # the chord is not diatonic to that key, or is neither a triad nor a seventh chord (see
+        # classify_chord)
+        by_name, by_pitch = cls.get_degree_table(tonic, variant)
+
+        degree = by_name.get(chord)
+        if degree is not None or chord in by_name:
+            return degree
+
+        # Not seen before in this key: look for a diatonic chord with the same root pitch and
+        # quality (eg: "D#m" for "Ebm", "B-" for "Bo", "Bm7b5" for the half-diminished "B"
+        # seventh). Anything else is not in the key.
+        symbol = cls.classify_chord(chord)
+        degree = by_pitch.get(symbol) if symbol else None
+
+        if len(by_name) < cls.DEGREE_TABLE_LIMIT:
+            by_name[chord] = degree
+        return degree
 
-        # All chords start with the root note (inversions are not implemented yet)
-        notes.append(root)
-
-        if chord.endswith("m"):
-            # Minor chords have a minor third and perfect fifth
-            notes.append(cls.flatten(major_scale[2]))
-            notes.append(major_scale[4])
-        elif chord.endswith("o") or chord.endswith("-"):
-            # Diminished chords have a minor third and a diminished fifth
-            notes.append(cls.flatten(major_scale[2]))
-            notes.append(cls.flatten(major_scale[4]))
-        elif chord.endswith("+"):
-            # Augmented chords have a major third and augmented fifth
-            notes.append(major_scale[2])
-            notes.append(cls.sharpen(major_scale[4]))
+    @classmethod
+    def tokenize_chord_suffix(cls, suffix: str) -> Tuple[str, List[Tuple[str, int]]]:
+        # Split a chord suffix (what follows the root) into the quality, as found in
+        # CHORD_FORMULAS, and a list of (modifier, degree) pairs.
+        # eg: "mM7" is ("mmaj7", []), "13#11" is ("13", [("#", 11)]) and
+        # "7sus4(b9)" is ("7", [("sus", 4), ("b", 9)])
+        quality = ""
+        position = 0
+
+        # Parentheses come in pairs, without nesting (eg: "C(" or "Cm7)" is not a chord)
+        depth = 0
+        for character in suffix:
+            depth += (character == "(") - (character == ")")
+            if not 0 <= depth <= 1:
+                break
+        if depth:
+            raise ValueError(f"Unsupported chord quality: {suffix}")
+
+        # Quality symbols, then the number of the chord (eg: "m" "maj" "7", or "m(maj7)")
+        matched = True
+        while matched:
+            matched = False
+            if suffix.startswith("(", position):
+                position += 1
+                matched = True
+                continue
+            for token in cls.CHORD_TOKEN_ORDER:
+                if suffix.startswith(token, position):
+                    quality += cls.CHORD_TOKENS[token]
+                    position += len(token)
+                    matched = True
+                    break
+
+        if suffix.startswith("6/9", position):
+            quality += "69"
+            position += 3
         else:
-            # Any chord without any suffix is implicitly a Major chord.
-            # Major chords have a major third and perfect fifth
-            notes.append(major_scale[2])
-            notes.append(major_scale[4])
+            end = position
+            while end < len(suffix) and suffix[end].isdigit():
+                end += 1
+            quality += suffix[position:end]
+            position = end
+
+        # Modifiers, possibly in parentheses and separated by commas (eg: "7(b9,#11)")
+        modifiers = []
+        while position < len(suffix):
+            if suffix[position] in "(), ":
+                position += 1
+                continue
+
+            for symbol, modifier in cls.CHORD_MODIFIERS:
+                if suffix.startswith(symbol, position):
+                    break
+            else:
+                raise ValueError(f"Unsupported chord quality: {suffix}")
+            position += len(symbol)
+
+            end = position
+            while end < len(suffix) and suffix[end].isdigit():
+                end += 1
+            if end > position:
+                modifiers.append((modifier, int(suffix[position:end])))
+            elif modifier == "sus":
+                modifiers.append((modifier, 4))
+            else:
+                raise ValueError(f"Unsupported chord quality: {suffix}")
+            position = end
+
+        return quality, modifiers
+
+    @classmethod
+    def compile_chord_formula(cls, suffix: str) -> Tuple[Tuple[int, int], ...]:
+        # Turn a chord suffix into a list of (letter steps, half-steps) from the root, one per
+        # note, ordered by degree. Each suffix is only compiled once.
+        formula = cls._chord_formula_cache.get(suffix)
+        if formula is not None:
+            return formula
+
+        quality, modifiers = cls.tokenize_chord_suffix(suffix)
+        if quality not in cls.CHORD_FORMULAS:
+            raise ValueError(f"Unsupported chord quality: {suffix}")
+
+        notes = list(cls.CHORD_FORMULAS[quality])
+        for modifier, degree in modifiers:
+            if (
+                degree not in cls.DEGREE_HALF_STEPS
+                or degree == 1
+                or (modifier == "sus" and degree not in (2, 4))
+                or (modifier == "no" and degree not in (3, 5))
+            ):
+                raise ValueError(f"Unsupported chord quality: {suffix}")
+
+            if modifier in ("sus", "no"):
+                # The suspended note replaces the third
+                notes = [
+                    note
+                    for note in notes
+                    if note[0] != (3 if modifier == "sus" else degree)
+                ]
+            if modifier in ("sus", "add") and not any(
+                note[0] == degree for note in notes
+            ):
+                notes.append((degree, 0))
+            elif modifier in ("b", "#"):
+                # Altered tones replace the unaltered degree, if any (eg: "7b5", "13#11"), but
+                # two alterations of the same degree are both kept (eg: "7b9#9")
+                altered = (degree, 1 if modifier == "#" else -1)
+                notes = [note for note in notes if note != (degree, 0)]
+                if altered not in notes:
+                    notes.append(altered)
+
+        formula = tuple(
+            (degree - 1, cls.DEGREE_HALF_STEPS[degree] + alteration)
+            for degree, alteration in sorted(notes)
+        )
+        if len(cls._chord_formula_cache) < cls.CHORD_FORMULA_LIMIT:
+            cls._chord_formula_cache[suffix] = formula
+        return formula
+
+    @classmethod
+    def parse_chord(cls, chord: str) -> Chord_Symbol:
+        # Parse a chord name: the root (a letter and its accidentals), the suffix (see
+        # tokenize_chord_suffix) and an optional bass note after a "/" (eg: "Bb", "13#11" and
+        # "D" in "Bb13#11/D"). Each name is only parsed once. Raises a ValueError for anything
+        # that is not a chord.
+        symbol = cls._chord_symbols.get(chord)
+        if symbol is not None:
+            return symbol
+
+        name, bass = chord, None
+        head, slash, tail = chord.rpartition("/")
+        if slash and tail and tail[0] in Note.LETTERS:
+            # (Not "6/9", whose "/" is part of the suffix)
+            name, bass = head, Note.parse(tail)
+
+        end = 1
+        while end < len(name) and name[end] in Note.ACCIDENTALS:
+            end += 1
+        root = Note.parse(name[:end])
+        suffix = name[end:]
+        quality, modifiers = cls.tokenize_chord_suffix(suffix)
+        formula = cls.compile_chord_formula(suffix)
+
+        symbol = Chord_Symbol(root, suffix, quality, tuple(modifiers), bass, formula)
+        symbol = cls._chord_symbols.get(symbol.name, symbol)
+        if len(cls._chord_symbols) < cls.CHORD_SYMBOL_LIMIT:
+            cls._chord_symbols[chord] = symbol
+            cls._chord_symbols.setdefault(symbol.name, symbol)
+        return symbol
+
+    @classmethod
+    def get_chord_notes(cls, chord: str) -> List[str]:
+        # The root is only parsed once (see parse_chord), then every other note is found a
+        # number of letters and half-steps above it, as given by the compiled formula.
+        # The triads of the snapshot, if any, are taken as they are.
+        if cls._snapshot is not None:
+            triad = cls._snapshot.get_triad(chord)
+            if triad is not None:
+                return list(triad)
+        symbol = cls.parse_chord(chord)
+
+        letter = symbol.root.letter
+        pitch = symbol.root.pitch
+        notes = [str(symbol.root)]
+        for steps, half_steps in symbol.formula[1:]:
+            note_letter = (letter + steps) % 7
+            notes.append(
+                Note.render(
+                    note_letter, Note.accidentals_for(note_letter, pitch + half_steps)
+                )
+            )
 
+        # A slash chord starts with its bass note: an inversion when the bass is one of the
+        # notes of the chord (eg: "E G C" for "C/E"), an added note otherwise ("C/Bb")
+        if symbol.bass:
+            bass = str(symbol.bass)
+            if bass in notes:
+                position = notes.index(bass)
+                notes = notes[position:] + notes[:position]
+            else:
+                notes.insert(0, bass)
         return notes
 
+    @classmethod
+    def transpose_chord(cls, chord: str, steps: int, half_steps: int) -> str:
+        # Move a chord name up by a number of letters and a number of half-steps (eg: (2, 3)
+        # for a minor third), keeping its suffix and its bass note, if any ("C/G").
+        # The spelling follows the interval, so that a chord spelled as in the original key is
+        # spelled as in the new key. Raises a ValueError for anything that is not a chord.
+        symbol = cls.parse_chord(chord)
+        transposed = str(symbol.root.transpose(steps, half_steps)) + symbol.suffix
+        if symbol.bass:
+            transposed += "/" + str(symbol.bass.transpose(steps, half_steps))
+        return transposed
+
+    @classmethod
+    def get_voicings(
+        cls,
+        chord: str,
+        voices: int = 4,
+        low: int = 36,
+        high: int = 84,
+        max_span: int = 24,
+        doubling: Iterable[str] | None = None,
+        inversion: int | None = None,
+    ) -> Iterator[Tuple[int, ...]]:
+        # Every voicing of a chord: `voices` distinct MIDI notes between low and high (60 is
+        # middle C), from the lowest, using every note of the chord, within max_span half-steps.
+        # Only the notes listed in `doubling` may appear more than once (by default, any note).
+        # The bass is the given note of the chord (0 is the root, 1 the next note, etc. as in
+        # get_chord_notes), or the bass note of a slash chord. Any note can be in the bass
+        # otherwise. eg: (48, 52, 55, 60) for "C" is C3 E3 G3 C4.
+        # The voicings are found lazily, lowest notes first, so that taking the first few of
+        # them is cheap. The arguments are checked right away, raising a ValueError.
+        symbol = cls.parse_chord(chord)
+        tones = [
+            (symbol.root.pitch + half_steps) % 12 for _, half_steps in symbol.formula
+        ]
+        if symbol.bass and symbol.bass.pitch not in tones:
+            tones.insert(0, symbol.bass.pitch)
+        tones = list(dict.fromkeys(tones))
+
+        if not 0 <= low <= high <= 127:
+            raise ValueError(f"Invalid MIDI range: {low}-{high}")
+        if voices < 1 or max_span < 0:
+            raise ValueError("Invalid number of voices or span")
+        if inversion is not None and not 0 <= inversion < len(tones):
+            raise ValueError(f"Invalid inversion: {inversion}")
+
+        doubled = [True] * len(tones)
+        if doubling is not None:
+            doubled = [False] * len(tones)
+            for note in doubling:
+                pitch = Note.parse(note).pitch
+                if pitch not in tones:
+                    raise ValueError(f"Not a note of {chord}: {note}")
+                doubled[tones.index(pitch)] = True
+
+        bass = None
+        if symbol.bass:
+            bass = tones.index(symbol.bass.pitch)
+        elif inversion is not None:
+            bass = inversion
+
+        return cls._enumerate_voicings(
+            tones, voices, low, high, max_span, doubled, bass
+        )
+
+    @classmethod
+    def _enumerate_voicings(
+        cls,
+        tones: List[int],
+        voices: int,
+        low: int,
+        high: int,
+        max_span: int,
+        doubled: List[bool],
+        bass: int | None,
+    ) -> Iterator[Tuple[int, ...]]:
+        # Depth-first search over the MIDI notes of the chord, from the bass up, with an
+        # explicit stack (the indices of the chosen notes) rather than recursion. A branch is
+        # abandoned as soon as it can't lead to a voicing: a note beyond the span (and so are
+        # all the notes above it), a note that can't be doubled, or more notes of the chord
+        # still missing than voices left.
+        midi = [note for note in range(low, high + 1) if note % 12 in tones]
+        tone_of = [tones.index(note % 12) for note in midi]
+        count = len(midi)
+        complete = (1 << len(tones)) - 1
+        if len(tones) > voices:
+            return
+
+        used = [0] * len(tones)
+        masks = [0]
+        stack: List[int] = []
+        index = 0
+        while True:
+            depth = len(stack)
+            # Not enough notes left above this one for the remaining voices, or beyond the
+            # span: nothing more to find at this depth
+            if count - index < voices - depth or (
+                depth and midi[index] - midi[stack[0]] > max_span
+            ):
+                if not stack:
+                    return
+                index = stack.pop()
+                used[tone_of[index]] -= 1
+                masks.pop()
+                index += 1
+                continue
+
+            tone = tone_of[index]
+            mask = masks[-1] | (1 << tone)
+            if (
+                (depth == 0 and bass is not None and tone != bass)
+                or (used[tone] and not doubled[tone])
+                or (complete & ~mask).bit_count() > voices - depth - 1
+            ):
+                index += 1
+                continue
+
+            if depth + 1 == voices:
+                yield tuple(midi[i] for i in stack) + (midi[index],)
+                index += 1
+                continue
+
+            stack.append(index)
+            used[tone] += 1
+            masks.append(mask)
+            index += 1
+
+    @classmethod
+    def name_voicing(cls, chord: str, voicing: Iterable[int]) -> List[str]:
+        # Names of the MIDI notes of a voicing, spelled as in the chord, with their octave
+        # (eg: ["E3", "G3", "C4"] for (52, 55, 60) in "C", but "B#3" for 60 in "G#")
+        spellings = {}
+        for name in cls.get_chord_notes(chord):
+            spellings[Note.parse(name).pitch] = Note.parse(name)
+
+        names = []
+        for midi in voicing:
+            if midi % 12 not in spellings:
+                raise ValueError(f"Not a note of {chord}: {midi}")
+            note = spellings[midi % 12]
+            octave = (midi - note.accidentals - Note.NATURAL_PITCHES[note.letter]) // 12
+            names.append(f"{note}{octave - 1}")
+        return names
+
+    @classmethod
+    def get_pitch_class_mask(cls, notes: Iterable[str]) -> int:
+        # 12-bit integer, with one bit set for each pitch class (bit 0 == C, bit 11 == B)
+        mask = 0
+        for note in notes:
+            mask |= 1 << Note.parse(note).pitch
+        return mask
+
+    @classmethod
+    def build_chord_index(cls) -> int:
+        # Index every triad, for every root in get_valid_tonics() and every quality.
+        # Returns the number of chords in the index.
+        cls._chord_index_by_spelling.clear()
+        cls._chord_index_by_mask.clear()
+        chords = 0
+
+        for root in cls.get_valid_tonics():
+            for quality, suffix in cls.CHORD_SUFFIXES.items():
+                chord = (root + suffix, quality)
+                notes = cls.get_chord_notes(chord[0])
+                spelling = frozenset(Note.parse(note) for note in notes)
+
+                cls._chord_index_by_spelling.setdefault(spelling, []).append(chord)
+                cls._chord_index_by_mask.setdefault(
+                    cls.get_pitch_class_mask(notes), []
+                ).append(chord)
+                chords += 1
+
+        # For enharmonic matches, list the simplest spellings first (fewest accidentals)
+        for matches in cls._chord_index_by_mask.values():
+            matches.sort(
+                key=lambda chord: sum(
+                    abs(Note.parse(note).accidentals)
+                    for note in cls.get_chord_notes(chord[0])
+                )
+            )
+
+        return chords
+
+    @classmethod
+    def identify_chord(cls, notes: Iterable[str]) -> List[Tuple[str, str]]:
+        # Find the triads made of the given notes, in any order (or inversion).
+        # If the notes are spelled as in some chords (eg: "E G# C" for "C+"), only those chords
+        # are returned. Otherwise, all the chords using the same pitches are returned, simplest
+        # spellings first (eg: "C Fb G" gives "C", "B#", "Dbb").
+        # Returns a list of (chord name, quality) pairs, empty if the notes are not a triad.
+        if not cls._chord_index_by_mask:
+            cls.build_chord_index()
+
+        spelling = frozenset(Note.parse(note) for note in notes)
+        matches = cls._chord_index_by_spelling.get(spelling)
+        if matches is None:
+            mask = 0
+            for note in spelling:
+                mask |= 1 << note.pitch
+            matches = cls._chord_index_by_mask.get(mask, [])
+
+        return list(matches)
+
+    @classmethod
+    def build_scale_index(cls) -> int:
+        # Index every scale, for every tonic in get_valid_tonics() and every scale type, by the
+        # pitch-class mask of its notes. Returns the number of scales in the index.
+        by_mask: Dict[
+            int, List[Tuple[str, str, Tuple[str, ...], frozenset, int, int, bool]]
+        ] = {}
+        for tonic in cls.get_valid_tonics():
+            for scale in cls.INTERVALS:
+                notes = cls.lookup_scale(tonic, scale)
+                is_mode = cls._scale_registry[scale].parent is not None
+                parsed = [Note.parse(note) for note in notes[:-1]]
+                by_mask.setdefault(cls.get_pitch_class_mask(notes), []).append(
+                    (
+                        tonic,
+                        scale,
+                        notes,
+                        frozenset(parsed),
+                        parsed[0].pitch,
+                        sum(abs(note.accidentals) for note in parsed),
+                        is_mode,
+                    )
+                )
+
+        cls._scale_index = list(by_mask.items())
+        return sum(len(scales) for _, scales in cls._scale_index)
+
+    @classmethod
+    def find_scales(cls, notes: Iterable[str]) -> List[Tuple[str, str, List[str]]]:
+        # Find all the scales containing every one of the given notes (eg: a melody fragment).
+        # Returns a list of (tonic, scale type, notes of the scale), best fit first:
+        #  - scales spelling the most notes exactly as given (eg: "Db" rather than "C#")
+        #  - then scales whose tonic is one of the given notes
+        #  - then scales with the fewest accidentals
+        #  - then scale types that are not modes of another one (eg: "C major" before "E phrygian")
+        if not cls._scale_index:
+            cls.build_scale_index()
+
+        spelling = {Note.parse(note) for note in notes}
+        mask = 0
+        for note in spelling:
+            mask |= 1 << note.pitch
+
+        ranked = []
+        for scale_mask, scales in cls._scale_index:
+            if scale_mask & mask == mask:
+                for (
+                    tonic,
+                    scale,
+                    scale_notes,
+                    parsed,
+                    tonic_pitch,
+                    accidentals,
+                    is_mode,
+                ) in scales:
+                    fit = (
+                        -len(spelling & parsed),
+                        not mask & (1 << tonic_pitch),
+                        accidentals,
+                        is_mode,
+                    )
+                    ranked.append((fit, tonic, scale, scale_notes))
+
+        ranked.sort(key=lambda hit: hit[0])
+        return [
+            (tonic, scale, list(scale_notes)) for _, tonic, scale, scale_notes in ranked
+        ]
+
+    @classmethod
+    def build_key_index(cls) -> int:
+        # Prepare every candidate key for detect_key(): every tonic with at most one sharp or
+        # flat, with every scale type of KEY_SCALES. Returns the number of keys.
+        cls._key_index = []
+        for tonic in cls.get_valid_tonics():
+            if len(tonic) > 2:
+                continue
+            for scale in cls.KEY_SCALES:
+                chords = cls.get_scale_definition(scale).chords
+                parsed = [Note.parse(note) for note in cls.lookup_scale(tonic, scale)]
+                cls._key_index.append(
+                    (
+                        tonic,
+                        scale,
+                        {
+                            (parsed[degree].pitch, quality): degree
+                            for degree, quality, _ in chords
+                        },
+                        frozenset(cls.get_diatonic_chords(tonic, scale)),
+                        sum(abs(note.accidentals) for note in parsed[:-1]),
+                    )
+                )
+
+        return len(cls._key_index)
+
+    @classmethod
+    def detect_key(cls, chords: Iterable[str]) -> List[Tuple[str, str, float]]:
+        # Estimate the key of a song from its chords. Every candidate key is scored and the
+        # result is a list of (tonic, scale type, fraction of the chords in the key), best first.
+        # The keys are ranked on:
+        #   - the number of chords in the key, plus one point if the song starts on the tonic
+        #     chord and one point if it ends on it (to tell relative major and minor apart)
+        #   - then the number of chords spelled as in the key (to tell C# from Db)
+        #   - then the fewest accidentals (natural minor before harmonic minor...)
+        chords = list(chords)
+        if not chords:
+            raise ValueError("Unable to detect the key without any chord")
+        if not cls._key_index:
+            cls.build_key_index()
+
+        # Each distinct chord is only parsed once
+        counts: Dict[str, int] = {}
+        for chord in chords:
+            counts[chord] = counts.get(chord, 0) + 1
+        symbols = [
+            (cls.parse_chord_symbol(chord), chord.partition("/")[0], count)
+            for chord, count in counts.items()
+        ]
+        # (A chord that is not a triad is never the tonic chord)
+        first = cls.parse_chord_symbol(chords[0]) or (-1, "")
+        last = cls.parse_chord_symbol(chords[-1]) or (-1, "")
+
+        ranked = []
+        for order, (tonic, scale, degrees, names, accidentals) in enumerate(
+            cls._key_index
+        ):
+            in_key = spelled = 0
+            for symbol, name, count in symbols:
+                if symbol in degrees:
+                    in_key += count
+                    if name in names:
+                        spelled += count
+            cadence = (degrees.get(first) == 0) + (degrees.get(last) == 0)
+            ranked.append(
+                (
+                    (-(in_key + cadence), -spelled, accidentals, order),
+                    tonic,
+                    scale,
+                    in_key / len(chords),
+                )
+            )
+
+        ranked.sort()
+        return [(tonic, scale, score) for _, tonic, scale, score in ranked]
+
     @classmethod
     def sharpen(cls, note: str) -> str:
-        if note[-1] == "b":
-            # To sharpen a note that already has at least one flat symbol, remove one flat
-            return note[:-1]
-        else:
-            # Add one sharp symbol
-            # Note: this may result in a note with double-sharp, this is expected in some cases
-            return note + "#"
+        # Add one sharp symbol, or remove one flat symbol
+        # Note: this may result in a note with double-sharp, this is expected in some cases
+        current = Note.parse(note)
+        return Note.render(current.letter, current.accidentals + 1)
 
     @classmethod
     def flatten(cls, note: str) -> str:
-        if note[-1] == "#":
-            # To flatten a note that already has at least one shapr symbol, remove one sharp
-            return note[:-1]
-        else:
-            # Add one flat symbol
-            # Note: this may result in a note with double-flat, this is expected in some cases
-            return note + "b"
+        # Add one flat symbol, or remove one sharp symbol
+        # Note: this may result in a note with double-flat, this is expected in some cases
+        current = Note.parse(note)
+        return Note.render(current.letter, current.accidentals - 1)
 
 
-def main():
-    ### Parse the command line arguments
+# The built-in scale types are registered once, when the module is imported
+Music_Theory.register_builtin_scales()
+
+
+def profiled(name: str, function, timer):
+    # Wrap a Music_Theory class method (the function behind it), to update the profiling
+    # counters on every call, even when it raises an exception
+    def wrapper(cls, *args, **kwargs):
+        if name == "get_enharmonic_note":
+            expected_note = args[1] if len(args) > 1 else kwargs.get("expected_note")
+            if not expected_note:
+                cls._profile_fallbacks += 1
+
+        started = timer()
+        try:
+            return function(cls, *args, **kwargs)
+        finally:
+            cls._profile_calls[name] = cls._profile_calls.get(name, 0) + 1
+            cls._profile_seconds[name] = (
+                cls._profile_seconds.get(name, 0.0) + timer() - started
+            )
+
+    wrapper.__name__ = function.__name__
+    return wrapper
+
+
+# Output formats: "table" for humans, the others for programs
+OUTPUT_FORMATS = ["table", "json", "ndjson", "csv"]
+
+# Formats of the profiling report (see --profile), and the environment variable that enables
+# it without changing the command line (set to one of the formats, or to "1" for a table)
+PROFILE_FORMATS = ["table", "json"]
+PROFILE_VARIABLE = "MUSIC_THEORY_PROFILE"
+
+# Snapshot of the tables (see snapshot.py), looked up next to project.py, or at the path given
+# by the environment variable (set to an empty string to never use a snapshot)
+SNAPSHOT_FILE = "theory.snapshot"
+SNAPSHOT_VARIABLE = "MUSIC_THEORY_SNAPSHOT"
+
+# Lines of the tables, as drawn by the "fancy_outline" format of tabulate: the top line, the
+# line below the headers and the bottom line (left corner, fill, column separator, right
+# corner), then the vertical lines of the rows
+TABLE_LINES = (
+    ("╒", "═", "╤", "╕"),
+    ("╞", "═", "╪", "╡"),
+    ("╘", "═", "╧", "╛"),
+)
+TABLE_BORDER = "│"
+
+# Labels of the triad qualities in verbose mode (see prepare_pretty_display)
+QUALITY_LABELS = {"m": " (min)", "o": " (dim)", "+": " (aug)"}
+
+# Tables already rendered (with their title), keyed on (tonic or chord, scale type, diatonic
+# chords, verbose), up to this number: bulk queries repeat the same keys over and over
+TABLE_CACHE_LIMIT = 16384
+_rendered_tables: Dict[Tuple[str, str, bool, bool], str] = {}
+
+
+def query_error(message: str):
+    # Used by the batch queries parser to report errors instead of exiting the process
+    raise ValueError(message)
+
+
+def query_exit(status: int = 0, message: str | None = None):
+    # Used by the batch queries parser, for "-h" or any other reason to exit
+    raise ValueError(message.strip() if message else "Invalid query")
+
+
+def create_parser(query: bool = False) -> argparse.ArgumentParser:
+    # Imported here, as argparse is only needed when parsing a command line (or a batch query)
+    import argparse
+
+    # (Batch queries have no -h: the help would be printed in the middle of the results)
     parser = argparse.ArgumentParser(
-        description="Compute and display music scales and (optionally) diatonic chords, or the composition of a chord (triad). Please specify either a scale or a single chord."
+        description="Compute and display music scales and (optionally) diatonic chords, or the composition of a chord (triad). Please specify either a scale or a single chord.",
+        add_help=not query,
     )
     parser.add_argument(
         "-s",
@@ -331,8 +1952,7 @@ def main():
     parser.add_argument(
         "-t",
         dest="type",
-        help="TYPE of scale, select one of the supported scales",
-        choices=["major", "minor", "harmonic", "melodic"],
+        help="TYPE of scale: major, minor, harmonic, melodic, a mode (eg: 'dorian', 'lydian dominant', 'altered'), 'major pentatonic', 'minor pentatonic', 'blues', or a scale loaded with --scales",
         required=False,
     )
     parser.add_argument(
@@ -345,7 +1965,7 @@ def main():
     parser.add_argument(
         "-c",
         dest="chord",
-        help="Display the notes for a specific CHORD. Add suffix 'm' for minor, 'o' for diminished and '+' for augmented. (Eg: 'C#+' or 'Gbo')",
+        help="Display the notes for a specific CHORD. Add suffix 'm' for minor, 'o' for diminished and '+' for augmented. (Eg: 'C#+' or 'Gbo'). Sevenths, extensions, suspensions, added and altered tones are also supported (Eg: 'Gm7', 'Cmaj9', 'D7sus4', 'Fadd9' or 'Bb13#11')",
         required=False,
     )
     parser.add_argument(
@@ -355,128 +1975,534 @@ def main():
         action="store_true",
         required=False,
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "-f",
+        "--format",
+        dest="format",
+        help="Output FORMAT (default: table). The json, ndjson and csv formats are meant for programs: they include the diatonic chords (with -d) and ignore -v",
+        choices=OUTPUT_FORMATS,
+        # Batch queries without a format use the one given on the command line
+        default=None if query else "table",
+        required=False,
+    )
+    if query:
+        # Batch queries report errors for that single query, instead of exiting the process
+        parser.error = query_error  # type: ignore[method-assign]
+        parser.exit = query_exit  # type: ignore[method-assign]
+    else:
+        # Batch queries can't start another batch, nor a server, nor enable profiling, nor
+        # load scales (the scales loaded on the command line are available to every query)
+        parser.add_argument(
+            "--scales",
+            dest="scales",
+            metavar="FILE",
+            help="Load more SCALES from FILE, one per line: the name, a colon, the intervals in half-steps and optionally a '|' followed by the names of its modes (eg: 'hungarian minor: 2 1 3 1 1 3 1 | ukrainian dorian')",
+            required=False,
+        )
+        parser.add_argument(
+            "-b",
+            "--batch",
+            dest="batch",
+            metavar="FILE",
+            help='BATCH mode. Read one query per line from FILE (\'-\' for stdin) and answer them all. Each query uses the same options as the command line (eg: \'-s C -t major -d\') or is a JSON object (eg: {"chord": "Ab+", "verbose": true})',
+            required=False,
+        )
+        parser.add_argument(
+            "--serve",
+            dest="serve",
+            metavar="ADDRESS",
+            help="SERVER mode. Answer get_scale, get_diatonic_chords and get_chord_notes requests (one JSON object per line) on ADDRESS: 'unix:PATH', 'HOST:PORT' or 'PORT' (on localhost)",
+            required=False,
+        )
+        parser.add_argument(
+            "--profile",
+            dest="profile",
+            help=f"PROFILE the Music_Theory class methods (calls, time, enharmonic fallbacks, scale cache hit rate) and print a report to stderr at exit, as a table (default) or json. Can also be enabled with the {PROFILE_VARIABLE} environment variable",
+            nargs="?",
+            const="table",
+            choices=PROFILE_FORMATS,
+            required=False,
+        )
+    return parser
 
-    ### Validate the argument combinations
 
+_query_parser: argparse.ArgumentParser | None = None
+
+
+def get_query_parser() -> argparse.ArgumentParser:
+    # The parser for batch queries is only created once, and reused for every query
+    global _query_parser
+
+    if _query_parser is None:
+        _query_parser = create_parser(query=True)
+    return _query_parser
+
+
+def validate_arguments(args: argparse.Namespace) -> bool:
     # Cannot provide only scale or type. Both must be provided, or none
     if (args.scale and not args.type) or (args.type and not args.scale):
-        parser.print_help()
-        parser.exit()
+        return False
 
     # Cannot request diatonic chords, if no scale has been specified
     if args.diatonic_chords and not (args.scale and args.type):
-        parser.print_help()
-        parser.exit()
+        return False
 
     # Make sure we have at least a scale or a chord
     if not args.scale and not args.chord:
-        parser.print_help()
-        parser.exit()
+        return False
 
     # Requesting scale and chord is not allowed
     if args.scale and args.chord:
-        parser.print_help()
-        parser.exit()
+        return False
 
-    if args.scale and args.type:
-        # Normalize the scale name and type
+    return True
 
-        scale_name = args.scale.capitalize()
 
-        scale_types = {
-            "major": "major",
-            "minor": "natural minor",
-            "natural": "natural minor",
-            "harmonic": "harmonic minor",
-            "melodic": "melodic minor",
-        }
+def main():
+    # (os is always loaded by the interpreter itself)
+    import os
 
-        if args.type in scale_types:
-            scale_type = scale_types[args.type]
+    ### Parse the command line arguments
+    parser = create_parser()
+    args = parser.parse_args()
 
+    profile_format = args.profile or get_profile_format()
+    if profile_format:
+        # Imported here, as the report is only needed when profiling
+        import atexit
+
+        Music_Theory.enable_profiling()
+        # The report is written even when exiting with sys.exit() or on an error
+        atexit.register(write_profile, profile_format)
+
+    if args.scales:
         try:
-            notes = get_scale(scale_name, scale_type)
+            with open(args.scales, encoding="utf-8") as file:
+                Music_Theory.load_scales(file)
+        except OSError as e:
+            print(f"Unable to read the scales file: {e}")
+            sys.exit(4)
         except ValueError as e:
-            print(f"Unable to generate scale: {e}")
+            print(f"Invalid scales file: {e}")
             sys.exit(1)
 
-        ## Prepare a table with the notes and print the table
+    # The snapshot (if any) is only used when the scale types are the ones it was built with,
+    # so it is loaded after the scales file. (snapshot.py isn't even imported without one.)
+    snapshot = get_snapshot_path()
+    if snapshot and os.path.exists(snapshot):
+        Music_Theory.load_snapshot(snapshot)
 
-        # The first row is initialized with the proper number of headers, starting at 1
-        rows = [range(1, len(notes) + 1)]
-        rows.append(notes)
+    if args.serve:
+        # Imported here, as the server is only needed in this mode
+        import asyncio
+        from server import Theory_Server
 
-        # Print the table
-        print(f"\nNotes for the {scale_name} {scale_type.title()} scale:\n")
-        print(
-            tabulate(
-                rows, headers="firstrow", tablefmt="fancy_outline", stralign="center"
-            )
-        )
-        print()
+        try:
+            # (This module runs as __main__: the server must answer from this class, with the
+            # scale types and the snapshot loaded above, not from another copy of the module)
+            asyncio.run(Theory_Server(Music_Theory).serve(args.serve))
+        except (OSError, ValueError) as e:
+            print(f"Unable to start the server: {e}")
+            sys.exit(5)
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
 
-    if args.diatonic_chords:
-        ## Prepare a table with the chords and print the table
+    if args.batch:
+        # Any other argument is ignored in batch mode, as each query brings its own
+        if args.batch == "-":
+            sys.exit(run_batch(sys.stdin, args.format))
+        try:
+            with open(args.batch, encoding="utf-8") as file:
+                sys.exit(run_batch(file, args.format))
+        except OSError as e:
+            print(f"Unable to read the batch file: {e}")
+            sys.exit(4)
 
-        # The first row is initialized with the header names
-        rows = [["Degree", "Chord", "Triad"]]
+    ### Validate the argument combinations
+    if not validate_arguments(args):
+        parser.print_help()
+        parser.exit()
 
+    if args.scale and args.type:
+        # Normalize the scale name and type
         try:
-            chords = get_diatonic_chords(scale_name, scale_type)
-            for i in range(len(chords)):
-                degree = Music_Theory.SCALE_CHORD_QUALITIES[scale_type][1][i]
-                chord_name = chords[i]
-                notes = get_chord_notes(chord_name)
-
-                rows.append(
-                    [
-                        prepare_pretty_display(degree, verbose=args.verbose),
-                        prepare_pretty_display(chord_name, verbose=args.verbose),
-                        prepare_display_chord_notes(notes),
-                    ]
-                )
+            scale_name = Note.normalize(args.scale)
+            scale_type = Music_Theory.normalize_scale_type(args.type)
+        except ValueError as e:
+            print(f"Unable to generate scale: {e}")
+            sys.exit(1)
+
+        if args.format != "table":
+            # Machine-readable formats write the diatonic chords along with the scale
+            try:
+                write_scale(scale_name, scale_type, args.diatonic_chords, args.format)
+            except ValueError as e:
+                print(f"Unable to generate scale: {e}")
+                sys.exit(1)
+            sys.exit(0)
+
+        try:
+            display_scale(scale_name, scale_type)
+        except ValueError as e:
+            print(f"Unable to generate scale: {e}")
+            sys.exit(1)
+
+    if args.diatonic_chords:
+        try:
+            display_diatonic_chords(scale_name, scale_type, verbose=args.verbose)
         except ValueError as e:
             print(f"Unable to generate the diatonic chords: {e}")
             sys.exit(2)
-
-        # Print the table
-        print(f"\nDiatonic chords for the {scale_name} {scale_type.title()} scale:\n")
-        print(
-            tabulate(
-                rows, headers="firstrow", tablefmt="fancy_outline", stralign="left"
-            )
-        )
-        print()
         sys.exit(0)
 
     if args.chord:
         try:
-            notes = get_chord_notes(args.chord)
+            if args.format == "table":
+                display_chord(args.chord, verbose=args.verbose)
+            else:
+                write_chord(args.chord, args.format)
         except ValueError as e:
             print(f"Unable to generate the chord: {e}")
             sys.exit(3)
 
-        rows = [["Chord", "Triad"]]
+        sys.exit(0)
+
+
+def display_scale(scale_name: str, scale_type: str) -> None:
+    key = (scale_name, scale_type, False, False)
+    text = _rendered_tables.get(key)
+    if text is None:
+        notes = get_scale(scale_name, scale_type)
+
+        # The headers are the degrees, starting at 1
+        table = render_table(
+            [[str(i) for i in range(1, len(notes) + 1)], notes], centered=True
+        )
+        text = f"\nNotes for the {scale_name} {format_scale_type(scale_type)} scale:\n\n{table}\n\n"
+        remember_table(key, text)
+
+    sys.stdout.write(text)
+
+
+def display_diatonic_chords(scale_name: str, scale_type: str, verbose=False) -> None:
+    key = (scale_name, scale_type, True, verbose)
+    text = _rendered_tables.get(key)
+    if text is None:
+        rows = [["Degree", "Chord", "Triad"]]
+        for chord in get_diatonic_harmony(scale_name, scale_type):
+            rows.append(
+                [
+                    # (The degrees of the minor chords are already in lower case)
+                    prepare_pretty_display(
+                        chord.degree,
+                        verbose=verbose,
+                        quality=chord.quality,
+                        label=chord.quality != "m",
+                    ),
+                    prepare_pretty_display(
+                        chord.name, verbose=verbose, quality=chord.quality
+                    ),
+                    prepare_display_chord_notes(chord.notes),
+                ]
+            )
+
+        table = render_table(rows)
+        text = f"\nDiatonic chords for the {scale_name} {format_scale_type(scale_type)} scale:\n\n{table}\n\n"
+        remember_table(key, text)
+
+    sys.stdout.write(text)
+
+
+def display_chord(chord: str, verbose=False) -> None:
+    key = (chord, "", False, verbose)
+    text = _rendered_tables.get(key)
+    if text is None:
+        notes = get_chord_notes(chord)
+        name = prepare_pretty_display(chord, verbose=verbose)
+
+        # Chords of more (or less) than three notes are not triads
+        rows = [["Chord", "Triad" if len(notes) == 3 else "Notes"]]
+        rows.append([name, prepare_display_chord_notes(notes)])
+
+        text = f"\nNotes in chord {name}:\n\n{render_table(rows)}\n\n"
+        remember_table(key, text)
+
+    sys.stdout.write(text)
+
+
+def render_table(rows: Sequence[Sequence[str]], centered=False) -> str:
+    # Draw a table, with the first row as headers, the same way as tabulate(rows,
+    # headers="firstrow", tablefmt="fancy_outline", stralign="left" or "center") would for
+    # these tables: every cell is a string (never parsed as a number) on a single line, and
+    # every character is one column wide (including the symbols of prepare_pretty_display).
+    # As with tabulate, each column is at least 2 columns wider than its header.
+    widths = [len(header) + 2 for header in rows[0]]
+    for row in rows[1:]:
+        for i, cell in enumerate(row):
+            if len(cell) > widths[i]:
+                widths[i] = len(cell)
+
+    # (str.center() would put the odd space on the left, tabulate puts it on the right)
+    align = "^" if centered else "<"
+    separator = f" {TABLE_BORDER} "
+    lines = [
+        left + middle.join([fill * (width + 2) for width in widths]) + right
+        for left, fill, middle, right in TABLE_LINES
+    ]
+    body = [
+        f"{TABLE_BORDER} "
+        + separator.join([f"{cell:{align}{width}}" for cell, width in zip(row, widths)])
+        + f" {TABLE_BORDER}"
+        for row in rows
+    ]
+    return "\n".join([lines[0], body[0], lines[1], *body[1:], lines[2]])
+
+
+def remember_table(key: Tuple[str, str, bool, bool], text: str) -> None:
+    # Keep a rendered table (see display_scale), while the cache is not full
+    if len(_rendered_tables) < TABLE_CACHE_LIMIT:
+        _rendered_tables[key] = text
+
+
+def write_scale(
+    scale_name: str, scale_type: str, diatonic_chords: bool, output_format: str
+) -> None:
+    # Write a scale (and optionally its diatonic chords) in a machine-readable format: "csv",
+    # "json" or "ndjson". Unlike the tables, each value is written to the (buffered) stdout as
+    # soon as it is computed, without preparing any rows first and without loading tabulate.
+    # Verbose mode doesn't apply here: chords and degrees use the internal symbols (eg: "Bo").
+    notes = get_scale(scale_name, scale_type)
+    chords = get_diatonic_harmony(scale_name, scale_type) if diatonic_chords else ()
+    write = sys.stdout.write
+
+    if output_format == "csv":
+        # Note names, diatonic chord names and degrees never contain commas nor quotes, so they
+        # don't need to be quoted.
+        # Same layout as the tables: the degrees as headers, then the notes.
+        write(",".join([str(i) for i in range(1, len(notes) + 1)]) + "\n")
+        write(",".join(notes) + "\n")
+        if diatonic_chords:
+            write("\nDegree,Chord,Triad\n")
+            for chord in chords:
+                write(f"{chord.degree},{chord.name},")
+                write(prepare_display_chord_notes(chord.notes) + "\n")
+        return
+
+    import json
+
+    scale = f'{{"scale": {json.dumps(scale_name)}, "type": {json.dumps(scale_type)}'
+    if output_format == "ndjson":
+        # One object for the scale, then one object per diatonic chord
+        write(f'{scale}, "notes": {json.dumps(notes)}}}\n')
+        for chord in chords:
+            write(f'{scale}, "degree": {json.dumps(chord.degree)}, ')
+            write(f'"chord": {json.dumps(chord.name)}, ')
+            write(f'"triad": {json.dumps(list(chord.notes))}}}\n')
+    else:
+        # A single object, with the diatonic chords as a list of objects
+        write(f'{scale}, "notes": {json.dumps(notes)}')
+        if diatonic_chords:
+            write(', "diatonic_chords": [')
+            for i, chord in enumerate(chords):
+                write(f'{", " if i else ""}{{"degree": {json.dumps(chord.degree)}, ')
+                write(f'"chord": {json.dumps(chord.name)}, ')
+                write(f'"triad": {json.dumps(list(chord.notes))}}}')
+            write("]")
+        write("}\n")
+
+
+def write_chord(chord: str, output_format: str) -> None:
+    # Write the notes of a chord in a machine-readable format: "csv", "json" or "ndjson"
+    notes = get_chord_notes(chord)
+
+    if output_format == "csv":
+        # Unlike the notes, the chord name may contain commas (eg: "C7(b9,#11)"), quote it if needed
+        if "," in chord or '"' in chord:
+            chord = '"' + chord.replace('"', '""') + '"'
+        sys.stdout.write(f"Chord,Triad\n{chord},{prepare_display_chord_notes(notes)}\n")
+    else:
+        import json
+
+        # JSON and NDJSON are the same for a single object
+        sys.stdout.write(
+            f'{{"chord": {json.dumps(chord)}, "triad": {json.dumps(notes)}}}\n'
+        )
+
+
+def get_profile_format() -> str | None:
+    # Profiling format requested through the environment, if any
+    import os
+
+    value = os.environ.get(PROFILE_VARIABLE, "").strip().lower()
+    if value in ("", "0", "no", "false"):
+        return None
+    return value if value in PROFILE_FORMATS else "table"
+
+
+def get_snapshot_path() -> str | None:
+    # Path of the snapshot, or None when disabled through the environment
+    import os
+
+    path = os.environ.get(SNAPSHOT_VARIABLE)
+    if path is None:
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)), SNAPSHOT_FILE)
+    return path or None
+
+
+def write_profile(output_format: str = "table", file=None) -> None:
+    # Write the profiling report (see Music_Theory.get_profile), to stderr by default so that
+    # it never mixes with the output meant for programs
+    file = file or sys.stderr
+    profile = Music_Theory.get_profile()
+
+    if output_format == "json":
+        import json
+
+        file.write(json.dumps(profile) + "\n")
+        return
+
+    from tabulate import tabulate
+
+    methods: Dict[str, Dict[str, float]] = profile["methods"]  # type: ignore[assignment]
+    cache: Dict[str, float] = profile["scale_cache"]  # type: ignore[assignment]
+    rows: List[List[object]] = [["Method", "Calls", "Total (ms)", "Per call (us)"]]
+    for name, stats in sorted(
+        methods.items(), key=lambda item: item[1]["seconds"], reverse=True
+    ):
         rows.append(
             [
-                prepare_pretty_display(args.chord, verbose=args.verbose),
-                prepare_display_chord_notes(notes),
+                name,
+                stats["calls"],
+                f"{stats['seconds'] * 1000:.3f}",
+                f"{stats['seconds'] * 1e6 / stats['calls']:.2f}",
             ]
         )
+    print(tabulate(rows, headers="firstrow", tablefmt="fancy_outline"), file=file)
+    print(f"Enharmonic fallbacks: {profile['enharmonic_fallbacks']}", file=file)
+    print(
+        f"Scale cache: {cache['hits']} hits, {cache['misses']} misses, "
+        f"{cache['size']} scales, {cache['hit_rate']:.1%} hit rate",
+        file=file,
+    )
 
-        # Print the table
-        print(
-            f"\nNotes in chord {prepare_pretty_display(args.chord, verbose=args.verbose)}:\n"
-        )
-        print(
-            tabulate(
-                rows, headers="firstrow", tablefmt="fancy_outline", stralign="left"
-            )
+
+def parse_query(line: str) -> argparse.Namespace:
+    # A query is either a JSON object or a list of command-line options
+    if line.startswith("{"):
+        import json
+
+        try:
+            query = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON: {e}")
+        if not isinstance(query, dict):
+            raise ValueError("Invalid JSON: expecting an object")
+
+        unknown = set(query) - {
+            "scale",
+            "type",
+            "diatonic",
+            "chord",
+            "verbose",
+            "format",
+        }
+        if unknown:
+            raise ValueError(f"Unknown keys: {', '.join(sorted(unknown))}")
+        # (null is the same as a missing key)
+        for key, expected in (
+            ("scale", str),
+            ("type", str),
+            ("chord", str),
+            ("format", str),
+            ("diatonic", bool),
+            ("verbose", bool),
+        ):
+            if query.get(key) is not None and not isinstance(query[key], expected):
+                raise ValueError(
+                    f"Invalid value for {key}: {query[key]!r} (expecting a {'string' if expected is str else 'boolean'})"
+                )
+        if query.get("format") is not None and query["format"] not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported format: {query['format']}")
+
+        from argparse import Namespace
+
+        args = Namespace(
+            scale=query.get("scale"),
+            type=query.get("type"),
+            diatonic_chords=bool(query.get("diatonic")),
+            chord=query.get("chord"),
+            verbose=bool(query.get("verbose")),
+            format=query.get("format"),
         )
-        print()
+    else:
+        import shlex
 
-        sys.exit(0)
+        args = get_query_parser().parse_args(shlex.split(line))
+
+    # Any registered scale type is accepted, so they can't be listed as argparse choices
+    if args.type is not None:
+        try:
+            Music_Theory.normalize_scale_type(str(args.type))
+        except ValueError:
+            raise ValueError(f"Unsupported scale type: {args.type}")
+    return args
+
+
+def run_query(args: argparse.Namespace, output_format: str = "table") -> None:
+    # Answer a single (batch) query, raising a ValueError for any problem.
+    # The format of the query itself (if any) takes precedence over output_format.
+    if not validate_arguments(args):
+        raise ValueError("Invalid combination of arguments")
+
+    output_format = args.format or output_format
+
+    if args.scale:
+        scale_type = Music_Theory.normalize_scale_type(args.type)
+        try:
+            scale_name = Note.normalize(args.scale)
+            if output_format != "table":
+                write_scale(scale_name, scale_type, args.diatonic_chords, output_format)
+                return
+            display_scale(scale_name, scale_type)
+        except ValueError as e:
+            raise ValueError(f"Unable to generate scale: {e}")
+
+        if args.diatonic_chords:
+            try:
+                display_diatonic_chords(scale_name, scale_type, verbose=args.verbose)
+            except ValueError as e:
+                raise ValueError(f"Unable to generate the diatonic chords: {e}")
+    else:
+        try:
+            if output_format != "table":
+                write_chord(args.chord, output_format)
+            else:
+                display_chord(args.chord, verbose=args.verbose)
+        except ValueError as e:
+            raise ValueError(f"Unable to generate the chord: {e}")
+
+
+def run_batch(lines: Iterable[str], output_format: str = "table") -> int:
+    # Answer every query in the same process, as they are read. Blank lines and comments
+    # (starting with "#") are skipped. A bad query is reported on stderr (with its line number)
+    # and the next queries are still processed.
+    # Queries without a format of their own use output_format.
+    # Returns the exit status: 0 if all the queries succeeded, 1 otherwise
+    status = 0
+
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        try:
+            run_query(parse_query(line), output_format)
+        except ValueError as e:
+            print(f"Line {line_number}: {e}", file=sys.stderr)
+            status = 1
+
+    return status
 
 
 def get_scale(tonic: str, variant="major") -> List[str]:
@@ -484,34 +2510,107 @@ def get_scale(tonic: str, variant="major") -> List[str]:
     return Music_Theory.get_scale(tonic, variant)
 
 
+def get_scales(tonics: Iterable[str], variants: Iterable[str]) -> Scale_Table:
+    # Use a class method to generate our values
+    return Music_Theory.get_scales(tonics, variants)
+
+
+def get_key_signature(tonic: str, variant="major") -> int:
+    # Use a class method to generate our values
+    return Music_Theory.get_key_signature(tonic, variant)
+
+
+def get_key_signature_notes(tonic: str, variant="major") -> List[str]:
+    # Use a class method to generate our values
+    return Music_Theory.get_key_signature_notes(tonic, variant)
+
+
 def get_diatonic_chords(tonic: str, variant="major") -> List[str]:
     # Use a class method to generate our values
     return Music_Theory.get_diatonic_chords(tonic, variant)
 
 
+def get_diatonic_harmony(
+    tonic: str, variant="major", sevenths=False
+) -> Tuple[Diatonic_Chord, ...]:
+    # Use a class method to generate our values
+    return Music_Theory.get_diatonic_harmony(tonic, variant, sevenths)
+
+
 def get_chord_notes(chord: str) -> List[str]:
     # Use a class method to generate our values
     return Music_Theory.get_chord_notes(chord)
 
 
-def prepare_pretty_display(val: str, verbose=False) -> str:
+def get_chord_degree(chord: str, tonic: str, variant="major") -> str | None:
+    # Use a class method to generate our values
+    return Music_Theory.get_chord_degree(chord, tonic, variant)
+
+
+def detect_key(chords: Iterable[str]) -> Tuple[str, str, float]:
+    # Use a class method to generate our values (only the best key)
+    return Music_Theory.detect_key(chords)[0]
+
+
+def transpose_chord(chord: str, steps: int, half_steps: int) -> str:
+    # Use a class method to generate our values
+    return Music_Theory.transpose_chord(chord, steps, half_steps)
+
+
+def get_voicings(
+    chord: str, voices: int = 4, **constraints
+) -> Iterator[Tuple[int, ...]]:
+    # Use a class method to generate our values
+    return Music_Theory.get_voicings(chord, voices, **constraints)
+
+
+def identify_chord(notes: Iterable[str]) -> List[Tuple[str, str]]:
+    # Use a class method to generate our values
+    return Music_Theory.identify_chord(notes)
+
+
+def find_scales(notes: Iterable[str]) -> List[Tuple[str, str, List[str]]]:
+    # Use a class method to generate our values
+    return Music_Theory.find_scales(notes)
+
+
+def format_scale_type(scale_type: str) -> str:
+    # Scale type as displayed in the titles, eg: "Natural Minor" or "Dorian b2"
+    return " ".join(
+        word if word[1:].isdigit() else word.capitalize() for word in scale_type.split()
+    )
+
+
+def prepare_pretty_display(
+    val: str, verbose=False, quality: str | None = None, label=True
+) -> str:
+    # In verbose mode, the label of the triad quality ("M", "m", "o" or "+", as in
+    # Music_Theory.TRIAD_QUALITIES) is added, unless label is False (eg: for the degrees of
+    # the minor chords, already in lower case). The quality is read from the chord name by
+    # the chord parser (eg: "dim" or "°" in "Cdim" or "C°"), unless given (eg: for a degree).
+    # Names that are not triads for the parser are labelled by their trailing symbol.
+    if verbose and label and quality is None:
+        symbol = Music_Theory.parse_chord_symbol(val)
+        if symbol:
+            quality = symbol[1]
+        elif val.endswith("-"):
+            quality = "o"
+        elif val[-1:] in ("o", "+", "m"):
+            quality = val[-1]
+
     if val.endswith("o") or val.endswith("-"):
         # Substitute the trailing "o" or "-" (diminished) to a degree sign, to approximate "superscript o"
-        val = re.sub(r"[o\-]$", f"\N{DEGREE SIGN}", val)
-        if verbose:
-            val = val + " (dim)"
+        val = val[:-1] + "\N{DEGREE SIGN}"
     elif val.endswith("+"):
         # Substitute the trailing "+" (augmented) to a superscript +
-        val = re.sub(r"\+$", f"\u207A", val)
-        if verbose:
-            val = val + " (aug)"
-    elif val.endswith("m") and verbose:
-        val = val + " (min)"
+        val = val[:-1] + "\u207A"
 
+    if verbose and label:
+        val += QUALITY_LABELS.get(quality or "", "")
     return val
 
 
-def prepare_display_chord_notes(notes: List[str], sep=" - ") -> str:
+def prepare_display_chord_notes(notes: Sequence[str], sep=" - ") -> str:
     return sep.join(notes)
 
 
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Dict, List, Tuple, Type
+
+# project is imported lazily by the server: "project.py --serve" runs it as __main__, and
+# passes its own Music_Theory class (with the scale types loaded from the command line)
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from project import Music_Theory
+
+# Methods that can be called by the clients
+METHODS = ["get_scale", "get_diatonic_chords", "get_chord_notes"]
+
+# Queries sent by the load generator, similar to the ones in run_all.sh
+LOAD_QUERIES = [
+    {"method": method, "params": {"tonic": tonic, "variant": variant}}
+    for method in ("get_scale", "get_diatonic_chords")
+    for tonic in "C C# Db D D# Eb E F F# Gb G G# Ab A A# Bb B".split()
+    for variant in ("major", "minor", "harmonic minor", "melodic minor")
+] + [
+    {"method": "get_chord_notes", "params": {"chord": root + quality}}
+    for root in "C C# Db D D# Eb E F F# Gb G G# Ab A A# Bb B".split()
+    for quality in ("", "m", "o", "+")
+]
+
+
+class Theory_Server:
+    """
+    Long-running server answering get_scale, get_diatonic_chords and get_chord_notes requests,
+    so that a backend doesn't have to start a new python process for every lookup.
+
+    The protocol is one JSON object per line, in both directions. A request looks like
+    {"id": 1, "method": "get_scale", "params": {"tonic": "C", "variant": "major"}} and gets
+    either {"id": 1, "result": [...]} or {"id": 1, "error": "..."} in return.
+
+    Clients may send many requests without waiting for the answers (pipelining), the answers
+    are always sent back in the same order as the requests.
+
+    """
+
+    def __init__(self, theory: Type[Music_Theory] | None = None) -> None:
+        # The answers come from the given class (project.Music_Theory by default).
+        # All the results for the common spellings are computed once, when the server starts.
+        if theory is None:
+            from project import Music_Theory
+
+            theory = Music_Theory
+        self.theory: Type[Music_Theory] = theory
+        self.tables: Dict[Tuple[str, ...], List[str]] = {}
+        self.requests = 0
+
+        theory.precompute_scales()
+        for tonic in theory.get_valid_tonics():
+            for variant in theory.INTERVALS:
+                self.tables[("get_scale", tonic, variant)] = theory.get_scale(
+                    tonic, variant
+                )
+                self.tables[("get_diatonic_chords", tonic, variant)] = (
+                    theory.get_diatonic_chords(tonic, variant)
+                )
+            for quality in ("", "m", "o", "-", "+"):
+                chord = tonic + quality
+                self.tables[("get_chord_notes", chord)] = theory.get_chord_notes(chord)
+
+    def call(self, method: str, params: Dict[str, str]) -> List[str]:
+        if not isinstance(method, str) or method not in METHODS:
+            raise ValueError(f"Unknown method: {method}")
+        # (A value of another type would raise something else than a ValueError further on)
+        for name, value in params.items():
+            if not isinstance(value, str):
+                raise ValueError(f"Invalid parameter: {name} must be a string")
+
+        if method == "get_chord_notes":
+            if "chord" not in params:
+                raise ValueError("Missing parameter: chord")
+            key: Tuple[str, ...] = (method, params["chord"])
+        else:
+            if "tonic" not in params:
+                raise ValueError("Missing parameter: tonic")
+            # Accept the same aliases as on the command line (eg: "harmonic")
+            variant = self.theory.normalize_scale_type(params.get("variant", "major"))
+            key = (method, params["tonic"], variant)
+
+        result = self.tables.get(key)
+        if result is None:
+            # Not one of the precomputed spellings, compute it now
+            result = getattr(self.theory, method)(*key[1:])
+        return result
+
+    def answer(self, line: bytes) -> bytes:
+        self.requests += 1
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Invalid request: expecting an object")
+            request_id = request.get("id")
+            params = request.get("params", {})
+            if not isinstance(params, dict):
+                raise ValueError("Invalid request: params must be an object")
+            response = {
+                "id": request_id,
+                "result": self.call(request.get("method", ""), params),
+            }
+        except ValueError as e:
+            # json.JSONDecodeError is also a ValueError
+            response = {"id": request_id, "error": str(e)}
+
+        return json.dumps(response).encode() + b"\n"
+
+    async def handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while line := await reader.readline():
+                if line.strip():
+                    writer.write(self.answer(line))
+                # Only pauses when the client doesn't read its answers fast enough
+                await writer.drain()
+        except ConnectionError:
+            pass
+        except ValueError:
+            # A line longer than the limit of the reader (64 KiB): the rest of the stream can't
+            # be split in requests anymore, so the connection is closed after the answer (which
+            # closing the writer still sends)
+            response = {"id": None, "error": "Invalid request: line too long"}
+            writer.write(json.dumps(response).encode() + b"\n")
+        finally:
+            writer.close()
+
+    async def start(self, address: str) -> asyncio.AbstractServer:
+        if address.startswith("unix:"):
+            return await asyncio.start_unix_server(self.handle_client, address[5:])
+
+        host, port = parse_address(address)
+        return await asyncio.start_server(self.handle_client, host, port)
+
+    async def serve(self, address: str) -> None:
+        server = await self.start(address)
+        print(f"Listening on {address}", file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    # "HOST:PORT" or just "PORT" (on localhost)
+    host, _, port = address.rpartition(":")
+    if not port.isdigit() or int(port) > 65535:
+        raise ValueError(f"Invalid address: {address}")
+    return host or "127.0.0.1", int(port)
+
+
+async def open_connection(
+    address: str,
+) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    if address.startswith("unix:"):
+        return await asyncio.open_unix_connection(address[5:])
+    return await asyncio.open_connection(*parse_address(address))
+
+
+async def run_client(
+    address: str, requests: int, pipeline: int, offset: int
+) -> List[float]:
+    # Send the requests in groups of `pipeline`, without waiting for the answers in between.
+    # Returns the latency of every request, in seconds.
+    reader, writer = await open_connection(address)
+    latencies = []
+
+    for start in range(0, requests, pipeline):
+        count = min(pipeline, requests - start)
+        sent = time.perf_counter()
+        for i in range(start, start + count):
+            query = LOAD_QUERIES[(offset + i) % len(LOAD_QUERIES)]
+            writer.write(json.dumps({"id": i, **query}).encode() + b"\n")
+        await writer.drain()
+
+        for _ in range(count):
+            response = json.loads(await reader.readline())
+            if "error" in response:
+                raise ValueError(f"Unexpected error: {response['error']}")
+            latencies.append(time.perf_counter() - sent)
+
+    writer.close()
+    await writer.wait_closed()
+    return latencies
+
+
+async def run_load(
+    address: str, clients: int, requests: int, pipeline: int
+) -> Dict[str, float]:
+    # Load generator: each client sends `requests` requests, all the clients run concurrently
+    if clients < 1 or requests < 1:
+        raise ValueError("at least one client and one request are needed")
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(run_client(address, requests, pipeline, c * 7) for c in range(clients))
+    )
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for result in results for latency in result)
+    return {
+        "requests": len(latencies),
+        "seconds": elapsed,
+        "requests_per_second": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load generator for the server started with 'project.py --serve ADDRESS'. Reports the requests per second and the latency percentiles."
+    )
+    parser.add_argument(
+        "address",
+        help="ADDRESS of the server: 'unix:PATH', 'HOST:PORT' or 'PORT' (on localhost)",
+    )
+    parser.add_argument(
+        "-c", dest="clients", type=int, default=8, help="Number of concurrent CLIENTS"
+    )
+    parser.add_argument(
+        "-n",
+        dest="requests",
+        type=int,
+        default=10000,
+        help="Number of REQUESTS sent by each client",
+    )
+    parser.add_argument(
+        "-p",
+        dest="pipeline",
+        type=int,
+        default=16,
+        help="Number of requests sent by a client before waiting for the answers (PIPELINE depth)",
+    )
+    args = parser.parse_args()
+
+    try:
+        stats = asyncio.run(
+            run_load(args.address, args.clients, args.requests, max(1, args.pipeline))
+        )
+    except (OSError, ValueError) as e:
+        print(f"Load test failed: {e}")
+        sys.exit(1)
+
+    print(
+        f"{stats['requests']:.0f} requests in {stats['seconds']:.2f}s: "
+        f"{stats['requests_per_second']:.0f} requests/sec, "
+        f"p50 {stats['p50_ms']:.3f} ms, p99 {stats['p99_ms']:.3f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+import sys
+
+from project import Music_Theory
+
+# Like project.py, this module only imports what every code path needs: numpy is imported by
+# the batch functions, argparse by main().
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import numpy as np
+    from typing import Dict, Iterable, List, Tuple
+
+# Pitch-class sets are 12-bit integers, as returned by Music_Theory.get_pitch_class_mask():
+# bit 0 == C, bit 1 == C#/Db, ..., bit 11 == B
+SET_COUNT = 1 << 12
+FULL_MASK = SET_COUNT - 1
+
+# Pitch classes 10 and 11, as written in prime forms (eg: "(02468T)")
+PITCH_CLASS_DIGITS = "0123456789TE"
+
+# Forte's catalog of set classes of 3 to 6 pitch classes, in the order of their numbers (eg:
+# the 11th trichord is 3-11, the minor and major triads). Each set class is given by one of
+# its sets, as found in the literature: the prime forms are computed (see find_prime_form).
+# The set classes of 7 to 9 pitch classes have the number of their complement (eg: 7-35, the
+# diatonic scale, is the complement of 5-35, the pentatonic scale), and the other ones are
+# numbered in the order of their prime forms (eg: 2-1 to 2-6, by interval class).
+FORTE_CATALOG = {
+    3: "012 013 014 015 016 024 025 026 027 036 037 048",
+    4: "0123 0124 0134 0125 0126 0127 0145 0156 0167 0235 0135 0236 0136 0237 0146 0157 "
+    "0347 0147 0148 0158 0246 0247 0257 0248 0268 0358 0258 0369 0137",
+    5: "01234 01235 01245 01236 01237 01256 01267 02346 01246 01346 02347 01356 01248 "
+    "01257 01268 01347 01348 01457 01367 01378 01458 01478 02357 01357 02358 02458 01358 "
+    "02368 01368 01468 01369 01469 02468 02469 02479 01247 03458 01258",
+    6: "012345 012346 012356 012456 012367 012567 012678 023457 012357 013457 012457 "
+    "012467 013467 013458 012458 014568 012478 012578 013478 014589 023468 012468 023568 "
+    "013468 013568 013578 013469 013569 013689 013679 013589 024579 023579 013579 02468T "
+    "012347 012348 012378 023458 012358 012368 012369 012568 012569 023469 012469 012479 "
+    "012579 013479 014679",
+}
+
+
+class Set_Class:
+    """
+    A set class: the pitch-class sets that are transpositions or inversions of each other.
+
+        name: the Forte name (eg: "3-11", "4-Z15"). A "Z" marks the set classes that have
+              the same interval vector as another one (of the same size)
+        prime_form: the pitch classes of the prime form, from 0 (eg: (0, 3, 7))
+        interval_vector: the number of intervals of each interval class, 1 to 6
+        number: the index of the set class in SET_CLASSES
+
+    """
+
+    __slots__ = ("name", "prime_form", "interval_vector", "number")
+
+    def __init__(
+        self,
+        name: str,
+        prime_form: Tuple[int, ...],
+        interval_vector: Tuple[int, ...],
+        number: int,
+    ) -> None:
+        self.name = name
+        self.prime_form = prime_form
+        self.interval_vector = interval_vector
+        self.number = number
+
+    def __repr__(self) -> str:
+        return f"Set_Class({self.name!r}, {format_pitch_classes(self.prime_form)})"
+
+
+def get_pitch_classes(mask: int) -> Tuple[int, ...]:
+    # The pitch classes of a set, in ascending order
+    return tuple([pitch for pitch in range(12) if mask >> pitch & 1])
+
+
+def get_set_mask(pitch_classes: Iterable[int]) -> int:
+    mask = 0
+    for pitch in pitch_classes:
+        mask |= 1 << pitch % 12
+    return mask
+
+
+def transpose_set(mask: int, half_steps: int) -> int:
+    # Tn: rotate the 12 bits
+    half_steps %= 12
+    return (mask << half_steps | mask >> (12 - half_steps)) & FULL_MASK
+
+
+def invert_set(mask: int, half_steps: int = 0) -> int:
+    # TnI: the inversion around C (pitch class p becomes -p), then transposed
+    inverted = 0
+    for pitch in range(12):
+        if mask >> pitch & 1:
+            inverted |= 1 << (-pitch % 12)
+    return transpose_set(inverted, half_steps)
+
+
+def find_normal_form(mask: int) -> Tuple[int, ...]:
+    # The rotation of the pitch classes (in ascending order) that spans the smallest interval,
+    # and then is the most packed to the left: the smallest interval from the first pitch class
+    # to the second one, then to the third one, etc. (Forte's algorithm). Ties between the
+    # rotations of symmetrical sets go to the lowest first pitch class.
+    pitches = get_pitch_classes(mask)
+    best: Tuple[int, ...] = ()
+    best_intervals: Tuple[int, ...] = ()
+    for start in range(len(pitches)):
+        rotation = pitches[start:] + pitches[:start]
+        intervals = tuple([(pitch - rotation[0]) % 12 for pitch in rotation])
+        intervals = intervals[-1:] + intervals[1:]
+        if not best or intervals < best_intervals:
+            best, best_intervals = rotation, intervals
+    return best
+
+
+def find_prime_form(mask: int) -> Tuple[int, ...]:
+    # The normal form of the set or of its inversion, transposed to 0, whichever is the most
+    # packed to the left
+    forms = []
+    for candidate in (mask, invert_set(mask)):
+        normal = find_normal_form(candidate)
+        forms.append(tuple([(pitch - normal[0]) % 12 for pitch in normal]))
+    return min(forms)
+
+
+def find_interval_vector(mask: int) -> Tuple[int, ...]:
+    # Number of pairs of pitch classes at each interval class (1 to 6 half-steps, either way)
+    pitches = get_pitch_classes(mask)
+    vector = [0] * 6
+    for i, low in enumerate(pitches):
+        for high in pitches[i + 1 :]:
+            interval = high - low
+            vector[min(interval, 12 - interval) - 1] += 1
+    return tuple(vector)
+
+
+def format_pitch_classes(pitches: Iterable[int]) -> str:
+    # eg: "(02468T)"
+    return "(" + "".join([PITCH_CLASS_DIGITS[pitch] for pitch in pitches]) + ")"
+
+
+def parse_pitch_classes(text: str) -> Tuple[int, ...]:
+    return tuple([PITCH_CLASS_DIGITS.index(digit) for digit in text])
+
+
+def build_set_tables() -> (
+    Tuple[List[Set_Class], List[int], List[Tuple[int, ...]], List[int], List[int]]
+):
+    # Compute the properties of all the 4096 pitch-class sets, once, when the module is
+    # imported. Returns the set classes (by size, then Forte number) and, for each set (by
+    # mask): the number of its set class, its normal form, the mask of its prime form, and
+    # the lowest mask among its transpositions (the same for sets of the same Tn class)
+    prime_masks = [0] * SET_COUNT
+    normal_forms: List[Tuple[int, ...]] = [()] * SET_COUNT
+    transposition_masks = [-1] * SET_COUNT
+    primes: Dict[int, Tuple[int, ...]] = {}
+    for mask in range(SET_COUNT):
+        if transposition_masks[mask] >= 0:
+            continue
+
+        # The first set of a Tn class found is its lowest one. Its normal form and its prime
+        # form are found once, and transposed for the others (except for the symmetrical
+        # sets, as the ties between their rotations go to the lowest first pitch class).
+        transpositions = [transpose_set(mask, half_steps) for half_steps in range(12)]
+        symmetrical = len(set(transpositions)) < 12
+        normal = find_normal_form(mask)
+        prime = find_prime_form(mask) if mask else ()
+        prime_mask = get_set_mask(prime)
+        primes[prime_mask] = prime
+        for half_steps, transposed in enumerate(transpositions):
+            if transposition_masks[transposed] < 0:
+                transposition_masks[transposed] = mask
+                prime_masks[transposed] = prime_mask
+                normal_forms[transposed] = (
+                    find_normal_form(transposed)
+                    if symmetrical
+                    else tuple([(pitch + half_steps) % 12 for pitch in normal])
+                )
+
+    # Number the set classes, in Forte's order (see FORTE_CATALOG)
+    order: Dict[int, Tuple[int, int]] = {}
+    for size, catalog in FORTE_CATALOG.items():
+        for number, text in enumerate(catalog.split(), start=1):
+            prime_mask = prime_masks[get_set_mask(parse_pitch_classes(text))]
+            order[prime_mask] = (size, number)
+            if size < 6:
+                order[prime_masks[FULL_MASK & ~prime_mask]] = (12 - size, number)
+    for size in (0, 1, 2):
+        others = sorted(
+            [prime for prime in primes.values() if len(prime) == size],
+            key=lambda prime: prime,
+        )
+        for number, prime in enumerate(others, start=1):
+            order[get_set_mask(prime)] = (size, number)
+            order[prime_masks[FULL_MASK & ~get_set_mask(prime)]] = (12 - size, number)
+
+    vectors = {prime_mask: find_interval_vector(prime_mask) for prime_mask in primes}
+    shared: Dict[Tuple[int, Tuple[int, ...]], int] = {}
+    for prime_mask, vector in vectors.items():
+        key = (len(primes[prime_mask]), vector)
+        shared[key] = shared.get(key, 0) + 1
+
+    set_classes: List[Set_Class] = []
+    class_numbers: Dict[int, int] = {}
+    for prime_mask in sorted(primes, key=lambda prime_mask: order[prime_mask]):
+        size, number = order[prime_mask]
+        z = "Z" if shared[(size, vectors[prime_mask])] > 1 else ""
+        class_numbers[prime_mask] = len(set_classes)
+        set_classes.append(
+            Set_Class(
+                f"{size}-{z}{number}",
+                primes[prime_mask],
+                vectors[prime_mask],
+                len(set_classes),
+            )
+        )
+
+    return (
+        set_classes,
+        [class_numbers[prime_mask] for prime_mask in prime_masks],
+        normal_forms,
+        prime_masks,
+        transposition_masks,
+    )
+
+
+# The 224 set classes, and for each of the 4096 sets (by mask): the number of its set class,
+# its normal form, the mask of its prime form and the mask of its Tn class (see
+# build_set_tables). Every query below is a lookup in these tables.
+(
+    SET_CLASSES,
+    SET_CLASS_NUMBERS,
+    NORMAL_FORMS,
+    PRIME_MASKS,
+    TRANSPOSITION_MASKS,
+) = build_set_tables()
+FORTE_NAMES = {set_class.name: set_class for set_class in SET_CLASSES}
+
+# The same tables as numpy arrays, built by get_set_arrays() for the batch functions
+_set_arrays: Dict[str, np.ndarray] = {}
+
+
+def get_notes_mask(notes: Iterable[str]) -> int:
+    # The set of a collection of notes, eg: get_scale("D", "dorian"), get_chord_notes("G7")
+    return Music_Theory.get_pitch_class_mask(notes)
+
+
+def check_mask(mask: int) -> int:
+    if not 0 <= mask < SET_COUNT:
+        raise ValueError(
+            f"Invalid pitch-class set: {mask} (expecting 0 to {FULL_MASK})"
+        )
+    return mask
+
+
+def get_set_class(mask: int) -> Set_Class:
+    return SET_CLASSES[SET_CLASS_NUMBERS[check_mask(mask)]]
+
+
+def get_normal_form(mask: int) -> Tuple[int, ...]:
+    return NORMAL_FORMS[check_mask(mask)]
+
+
+def get_prime_form(mask: int) -> Tuple[int, ...]:
+    return get_set_class(mask).prime_form
+
+
+def get_forte_name(mask: int) -> str:
+    return get_set_class(mask).name
+
+
+def get_interval_vector(mask: int) -> Tuple[int, ...]:
+    return get_set_class(mask).interval_vector
+
+
+def is_transposition(mask: int, other: int) -> bool:
+    # Whether two sets are related by transposition (Tn)
+    return (
+        TRANSPOSITION_MASKS[check_mask(mask)] == TRANSPOSITION_MASKS[check_mask(other)]
+    )
+
+
+def is_equivalent(mask: int, other: int) -> bool:
+    # Whether two sets are related by transposition or inversion (TnI): same set class
+    return SET_CLASS_NUMBERS[check_mask(mask)] == SET_CLASS_NUMBERS[check_mask(other)]
+
+
+def get_set_arrays() -> Dict[str, np.ndarray]:
+    # The tables as numpy arrays (built on first use): "classes" (set class number of each
+    # set), "primes" (prime form mask of each set), "transpositions" (Tn class of each set),
+    # "vectors" (interval vector of each set class, one row per set class) and "names" (Forte
+    # name of each set class)
+    import numpy as np
+
+    if not _set_arrays:
+        _set_arrays["classes"] = np.array(SET_CLASS_NUMBERS, dtype=np.int16)
+        _set_arrays["primes"] = np.array(PRIME_MASKS, dtype=np.int16)
+        _set_arrays["transpositions"] = np.array(TRANSPOSITION_MASKS, dtype=np.int16)
+        _set_arrays["vectors"] = np.array(
+            [set_class.interval_vector for set_class in SET_CLASSES], dtype=np.int8
+        )
+        _set_arrays["names"] = np.array([set_class.name for set_class in SET_CLASSES])
+    return _set_arrays
+
+
+def check_masks(masks: Iterable[int] | np.ndarray) -> np.ndarray:
+    # An array of sets, checked once for the whole batch
+    import numpy as np
+
+    masks = np.asarray(masks)
+    if masks.size and (
+        masks.dtype.kind not in "iu" or masks.min() < 0 or masks.max() > FULL_MASK
+    ):
+        raise ValueError(f"Invalid pitch-class sets (expecting 0 to {FULL_MASK})")
+    return masks.astype(np.intp, copy=False)
+
+
+def get_set_class_numbers(masks: Iterable[int] | np.ndarray) -> np.ndarray:
+    # Set class number (index in SET_CLASSES) of each set, in an array of the same shape
+    return get_set_arrays()["classes"][check_masks(masks)]
+
+
+def get_prime_masks(masks: Iterable[int] | np.ndarray) -> np.ndarray:
+    return get_set_arrays()["primes"][check_masks(masks)]
+
+
+def get_forte_names(masks: Iterable[int] | np.ndarray) -> np.ndarray:
+    arrays = get_set_arrays()
+    return arrays["names"][arrays["classes"][check_masks(masks)]]
+
+
+def get_interval_vectors(masks: Iterable[int] | np.ndarray) -> np.ndarray:
+    # One more dimension than masks, of 6 interval classes
+    arrays = get_set_arrays()
+    return arrays["vectors"][arrays["classes"][check_masks(masks)]]
+
+
+def get_transposition_masks(masks: Iterable[int] | np.ndarray) -> np.ndarray:
+    # The lowest transposition of each set: equal for the sets related by transposition
+    return get_set_arrays()["transpositions"][check_masks(masks)]
+
+
+def transpose_sets(masks: Iterable[int] | np.ndarray, half_steps: int) -> np.ndarray:
+    masks = check_masks(masks)
+    half_steps %= 12
+    return (masks << half_steps | masks >> (12 - half_steps)) & FULL_MASK
+
+
+def main():
+    import argparse
+
+    from project import Note
+
+    parser = argparse.ArgumentParser(
+        description="Describe a pitch-class set: normal form, prime form, Forte name and interval vector. The set is given by notes, a scale or a chord."
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument(
+        "-n", dest="notes", help="NOTES separated by spaces (eg: 'C E G Bb')"
+    )
+    source.add_argument(
+        "-s", dest="scale", help="Set of the notes of this SCALE (eg: 'D'), with -t"
+    )
+    source.add_argument("-c", dest="chord", help="Set of the notes of this CHORD")
+    parser.add_argument(
+        "-t", dest="type", default="major", help="TYPE of scale (default: major)"
+    )
+    args = parser.parse_args()
+
+    try:
+        if args.notes:
+            notes = [Note.normalize(note) for note in args.notes.split()]
+        elif args.scale:
+            notes = Music_Theory.get_scale(Note.normalize(args.scale), args.type)
+        else:
+            notes = Music_Theory.get_chord_notes(args.chord)
+    except ValueError as e:
+        print(f"Invalid set: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    mask = get_notes_mask(notes)
+    set_class = get_set_class(mask)
+    print(f"Pitch classes: {format_pitch_classes(get_pitch_classes(mask))}")
+    print(f"Normal form: {format_pitch_classes(get_normal_form(mask))}")
+    print(f"Prime form: {format_pitch_classes(set_class.prime_form)}")
+    print(f"Forte name: {set_class.name}")
+    print(f"Interval vector: <{''.join(map(str, set_class.interval_vector))}>")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+import mmap
+import struct
+import zlib
+
+# This module is imported by project.py itself, to read a snapshot at startup: it must not
+# import project.py (which would run it a second time, as "project" besides "__main__"), and
+# only imports what reading a snapshot needs. The build step imports the rest when it runs.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Dict, List, Tuple
+    from project import Music_Theory
+
+    # A diatonic chord: degree, name, index of the root in the scale, quality and notes (see
+    # project.Diatonic_Chord)
+    Chord_Record = Tuple[str, str, int, str, Tuple[str, ...]]
+
+# File layout:
+#   - the header: magic, format version, registry checksum, number of tonics, of scale types
+#     and of strings, the offset of each of the sections below and the end of the file
+#   - the keys: one record per (tonic, scale type), tonics first: the first note and the
+#     number of notes of the scale (in the notes), the first chord and the number of diatonic
+#     chords (in the chords)
+#   - the notes: string numbers
+#   - the chords: one record per diatonic triad: degree, name, index of the root in the
+#     scale, quality and notes (string numbers)
+#   - the triads: one record per (tonic, quality of CHORD_SUFFIXES): the 3 notes
+#   - the strings: the pool, every string (UTF-8) followed by a null byte
+# The first strings are the tonics, then the scale types, in the order of the keys.
+# Every number is little-endian.
+MAGIC = b"MTHEORY\x00"
+VERSION = 1
+HEADER = struct.Struct("<8sHHI3I6I")
+KEY = struct.Struct("<IBIB")
+CHORD = struct.Struct("<HHBH3H")
+TRIAD = struct.Struct("<3H")
+
+# Triad qualities, in the order of the triad records (see Music_Theory.CHORD_SUFFIXES)
+TRIAD_SUFFIXES = ("", "m", "o", "+")
+
+
+def get_registry_checksum(
+    intervals: Dict[str, List[int]], qualities: Dict[str, List[List[str]]]
+) -> int:
+    # Checksum of the registered scale types (Music_Theory.INTERVALS and
+    # SCALE_CHORD_QUALITIES), in order. A snapshot built for other scale types (eg: with a
+    # scales file, see --scales) is stale.
+    registry = repr((list(intervals.items()), list(qualities.items())))
+    return zlib.crc32(registry.encode("utf-8"))
+
+
+class Theory_Snapshot:
+    """
+    Precomputed scales, diatonic triads and triads (see build_snapshot), read from a memory
+    map. Every answer is found at a computed offset: the record of a key is at (tonic number
+    * number of scale types + scale type number), the record of a triad at (tonic number * 4
+    + quality number). The string pool is decoded once, when the snapshot is opened.
+
+    The snapshot only knows the tonics of Music_Theory.get_valid_tonics() and the scale types
+    registered when it was built: the lookups return None for anything else, and the caller
+    computes the answer instead.
+
+    """
+
+    __slots__ = (
+        "data",
+        "tonics",
+        "scales",
+        "strings",
+        "keys",
+        "notes",
+        "chords",
+        "triads",
+        "pool",
+    )
+
+    def __init__(self, data: mmap.mmap | bytes, checksum: int) -> None:
+        # Raises a ValueError if the data is not a snapshot, or a snapshot of other scale types
+        # than the ones with this checksum (see get_registry_checksum)
+        if len(data) < HEADER.size:
+            raise ValueError("Truncated snapshot")
+        (
+            magic,
+            version,
+            _,
+            registry,
+            tonic_count,
+            scale_count,
+            string_count,
+            self.keys,
+            self.notes,
+            self.chords,
+            self.triads,
+            pool,
+            end,
+        ) = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a snapshot of this version")
+        if registry != checksum:
+            raise ValueError("Stale snapshot: the scale types have changed")
+        if not (
+            HEADER.size
+            <= self.keys
+            <= self.notes
+            <= self.chords
+            <= self.triads
+            <= pool
+            <= end
+            == len(data)
+        ):
+            raise ValueError("Truncated snapshot")
+
+        self.data = data
+        self.strings = data[pool:end].decode("utf-8").split("\0")[:-1]
+        if len(self.strings) != string_count:
+            raise ValueError("Damaged snapshot")
+        self.tonics = {self.strings[i]: i for i in range(tonic_count)}
+        self.scales = {self.strings[tonic_count + i]: i for i in range(scale_count)}
+
+    def get_key(self, tonic: str, scale: str) -> Tuple[int, int, int, int] | None:
+        # The key record of a scale, or None if it isn't in the snapshot
+        tonic_number = self.tonics.get(tonic)
+        scale_number = self.scales.get(scale)
+        if tonic_number is None or scale_number is None:
+            return None
+        return KEY.unpack_from(
+            self.data,
+            self.keys + (tonic_number * len(self.scales) + scale_number) * KEY.size,
+        )
+
+    def get_scale(self, tonic: str, scale: str) -> Tuple[str, ...] | None:
+        # The notes of a scale (for a normalized scale type)
+        key = self.get_key(tonic, scale)
+        if key is None:
+            return None
+        first, count, _, _ = key
+        strings = self.strings
+        return tuple(
+            [
+                strings[number]
+                for number in struct.unpack_from(
+                    f"<{count}H", self.data, self.notes + first * 2
+                )
+            ]
+        )
+
+    def get_harmony(self, tonic: str, scale: str) -> List[Chord_Record] | None:
+        # The diatonic triads of a key (for a normalized scale type)
+        key = self.get_key(tonic, scale)
+        if key is None:
+            return None
+        _, _, first, count = key
+        strings = self.strings
+        start = self.chords + first * CHORD.size
+        return [
+            (
+                strings[degree],
+                strings[name],
+                root,
+                strings[quality],
+                (strings[first_note], strings[third], strings[fifth]),
+            )
+            for degree, name, root, quality, first_note, third, fifth in CHORD.iter_unpack(
+                self.data[start : start + count * CHORD.size]
+            )
+        ]
+
+    def get_triad(self, chord: str) -> Tuple[str, ...] | None:
+        # The notes of a triad named after one of the tonics (eg: "C#m", "Bbo", "E+")
+        suffix = chord[-1:] if chord[-1:] in TRIAD_SUFFIXES else ""
+        tonic_number = self.tonics.get(chord[: len(chord) - len(suffix)])
+        if tonic_number is None:
+            return None
+        numbers = TRIAD.unpack_from(
+            self.data,
+            self.triads
+            + (tonic_number * len(TRIAD_SUFFIXES) + TRIAD_SUFFIXES.index(suffix))
+            * TRIAD.size,
+        )
+        strings = self.strings
+        return (strings[numbers[0]], strings[numbers[1]], strings[numbers[2]])
+
+
+def open_snapshot(path: str, checksum: int) -> Theory_Snapshot | None:
+    # The snapshot in a file, or None if it is missing, damaged or stale (see Theory_Snapshot):
+    # the answers are then computed as usual
+    try:
+        with open(path, "rb") as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # (Empty files can't be mapped)
+        return None
+    try:
+        return Theory_Snapshot(data, checksum)
+    except (ValueError, struct.error):
+        data.close()
+        return None
+
+
+def build_snapshot(theory: type[Music_Theory]) -> bytes:
+    # Compute every scale and diatonic triad for every tonic of get_valid_tonics() and every
+    # registered scale type, and every triad on these tonics, and lay them out (see above)
+    tonics = theory.get_valid_tonics()
+    scales = list(theory.INTERVALS)
+    strings: Dict[str, int] = {}
+
+    def number(string: str) -> int:
+        return strings.setdefault(string, len(strings))
+
+    for name in [*tonics, *scales]:
+        number(name)
+
+    keys = bytearray()
+    notes: List[int] = []
+    chords = bytearray()
+    chord_count = 0
+    for tonic in tonics:
+        for scale in scales:
+            scale_notes = theory.compute_scale(tonic, scale)
+            harmony = theory.get_diatonic_harmony(tonic, scale)
+            keys += KEY.pack(len(notes), len(scale_notes), chord_count, len(harmony))
+            notes.extend(number(note) for note in scale_notes)
+            for chord in harmony:
+                chords += CHORD.pack(
+                    number(chord.degree),
+                    number(chord.name),
+                    chord.root,
+                    number(chord.quality),
+                    *[number(note) for note in chord.notes],
+                )
+            chord_count += len(harmony)
+
+    triads = bytearray()
+    for tonic in tonics:
+        for suffix in TRIAD_SUFFIXES:
+            triads += TRIAD.pack(
+                *[number(note) for note in theory.get_chord_notes(tonic + suffix)]
+            )
+
+    pool = "".join([string + "\0" for string in strings]).encode("utf-8")
+
+    sections = [
+        bytes(keys),
+        struct.pack(f"<{len(notes)}H", *notes),
+        bytes(chords),
+        bytes(triads),
+        pool,
+    ]
+    # (The offset of each section, and the end of the last one)
+    positions = [HEADER.size]
+    for section in sections:
+        positions.append(positions[-1] + len(section))
+
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        0,
+        get_registry_checksum(theory.INTERVALS, theory.SCALE_CHORD_QUALITIES),
+        len(tonics),
+        len(scales),
+        len(strings),
+        *positions,
+    )
+    return header + b"".join(sections)
+
+
+def main():
+    import argparse
+    import os
+    import sys
+    import time
+
+    from project import Music_Theory, get_snapshot_path
+
+    parser = argparse.ArgumentParser(
+        description="Build a snapshot of every scale, diatonic triad and triad, for every tonic spelling up to double sharps and flats and every scale type. project.py answers from the snapshot instead of computing, as long as the scale types are the same."
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        dest="output",
+        default=get_snapshot_path(),
+        help=f"OUTPUT file (default: {get_snapshot_path()}, where project.py looks for it)",
+    )
+    parser.add_argument(
+        "--scales",
+        dest="scales",
+        metavar="FILE",
+        help="Also include the scale types listed in FILE (see project.py --scales): the snapshot is then only used with the same file",
+    )
+    args = parser.parse_args()
+    if not args.output:
+        parser.error("the snapshot is disabled, an output file is required (-o)")
+
+    try:
+        if args.scales:
+            with open(args.scales, encoding="utf-8") as file:
+                Music_Theory.load_scales(file)
+
+        started = time.perf_counter()
+        data = build_snapshot(Music_Theory)
+        # Written next to the output, then moved, so that a process never maps a partial file
+        temporary = f"{args.output}.{os.getpid()}"
+        with open(temporary, "wb") as file:
+            file.write(data)
+        os.replace(temporary, args.output)
+    except (OSError, ValueError) as e:
+        print(f"Unable to build the snapshot: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    print(
+        f"{len(Music_Theory.get_valid_tonics()) * len(Music_Theory.INTERVALS)} scales, "
+        f"{len(data)} bytes written to {args.output} in {time.perf_counter() - started:.2f}s",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
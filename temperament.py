@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+import math
+import sys
+
+import numpy as np
+
+from project import Music_Theory, Note, Scale_Table
+
+# Unlike project.py, every code path of this module works on arrays, so numpy is imported
+# at startup.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Dict, Iterable, List, Tuple
+
+# Symbols moving a note up or down by one step of the temperament, written before the letter
+# (eg: "^E", "vEb"), as in the "ups and downs" notation
+UP = "^"
+DOWN = "v"
+
+
+class Edo_Scale_Table(Scale_Table):
+    """
+    The notes of many scales of a temperament at once, as returned by
+    Temperament.get_scales(). As in Scale_Table, with one more array: the number of ups
+    (positive) or downs (negative) of each note. The accidentals are the number of sharps
+    (positive) or flats (negative).
+
+    """
+
+    __slots__ = ("ups", "temperament")
+
+    def __init__(
+        self,
+        tonics: List[str],
+        variants: List[str],
+        letters: np.ndarray,
+        accidentals: np.ndarray,
+        ups: np.ndarray,
+        temperament: Temperament,
+    ) -> None:
+        super().__init__(tonics, variants, letters, accidentals)
+        self.ups = ups
+        self.temperament = temperament
+
+    def notes(self, row: int) -> List[str]:
+        return [
+            self.temperament.render(letter, accidentals, ups)
+            for letter, accidentals, ups in zip(
+                self.letters[row].tolist(),
+                self.accidentals[row].tolist(),
+                self.ups[row].tolist(),
+            )
+        ]
+
+    def to_lists(self) -> List[List[str]]:
+        if not len(self):
+            return []
+
+        # Render every (letter, accidentals, ups) combination present in the table once,
+        # then look up all the names at once
+        spellings = np.stack(
+            [self.letters.ravel(), self.accidentals.ravel(), self.ups.ravel()], axis=1
+        )
+        unique, positions = np.unique(spellings, axis=0, return_inverse=True)
+        names = np.array(
+            [self.temperament.render(*spelling) for spelling in unique.tolist()],
+            dtype=object,
+        )
+        return names[positions.reshape(self.letters.shape)].tolist()
+
+
+class Temperament:
+    """
+    An equal division of the octave in N steps (N-EDO, 12 being the usual chromatic scale),
+    with its own scale types and spelling of the notes.
+
+    The notes are spelled from a chain of fifths, as in 12-EDO: the fifth is the number of
+    steps closest to a 3:2 ratio, unless given, and the 7 letters are the notes of the major
+    scale built from it, with whole tones of 2 fifths minus an octave ("tone") and
+    semitones ("limma"). A sharp raises a note by the difference between the two ("sharp").
+    The steps in between are written with ups and downs (eg: in 24-EDO, "^E" is a quarter
+    tone above "E", and "vEb" a quarter tone below "Eb"). In 12-EDO, a sharp is one step and
+    no ups or downs are ever needed, so the notes are spelled exactly as by Music_Theory.
+
+    A scale type is a step pattern: the number of steps between consecutive notes, adding up
+    to N (see register_scale). The scale types of Music_Theory are registered in each
+    temperament, with the notes they have in 12-EDO (eg: the major scale has 2 tones and a
+    limma, then 3 tones and a limma), unless two of their notes meet in the temperament.
+
+    Every scale of a scale type is found from its spelling on the 7 natural tonics, moved by
+    the sharps and ups of the tonic, as in Scale_Definition, on whole arrays of tonics and scale
+    types at once (see get_scales).
+
+    """
+
+    __slots__ = (
+        "divisions",
+        "fifth",
+        "tone",
+        "limma",
+        "sharp",
+        "naturals",
+        "step_patterns",
+        "triad_suffixes",
+        "_registry",
+        "_spellings",
+    )
+
+    def __init__(self, divisions: int, fifth: int | None = None) -> None:
+        if not 5 <= divisions <= 1200:
+            raise ValueError(f"Unsupported temperament: {divisions}-EDO")
+        if fifth is None:
+            fifth = round(divisions * math.log2(3 / 2))
+        self.divisions = divisions
+        self.fifth = fifth
+        self.tone = 2 * fifth - divisions
+        self.limma = 3 * divisions - 5 * fifth
+        self.sharp = self.tone - self.limma
+        # (The letters must be in ascending order, and a sharp must raise a note)
+        if self.limma < 1 or self.sharp < 0:
+            raise ValueError(
+                f"Unable to spell the notes of {divisions}-EDO with a fifth of {fifth} steps"
+            )
+
+        # Position of each natural note (letter) in the temperament, as Note.NATURAL_PITCHES
+        tone, limma = self.tone, self.limma
+        self.naturals = np.array(
+            [0, tone, 2 * tone, 2 * tone + limma, 3 * tone + limma, 4 * tone + limma]
+            + [5 * tone + limma],
+            dtype=np.int64,
+        )
+
+        # Steps from the root to the third and the fifth of each triad quality, and its suffix
+        # in a chord name (see Music_Theory.CHORD_SUFFIXES). In the temperaments where a
+        # sharp is 0 steps, the first quality of the same steps wins.
+        thirds = {"M": 2 * tone, "m": tone + limma}
+        fifths = {
+            "M": fifth,
+            "m": fifth,
+            "o": fifth - self.sharp,
+            "+": fifth + self.sharp,
+        }
+        self.triad_suffixes: Dict[Tuple[int, int], str] = {}
+        for quality, suffix in Music_Theory.CHORD_SUFFIXES.items():
+            third = thirds[
+                "m" if quality == "o" else "M" if quality == "+" else quality
+            ]
+            self.triad_suffixes.setdefault((third, fifths[quality]), suffix)
+
+        # Registered scale types: step pattern, keyed on the name (as Music_Theory.INTERVALS),
+        # and (letter steps, steps from the tonic) of every degree, keyed on each name and alias
+        self.step_patterns: Dict[str, Tuple[int, ...]] = {}
+        self._registry: Dict[str, Tuple[str, Tuple[int, ...], Tuple[int, ...]]] = {}
+        self._spellings: Dict[str, np.ndarray] = {}
+        self.register_builtin_scales()
+
+    def __repr__(self) -> str:
+        return f"Temperament({self.divisions})"
+
+    def render(self, letter: int, accidentals: int, ups: int) -> str:
+        return (UP * ups if ups > 0 else DOWN * -ups) + Note.render(letter, accidentals)
+
+    def parse(self, name: str) -> Tuple[int, int, int]:
+        # (letter, accidentals, ups) of a note name (eg: "vEb" is (2, -1, -1)). Raises a
+        # ValueError for anything else.
+        ups = len(name) - len(name.lstrip(UP))
+        downs = len(name) - len(name.lstrip(DOWN))
+        note = Note.parse(name[ups + downs :])
+        return note.letter, note.accidentals, ups - downs
+
+    def get_pitch(self, name: str) -> int:
+        # Position of a note in the temperament, starting at C
+        letter, accidentals, ups = self.parse(name)
+        return (
+            int(self.naturals[letter] + accidentals * self.sharp + ups) % self.divisions
+        )
+
+    def spell(
+        self, letters: np.ndarray, pitches: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # Accidentals and ups needed for the given letters to sound the given pitches, as
+        # Note.accidentals_for(): the fewest sharps or flats within half an octave, and the
+        # remaining steps as ups or downs (at most half a sharp, a tie going to the fewest
+        # sharps or flats)
+        divisions = self.divisions
+        difference = (pitches - self.naturals[letters] + divisions // 2) % divisions
+        difference -= divisions // 2
+        if self.sharp:
+            accidentals = np.sign(difference) * (
+                (2 * np.abs(difference) + self.sharp - 1) // (2 * self.sharp)
+            )
+        else:
+            accidentals = np.zeros_like(difference)
+        return accidentals, difference - accidentals * self.sharp
+
+    def map_interval(self, steps: int, half_steps: int) -> int:
+        # Steps of the temperament for an interval of 12-EDO, given as letter steps and
+        # half-steps (eg: a minor third is (2, 3)), keeping its spelling: the natural notes
+        # of the temperament, then one sharp for each half-step of alteration
+        octaves, letter = divmod(steps, 7)
+        alteration = half_steps - Note.NATURAL_PITCHES[letter] - 12 * octaves
+        return int(
+            self.naturals[letter] + self.divisions * octaves + alteration * self.sharp
+        )
+
+    def register_scale(
+        self,
+        name: str,
+        steps: Iterable[int],
+        aliases: Iterable[str] = (),
+        letters: Iterable[int] | None = None,
+    ) -> str:
+        # Add a scale type, from its step pattern (it must add up to an octave). The scales of
+        # 7 notes use each letter once. For the others, each degree is spelled on the first
+        # letter at or above it (as Scale_Definition.STEPS_BY_OFFSET), unless the letter steps
+        # from the tonic to each degree are given. Returns the name of the scale type.
+        name = " ".join(name.lower().split())
+        steps = tuple(steps)
+        if not name or name[0].isdigit():
+            raise ValueError(f"Invalid scale name: {name!r}")
+        if (
+            not 2 <= len(steps) <= self.divisions
+            or not all(isinstance(step, int) for step in steps)
+            or min(steps) < 1
+            or sum(steps) != self.divisions
+        ):
+            raise ValueError(
+                f"Invalid steps for the {name} scale: {list(steps)} (expecting steps adding up to {self.divisions})"
+            )
+        for alias in [name, *aliases]:
+            if " ".join(alias.lower().split()) in self._registry:
+                raise ValueError(f"Scale already registered: {alias}")
+
+        offsets = tuple(np.cumsum((0,) + steps).tolist())
+        if letters is not None:
+            letter_steps = tuple(letters)
+        elif len(steps) == 7:
+            letter_steps = tuple(range(8))
+        else:
+            letter_steps = tuple(
+                np.searchsorted(self.naturals, offsets[:-1]).tolist()
+            ) + (7,)
+
+        self.step_patterns[name] = steps
+        for alias in [name, *aliases]:
+            self._registry[" ".join(alias.lower().split())] = (
+                name,
+                letter_steps,
+                offsets,
+            )
+        return name
+
+    def register_builtin_scales(self) -> None:
+        # Register the scale types of Music_Theory, with the spelling of their notes: each
+        # degree is on the same letter, with the same accidentals (see map_interval). The scale types with two notes
+        # on the same step of this temperament are left out.
+        names: Dict[str, List[str]] = {}
+        for alias in Music_Theory.SUPPORTED_SCALES:
+            names.setdefault(Music_Theory.normalize_scale_type(alias), []).append(alias)
+
+        for name, aliases in names.items():
+            definition = Music_Theory.get_scale_definition(name)
+            offsets = [
+                self.map_interval(step, half_steps)
+                for step, half_steps in zip(definition.steps, definition.offsets)
+            ]
+            steps = [high - low for low, high in zip(offsets, offsets[1:])]
+            if min(steps) >= 1:
+                self.register_scale(
+                    name,
+                    steps,
+                    [alias for alias in aliases if alias != name],
+                    definition.steps,
+                )
+
+    def get_scale_definition(
+        self, scale: str
+    ) -> Tuple[str, Tuple[int, ...], Tuple[int, ...]]:
+        # (name, letter steps, steps from the tonic) of a scale type, for any of its names
+        definition = self._registry.get(" ".join(scale.lower().split()))
+        if definition is None:
+            raise ValueError("Unsupported scale")
+        return definition
+
+    def get_spellings(self, scale: str) -> np.ndarray:
+        # The (letter, accidentals, ups) of each degree of a scale type on each natural tonic,
+        # as an array of shape (letters, degrees, 3). Computed once per scale type.
+        name, letter_steps, offsets = self.get_scale_definition(scale)
+        spellings = self._spellings.get(name)
+        if spellings is None:
+            tonics = np.arange(7)[:, None]
+            letters = (tonics + np.array(letter_steps)) % 7
+            pitches = self.naturals[tonics] + np.array(offsets)
+            accidentals, ups = self.spell(letters, pitches)
+            spellings = np.stack([letters, accidentals, ups], axis=-1)
+            self._spellings[name] = spellings
+        return spellings
+
+    def get_scales(
+        self, tonics: Iterable[str], variants: Iterable[str]
+    ) -> Edo_Scale_Table:
+        # Compute the scales for every combination of tonic and scale type at once, as
+        # Music_Theory.get_scales(). The time is linear in the number of scales, whatever the
+        # number of steps of the temperament. The scale types must all have the same number of
+        # notes.
+        tonics = list(tonics)
+        names = [self.get_scale_definition(variant)[0] for variant in variants]
+        width = len(self.step_patterns[names[0]]) + 1 if names else 8
+        if any(len(self.step_patterns[name]) + 1 != width for name in names):
+            raise ValueError("Scales of different sizes can't be computed together")
+        spellings = np.array(
+            [self.get_spellings(name) for name in names], dtype=np.int64
+        ).reshape(len(names), 7, width, 3)
+
+        unique = {tonic: i for i, tonic in enumerate(dict.fromkeys(tonics))}
+        roots = np.array([self.parse(tonic) for tonic in unique], dtype=np.int64)
+        roots = roots.reshape(-1, 3)[
+            np.array([unique[tonic] for tonic in tonics], dtype=np.intp)
+        ]
+
+        # Arrays of shape (tonics, scale types, degrees): the spelling on the letter of the
+        # tonic, moved by the accidentals and ups of the tonic
+        spelled = spellings[np.arange(len(names))[None, :], roots[:, 0, None]]
+        moved = spelled[..., 1:] + roots[:, None, None, 1:]
+
+        return Edo_Scale_Table(
+            tonics,
+            names,
+            spelled[..., 0].reshape(-1, width).astype(np.int8),
+            moved[..., 0].reshape(-1, width).astype(np.int16),
+            moved[..., 1].reshape(-1, width).astype(np.int16),
+            self,
+        )
+
+    def get_scale(self, tonic: str, scale: str) -> List[str]:
+        return self.get_scales([tonic], [scale]).notes(0)
+
+    def get_tonics(self) -> List[str]:
+        # A name for each step of the temperament, starting at C: the spelling with the fewest
+        # symbols, then with the fewest sharps or flats (eg: "^C" rather than "B#" in 53-EDO),
+        # preferring sharps to flats
+        pitches = np.arange(self.divisions)
+        letters = np.arange(7)[:, None]
+        accidentals, ups = self.spell(letters, pitches)
+        symbols = np.abs(accidentals) + np.abs(ups)
+        cost = (symbols * (self.divisions + 1) + np.abs(accidentals)) * 2 + (
+            accidentals < 0
+        )
+        best = np.argmin(cost, axis=0)
+        return [
+            self.render(letter, accidentals[letter, pitch], ups[letter, pitch])
+            for pitch, letter in enumerate(best.tolist())
+        ]
+
+    def get_chord_notes(self, chord: str) -> List[str]:
+        # The notes of a chord, with the formulas of Music_Theory (see
+        # Music_Theory.compile_chord_formula), each interval keeping its spelling (see
+        # map_interval). A slash chord starts with its bass note, as in
+        # Music_Theory.get_chord_notes().
+        name, bass = chord, None
+        head, slash, tail = chord.rpartition("/")
+        if slash and tail and tail.lstrip(UP + DOWN)[:1] in tuple(Note.LETTERS):
+            name, bass = head, tail
+            self.parse(bass)
+
+        end = len(name) - len(name.lstrip(UP + DOWN)) + 1
+        while end < len(name) and name[end] in Note.ACCIDENTALS:
+            end += 1
+        letter, accidentals, ups = self.parse(name[:end])
+        formula = Music_Theory.compile_chord_formula(name[end:])
+
+        # Spelled on the natural root, then moved by the accidentals and ups of the root
+        letters = np.array([(letter + steps) % 7 for steps, _ in formula])
+        pitches = self.naturals[letter] + np.array(
+            [self.map_interval(steps, half_steps) for steps, half_steps in formula]
+        )
+        note_accidentals, note_ups = self.spell(letters, pitches)
+        notes = [
+            self.render(*spelling)
+            for spelling in zip(
+                letters.tolist(),
+                (note_accidentals + accidentals).tolist(),
+                (note_ups + ups).tolist(),
+            )
+        ]
+
+        if bass:
+            if bass in notes:
+                position = notes.index(bass)
+                notes = notes[position:] + notes[:position]
+            else:
+                notes.insert(0, bass)
+        return notes
+
+    def get_diatonic_chords(self, tonic: str, scale: str) -> List[str]:
+        # The triads of the scales of 7 notes, stacking thirds (every other degree), when they
+        # have one of the qualities of Music_Theory.CHORD_SUFFIXES (eg: there are neutral
+        # triads in 24-EDO scales). The other scales have no diatonic chords.
+        name, _, offsets = self.get_scale_definition(scale)
+        if len(offsets) != 8:
+            return []
+        notes = self.get_scale(tonic, name)
+        chords = []
+        for degree in range(7):
+            third = (offsets[(degree + 2) % 7] - offsets[degree]) % self.divisions
+            fifth = (offsets[(degree + 4) % 7] - offsets[degree]) % self.divisions
+            suffix = self.triad_suffixes.get((third, fifth))
+            if suffix is not None:
+                chords.append(notes[degree] + suffix)
+        return chords
+
+
+# Temperaments already set up, keyed on the number of steps
+_temperaments: Dict[int, Temperament] = {}
+
+
+def get_temperament(divisions: int) -> Temperament:
+    # The temperament of N-EDO, with the fifth closest to 3:2 (set up once)
+    temperament = _temperaments.get(divisions)
+    if temperament is None:
+        temperament = Temperament(divisions)
+        _temperaments[divisions] = temperament
+    return temperament
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Compute the scales and chords of an equal temperament of any number of steps (N-EDO). The notes are spelled with sharps and flats, and ups (^) and downs (v) for the steps in between."
+    )
+    parser.add_argument(
+        "-e",
+        dest="divisions",
+        type=int,
+        default=12,
+        help="Number of steps of the octave (default: 12)",
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("-s", dest="scale", help="TONIC of the scale (eg: 'vEb')")
+    source.add_argument(
+        "-a",
+        dest="all",
+        action="store_true",
+        help="Every scale of the TYPE, one on each step of the temperament",
+    )
+    source.add_argument("-c", dest="chord", help="Notes of this CHORD")
+    parser.add_argument(
+        "-t", dest="type", default="major", help="TYPE of scale (default: major)"
+    )
+    parser.add_argument(
+        "--steps",
+        dest="steps",
+        help="Use this step pattern as the scale TYPE (eg: '4 4 2 4 4 4 2' in 24-EDO)",
+    )
+    parser.add_argument(
+        "-d", dest="chords", action="store_true", help="Also display diatonic chords"
+    )
+    args = parser.parse_args()
+
+    try:
+        temperament = get_temperament(args.divisions)
+        scale = args.type
+        if args.steps:
+            try:
+                steps = [int(step) for step in args.steps.split()]
+            except ValueError:
+                raise ValueError(f"Invalid steps: {args.steps}") from None
+            scale = temperament.register_scale("steps", steps)
+
+        if args.chord:
+            print(" ".join(temperament.get_chord_notes(args.chord)))
+            return
+        table = temperament.get_scales(
+            temperament.get_tonics() if args.all else [args.scale], [scale]
+        )
+        for tonic, notes in zip(table.tonics, table.to_lists()):
+            # (Without the octave)
+            line = " ".join(notes[:-1])
+            if args.chords:
+                chords = temperament.get_diatonic_chords(tonic, scale)
+                line += " | " + " ".join(chords)
+            print(f"{tonic}: {line}" if args.all else line)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env pytest
+# -*- coding: utf-8 -*-
+
+from analysis import analyze, parse_key, read_songs, write_analysis
+import pytest
+
+SONGS = """# Comments and blank lines are ignored
+key: C major
+C | F | G7 | C
+Am Dm G C/E
+Dm7 Bbmaj7 Gsus4 Cmaj7
+
+key: A harmonic
+Am Dm
+E Am G#o C+
+""".splitlines()
+
+
+def test_parse_key():
+    assert parse_key("G major") == ("G", "major")
+    assert parse_key("f# minor") == ("F#", "natural minor")
+    assert parse_key(" Eb  harmonic minor ") == ("Eb", "harmonic minor")
+    assert parse_key("A harmonic") == ("A", "harmonic minor")
+    assert parse_key("Bb") == ("Bb", "major")
+    assert parse_key("D Dorian") == ("D", "dorian")
+    assert parse_key("E aeolian") == ("E", "natural minor")
+    with pytest.raises(ValueError):
+        parse_key("H major")
+    with pytest.raises(ValueError):
+        parse_key("C bebop")
+
+
+def test_read_songs():
+    assert list(read_songs(SONGS)) == [
+        (1, ("C", "major"), ["C", "F", "G7", "C"]),
+        (2, ("C", "major"), ["Am", "Dm", "G", "C/E"]),
+        (3, ("C", "major"), ["Dm7", "Bbmaj7", "Gsus4", "Cmaj7"]),
+        (4, ("A", "harmonic minor"), ["Am", "Dm"]),
+        (5, ("A", "harmonic minor"), ["E", "Am", "G#o", "C+"]),
+    ]
+    # With sections, a song goes on until the next blank line (or key)
+    assert [song for song, _, _ in read_songs(SONGS, sections=True)] == [1, 1, 1, 2, 2]
+    with pytest.raises(ValueError, match="Line 2"):
+        list(read_songs(["C", "key: X major", "C"]))
+
+
+def test_analyze():
+    labels = list(analyze(SONGS, sections=True))
+    assert labels[:3] == [
+        (1, 1, ("C", "major"), "C", "I"),
+        (1, 2, ("C", "major"), "F", "IV"),
+        (1, 3, ("C", "major"), "G7", "V7"),
+    ]
+    assert [degree for _, _, _, _, degree in labels[4:]] == [
+        "vi",
+        "ii",
+        "V",
+        "I",
+        "ii7",
+        None,
+        None,
+        "Imaj7",
+        "i",
+        "iv",
+        "V",
+        "i",
+        "viio",
+        "III+",
+    ]
+    assert labels[-1][:2] == (2, 6)
+
+    # The default key is used until the first "key:" line, a song without key is an error
+    assert [label[4] for label in analyze(["G D D#m Ebm"], ("Gb", "major"))] == [None, None, "vi", "vi"]
+    with pytest.raises(ValueError, match="no key"):
+        list(analyze(["C"]))
+
+
+def test_analyze_is_lazy():
+    # Lines are only read as the labels are consumed
+    def lines():
+        yield "key: C major"
+        yield "C F"
+        raise AssertionError("read too far")
+
+    labels = analyze(lines())
+    assert next(labels)[4] == "I"
+    assert next(labels)[4] == "IV"
+
+
+def test_write_analysis(capsys):
+    # Out of key in brackets, chords that are neither triads nor sevenths in braces
+    assert write_analysis(analyze(SONGS)) == 1
+    assert capsys.readouterr().out.splitlines() == [
+        "C major: I IV V7 I",
+        "C major: vi ii V I",
+        "C major: ii7 [Bbmaj7] {Gsus4} Imaj7",
+        "A harmonic minor: i iv",
+        "A harmonic minor: V i viio III+",
+    ]
+
+    write_analysis(analyze(["key: C major", "C | G7 | Bbmaj7 | Gsus4"]), "csv")
+    assert capsys.readouterr().out.splitlines() == [
+        "song,position,key,chord,degree,in_key",
+        "1,1,C major,C,I,true",
+        "1,2,C major,G7,V7,true",
+        "1,3,C major,Bbmaj7,,false",
+        "1,4,C major,Gsus4,,",
+    ]
+
+    write_analysis(analyze(["key: C major", "Bbmaj7 Gsus4"]), "ndjson")
+    assert capsys.readouterr().out.splitlines() == [
+        '{"song": 1, "position": 1, "key": "C major", "chord": "Bbmaj7", "degree": null, "in_key": false}',
+        '{"song": 1, "position": 2, "key": "C major", "chord": "Gsus4", "degree": null, "in_key": null}',
+    ]
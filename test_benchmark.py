@@ -0,0 +1,82 @@
+#!/usr/bin/env pytest
+# -*- coding: utf-8 -*-
+
+from benchmark import (
+    MAIN_ARGUMENTS,
+    STARTUP_COMMANDS,
+    VOICINGS,
+    bench_function,
+    bench_get_scales,
+    bench_startup,
+    bench_voicings,
+    compare_results,
+    find_regressions,
+    get_suite,
+    run_main,
+    time_to_first_output,
+)
+import pytest
+import sys
+
+
+def test_time_to_first_output():
+    assert time_to_first_output([sys.executable, "-c", "print('x')"]) > 0
+    with pytest.raises(RuntimeError):
+        time_to_first_output([sys.executable, "-c", "raise SystemExit(1)"])
+
+
+def test_bench_startup():
+    results = bench_startup(1)
+    assert set(results) == set(STARTUP_COMMANDS)
+    for result in results.values():
+        assert 0 < result["min_ms"] <= result["median_ms"] <= result["max_ms"]
+
+
+def test_bench_get_scales():
+    # The benchmark also checks that both paths give identical results
+    stats = bench_get_scales(2)
+    assert stats["scales"] == 2 * 49 * 4
+    assert stats["arrays_ms"] <= stats["rendered_ms"]
+
+
+def test_bench_voicings():
+    results = bench_voicings(1)
+    assert len(results) == len(VOICINGS)
+    for result in results.values():
+        assert result["voicings"] > 0
+        assert 0 < result["first_ms"] <= result["total_ms"]
+
+
+def test_run_main(capsys):
+    run_main(["-s", "C", "-t", "major", "-d"])
+    assert capsys.readouterr().out == ""
+    with pytest.raises(RuntimeError):
+        run_main(["-s", "H", "-t", "major"])
+    assert len(MAIN_ARGUMENTS) == 17 * 4 * 3 + 86 * 2
+
+
+def test_bench_function():
+    calls = []
+    result = bench_function(lambda x: calls.append(x), [(1,), (2,)], 3, 2)
+    assert calls == [1, 1, 1, 2, 2, 2] * 2 + [1, 2]
+    assert result["ops_per_sec"] > 0
+    assert 0 < result["p50_us"] <= result["p90_us"] <= result["p99_us"]
+    assert result["peak_kib"] >= 0
+
+
+def test_get_suite():
+    suite = get_suite()
+    assert "main()" in suite and "get_chord_notes" in suite
+    # Every input of the suite must be valid
+    for function, calls, _ in suite.values():
+        for arguments in calls[:5]:
+            function(*arguments)
+
+
+def test_compare_results():
+    baseline = {"a": {"ops_per_sec": 100.0}, "b": {"ops_per_sec": 100.0}}
+    results = {"a": {"ops_per_sec": 85.0}, "b": {"ops_per_sec": 120.0}, "c": {"ops_per_sec": 1.0}}
+    changes = compare_results(baseline, results)
+    assert changes == pytest.approx({"a": -15.0, "b": 20.0})
+    assert find_regressions(changes, 10) == ["a"]
+    assert find_regressions(changes, 20) == []
@@ -0,0 +1,86 @@
+#!/usr/bin/env pytest
+# -*- coding: utf-8 -*-
+
+from detect_keys import (
+    detect_file,
+    detect_files,
+    find_files,
+    measure_scaling,
+    read_progressions,
+    write_results,
+)
+import pytest
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    (tmp_path / "b").mkdir()
+    (tmp_path / "a.txt").write_text("C F G C\nAm Dm E Am\n\n| Db | Gb | Ab | Db |\n")
+    (tmp_path / "b" / "c.txt").write_text("key: A minor\nAm F C G\n")
+    (tmp_path / "b" / "notes.md").write_text("Not a progression")
+    (tmp_path / "b" / "d.txt").write_text("Em C\nkey: H major\n")
+    return tmp_path
+
+
+def test_find_files(corpus):
+    assert find_files([str(corpus)]) == [
+        str(corpus / "a.txt"),
+        str(corpus / "b" / "c.txt"),
+        str(corpus / "b" / "d.txt"),
+    ]
+    assert find_files([str(corpus)], "*.md") == [str(corpus / "b" / "notes.md")]
+    assert find_files(["missing.txt"]) == ["missing.txt"]
+
+
+def test_read_progressions():
+    assert list(read_progressions(["C F", "G C", "", "| |", "Am"])) == [
+        (1, ["C", "F"]),
+        (2, ["G", "C"]),
+        (4, ["Am"]),
+    ]
+    assert list(read_progressions(["C F", "G C", "", "Am"], sections=True)) == [
+        (1, ["C", "F", "G", "C"]),
+        (2, ["Am"]),
+    ]
+
+
+def test_detect_file(corpus):
+    assert detect_file(str(corpus / "a.txt")) == (
+        str(corpus / "a.txt"),
+        [(1, "C", "major", 1.0), (2, "A", "harmonic minor", 1.0), (3, "Db", "major", 1.0)],
+        None,
+    )
+    # Errors are returned along with the songs read before them
+    path, songs, error = detect_file(str(corpus / "b" / "d.txt"))
+    assert songs == [] and "Line 2" in error
+    assert detect_file("missing.txt")[2]
+
+
+def test_detect_files(corpus):
+    # The results come in the same order, whatever the number of processes and chunks
+    files = find_files([str(corpus)]) * 5
+    expected = list(detect_files(files, 1))
+    assert [path for path, _, _ in expected] == files
+    assert list(detect_files(files, 2)) == expected
+    assert list(detect_files(files, 3, chunk_size=4)) == expected
+
+
+def test_write_results(corpus, capsys):
+    counts = write_results(detect_files(find_files([str(corpus)]), 1))
+    assert counts == {"files": 3, "songs": 4, "errors": 1}
+    output = capsys.readouterr()
+    assert output.out.splitlines()[-1] == f"{corpus / 'b' / 'c.txt'}:1\tA natural minor\t100%"
+    assert "d.txt: Line 2" in output.err
+
+    write_results(detect_files([str(corpus / "b" / "c.txt")], 1), "csv")
+    assert capsys.readouterr().out.splitlines() == [
+        "file,song,tonic,scale,score",
+        f"{corpus / 'b' / 'c.txt'},1,A,natural minor,1.0000",
+    ]
+
+
+def test_measure_scaling(corpus):
+    stats = measure_scaling(find_files([str(corpus)]), 3)
+    assert [result["jobs"] for result in stats] == [1, 2, 3]
+    assert all(result["songs"] == 4 for result in stats)
+    assert stats[0]["speedup"] == 1.0 and stats[0]["efficiency"] == 1.0
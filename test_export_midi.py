@@ -0,0 +1,164 @@
+#!/usr/bin/env pytest
+# -*- coding: utf-8 -*-
+
+from export_midi import (
+    TICKS_PER_BEAT,
+    Midi_Writer,
+    get_midi_notes,
+    write_batch,
+    write_chords,
+    write_scale,
+)
+import io
+import os
+import pytest
+import subprocess
+import sys
+
+
+def read_events(data: bytes):
+    # Decode a format 0 file: [(absolute tick, note, velocity)] for the note events
+    assert data[:14] == b"MThd\x00\x00\x00\x06\x00\x00\x00\x01" + TICKS_PER_BEAT.to_bytes(2, "big")
+    assert data[14:18] == b"MTrk"
+    assert int.from_bytes(data[18:22], "big") == len(data) - 22
+
+    events = []
+    position, tick, status = 22, 0, 0
+    while position < len(data):
+        delta = 0
+        while True:
+            byte = data[position]
+            position += 1
+            delta = (delta << 7) | (byte & 0x7F)
+            if byte < 0x80:
+                break
+        tick += delta
+        if data[position] == 0xFF:
+            kind, length = data[position + 1], data[position + 2]
+            position += 3 + length
+            if kind == 0x2F:
+                assert position == len(data)
+            continue
+        if data[position] & 0x80:
+            status = data[position]
+            position += 1
+        assert status == 0x90
+        events.append((tick, data[position], data[position + 1]))
+        position += 2
+    return events
+
+
+def test_midi_writer():
+    writer = Midi_Writer(16)
+    writer.reset("test", tempo=60)
+    writer.add_notes([60, 62], TICKS_PER_BEAT)
+    writer.add_rest(0x0FFFFFFF)
+    writer.add_chord([48, 52], 127, velocity=100)
+    data = bytes(writer.finish())
+
+    # Tempo (1 second per beat) and track name
+    assert data[22:37] == b"\x00\xff\x51\x03\x0f\x42\x40\x00\xff\x03\x04test"
+    # Running status: only the first note event has a status byte, and the largest delta
+    # takes 4 bytes
+    assert data[37:45] == b"\x00\x90\x3c\x50\x83\x60\x3c\x00"
+    assert b"\xff\xff\xff\x7f\x30\x64" in data
+    assert read_events(data) == [
+        (0, 60, 80),
+        (480, 60, 0),
+        (480, 62, 80),
+        (960, 62, 0),
+        (0x0FFFFFFF + 960, 48, 100),
+        (0x0FFFFFFF + 960, 52, 100),
+        (0x0FFFFFFF + 1087, 48, 0),
+        (0x0FFFFFFF + 1087, 52, 0),
+    ]
+
+    # The buffer is reused by the next file, and the previous view stays readable
+    view = writer.finish()
+    writer.reset()
+    writer.add_notes(range(128), 1)
+    assert read_events(bytes(writer.finish()))[-1] == (128, 127, 0)
+    assert bytes(view[:4]) == b"MThd"
+
+    # The microseconds per beat must fit in 3 bytes
+    writer.reset(tempo=4)
+    assert bytes(writer.finish())[22:29] == b"\x00\xff\x51\x03\xe4\xe1\xc0"
+    for tempo in (0, 3, -120, 60_000_001):
+        with pytest.raises(ValueError):
+            writer.reset(tempo=tempo)
+
+
+def test_get_midi_notes():
+    assert get_midi_notes(["C", "E", "G", "C"]) == [60, 64, 67, 72]
+    assert get_midi_notes(["B", "C#", "D#"]) == [71, 73, 75]
+    assert get_midi_notes(["E", "G", "C"], 48) == [52, 55, 60]
+    assert get_midi_notes(["B#", "D#"], 60) == [60, 63]
+    assert get_midi_notes([]) == []
+    try:
+        get_midi_notes(["C", "E", "G"], 125)
+        assert False
+    except ValueError:
+        pass
+
+
+def test_write_scale():
+    writer = Midi_Writer()
+    events = read_events(bytes(write_scale(writer, "D", "major", octave=3)))
+    assert [note for _, note, velocity in events if velocity] == [50, 52, 54, 55, 57, 59, 61, 62]
+    assert events[-1][0] == 8 * TICKS_PER_BEAT
+
+    # Diatonic chords, on their degree of the scale, after a rest
+    events = read_events(bytes(write_scale(writer, "A", "minor", diatonic_chords=True)))
+    chords = [note for tick, note, velocity in events if velocity and tick >= 9 * TICKS_PER_BEAT]
+    assert chords[:6] == [69, 72, 76, 71, 74, 77]
+    assert len(chords) == 7 * 3
+
+
+def test_write_chords():
+    events = read_events(bytes(write_chords(Midi_Writer(), ["C", "Am7/G", "Bb13#11"], 3)))
+    starts: dict = {}
+    for tick, note, velocity in events:
+        if velocity:
+            starts.setdefault(tick, []).append(note)
+    assert list(starts.values()) == [
+        [48, 52, 55],
+        [55, 57, 60, 64],
+        [58, 62, 65, 68, 72, 76, 79],
+    ]
+
+
+def test_write_batch(tmp_path, capsys):
+    lines = ["# comment", "-s C -t major -d", "", '-c "C F G"', "-s H -t major", '{"chord": "Am"}']
+    assert write_batch(io.StringIO("\n".join(lines)), str(tmp_path)) == (3, 1)
+    assert sorted(os.listdir(tmp_path)) == ["00002.mid", "00004.mid", "00006.mid"]
+    assert "Line 5: Invalid note: H" in capsys.readouterr().err
+    assert len(read_events((tmp_path / "00004.mid").read_bytes())) == 3 * 3 * 2
+
+    # A JSON query with values of the wrong type is reported, the next ones are exported
+    (tmp_path / "json").mkdir()
+    lines = ['{"scale": 5, "type": "major"}', '{"chord": "Am"}']
+    assert write_batch(io.StringIO("\n".join(lines)), str(tmp_path / "json")) == (1, 1)
+    assert "Line 1: Invalid value for scale" in capsys.readouterr().err
+
+
+def test_main(tmp_path):
+    path = tmp_path / "scale.mid"
+    command = [sys.executable, "export_midi.py"]
+    result = subprocess.run(command + ["-s", "eb", "-t", "dorian", "-o", str(path)], capture_output=True)
+    assert result.returncode == 0
+    assert len(read_events(path.read_bytes())) == 16
+
+    result = subprocess.run(command + ["-c", "Cxyz", "-o", str(path)], capture_output=True, text=True)
+    assert result.returncode == 1 and "Unsupported chord quality" in result.stderr
+    result = subprocess.run(
+        command + ["-c", "C", "--tempo", "2", "-o", str(path)], capture_output=True, text=True
+    )
+    assert result.returncode == 1 and "Invalid tempo: 2" in result.stderr
+
+    queries = tmp_path / "queries.txt"
+    queries.write_text("-s C -t blues\n-c 'Dm7 G7 Cmaj7'\n")
+    result = subprocess.run(
+        command + ["-b", str(queries), "-o", str(tmp_path)], capture_output=True, text=True
+    )
+    assert result.returncode == 0 and "2 files written" in result.stderr
+    assert (tmp_path / "00002.mid").exists()
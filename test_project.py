@@ -4,12 +4,37 @@
 from project import (
     get_scale,
     get_diatonic_chords,
+    get_diatonic_harmony,
     get_chord_notes,
+    get_chord_degree,
+    detect_key,
+    get_scales,
+    get_key_signature,
+    get_key_signature_notes,
+    identify_chord,
+    transpose_chord,
+    get_voicings,
+    find_scales,
     prepare_pretty_display,
     prepare_display_chord_notes,
+    render_table,
+    display_scale,
+    display_diatonic_chords,
+    display_chord,
     Music_Theory,
+    Note,
+    parse_query,
+    run_batch,
+    write_scale,
+    write_chord,
+    write_profile,
 )
 import pytest
+import io
+import json
+import os
+import subprocess
+import sys
 
 
 def test_get_scale():
@@ -95,6 +120,55 @@ def test_get_scale():
     assert get_scale("D", "melodic minor") == ["D", "E", "F", "G", "A", "B", "C#", "D"]
 
 
+def test_get_key_signature():
+    # Computed from the circle of fifths, for any tonic, including the theoretical keys
+    assert get_key_signature("C") == 0
+    assert get_key_signature("A", "minor") == 0
+    assert get_key_signature("F#", "major") == 6
+    assert get_key_signature("Eb", "minor") == -6
+    assert get_key_signature("G#", "major") == 8
+    assert get_key_signature("Fb", "major") == -8
+    assert get_key_signature("Dbb", "minor") == -15
+    assert get_key_signature("B###", "major") == 26
+    assert get_key_signature_notes("G#") == ["F##", "C#", "G#", "D#", "A#", "E#", "B#"]
+    assert get_key_signature_notes("Fb") == ["Bbb", "Eb", "Ab", "Db", "Gb", "Cb", "Fb"]
+    assert get_key_signature_notes("Bb", "minor") == ["Bb", "Eb", "Ab", "Db", "Gb"]
+    assert get_key_signature_notes("C") == []
+
+    # The modes use the key signature of their notes, the other scales the one of the major
+    # or minor key with the same third
+    assert get_key_signature("D", "dorian") == 0
+    assert get_key_signature("C", "lydian") == 1
+    assert get_key_signature("A", "harmonic minor") == 0
+    assert get_key_signature("C", "melodic minor") == -3
+    assert get_key_signature("C", "blues") == -3
+    assert get_key_signature("C", "major pentatonic") == 0
+    with pytest.raises(ValueError):
+        get_key_signature("H", "major")
+    with pytest.raises(ValueError):
+        get_key_signature("C", "bebop")
+
+    # Every tonic up to triple sharps and flats: the notes of the diatonic scales are the
+    # notes of their key signature, and the theoretical keys are spelled without exception
+    tonics = [Note.render(letter, accidentals) for letter in range(7) for accidentals in range(-3, 4)]
+    for tonic in tonics:
+        for scale in ["major", "natural minor", "dorian", "lydian", "locrian"]:
+            altered = {note[0]: note for note in get_key_signature_notes(tonic, scale)}
+            assert get_scale(tonic, scale) == [
+                altered.get(note[0], note[0]) for note in get_scale(tonic, scale)
+            ]
+        for scale in Music_Theory.SUPPORTED_SCALES:
+            notes = get_scale(tonic, scale)
+            root = Note.parse(tonic)
+            pitches = [Note.parse(note).pitch for note in notes]
+            assert pitches == [
+                (root.pitch + offset) % 12 for offset in Music_Theory.get_scale_definition(scale).offsets
+            ]
+
+    # Beyond triple accidentals, the accidentals keep adding up rather than wrapping around
+    assert get_scale("F#####", "lydian augmented")[3:5] == ["B#####", "C######"]
+
+
 def test_get_diatonic_chords():
     # Test finding the diatonic chords for all keys in major, natural minor, harmonic minor and melodic minor.
     # This should cover all the special cases, that need either double-sharps, double-flats, diminished or
@@ -188,6 +262,44 @@ def test_get_diatonic_chords():
     assert get_diatonic_chords("B", "melodic minor") == ["Bm", "C#m", "D+", "E", "F#", "G#o", "A#o"]
 
 
+def test_get_diatonic_harmony():
+    chords = get_diatonic_harmony("D", "major")
+    assert [chord.degree for chord in chords] == ["I", "ii", "iii", "IV", "V", "vi", "viio"]
+    assert [chord.name for chord in chords] == get_diatonic_chords("D", "major")
+    assert [chord.root for chord in chords] == list(range(7))
+    assert chords[2].quality == "m" and chords[2].notes == ("F#", "A", "C#")
+    assert all(chord.notes == tuple(get_chord_notes(chord.name)) for chord in chords)
+
+    # Seventh chords, stacked on the same scale
+    chords = get_diatonic_harmony("D", "major", sevenths=True)
+    assert [chord.name for chord in chords] == ["Dmaj7", "Em7", "F#m7", "Gmaj7", "A7", "Bm7", "C#\u00f87"]
+    assert [chord.degree for chord in chords] == ["Imaj7", "ii7", "iii7", "IVmaj7", "V7", "vi7", "vii\u00f87"]
+    assert chords[4].notes == ("A", "C#", "E", "G")
+    assert [chord.name for chord in get_diatonic_harmony("C", "harmonic minor", True)] == [
+        "Cmmaj7",
+        "D\u00f87",
+        "Eb+maj7",
+        "Fm7",
+        "G7",
+        "Abmaj7",
+        "Bo7",
+    ]
+    assert get_diatonic_harmony("Fb", "major", True)[6].notes == ("Eb", "Gb", "Bbb", "Db")
+
+    # Scales that don't have 7 notes have no seventh chords, only triads
+    chords = get_diatonic_harmony("A", "minor pentatonic", True)
+    assert [(chord.degree, chord.notes) for chord in chords] == [
+        ("i", ("A", "C", "E")),
+        ("bIII", ("C", "E", "G")),
+    ]
+
+    # Computed once per key
+    assert get_diatonic_harmony("D", "major") is get_diatonic_harmony("D", "major")
+
+    with pytest.raises(ValueError):
+        get_diatonic_harmony("C", "unknown")
+
+
 def test_get_chord_notes():
     # Test all the chords returned by the get_diatonic_chords function (for all the scales above)
 
@@ -302,6 +414,137 @@ def test_get_chord_notes():
     assert get_chord_notes("Cb+") == ["Cb", "Eb", "G"]
 
 
+def test_get_chord_notes_extended():
+    # Sevenths, with the usual alternate spellings of each quality
+    assert get_chord_notes("G7") == ["G", "B", "D", "F"]
+    assert (
+        get_chord_notes("Cmaj7")
+        == get_chord_notes("CM7")
+        == get_chord_notes("C\N{GREEK CAPITAL LETTER DELTA}7")
+        == ["C", "E", "G", "B"]
+    )
+    assert get_chord_notes("Dm7") == get_chord_notes("Dmin7") == ["D", "F", "A", "C"]
+    assert get_chord_notes("CmM7") == get_chord_notes("Cm(maj7)") == ["C", "Eb", "G", "B"]
+    assert get_chord_notes("Bo7") == get_chord_notes("Bdim7") == ["B", "D", "F", "Ab"]
+    assert (
+        get_chord_notes("B\N{LATIN SMALL LETTER O WITH STROKE}")
+        == get_chord_notes("Bm7b5")
+        == ["B", "D", "F", "A"]
+    )
+    assert get_chord_notes("C+7") == get_chord_notes("Caug7") == ["C", "E", "G#", "Bb"]
+    assert get_chord_notes("F#7") == ["F#", "A#", "C#", "E"]
+
+    # Sixths, extensions and power chords
+    assert get_chord_notes("C6") == ["C", "E", "G", "A"]
+    assert get_chord_notes("C6/9") == get_chord_notes("C69") == ["C", "E", "G", "A", "D"]
+    assert get_chord_notes("Am9") == ["A", "C", "E", "G", "B"]
+    assert get_chord_notes("Ebmaj9") == ["Eb", "G", "Bb", "D", "F"]
+    assert get_chord_notes("F#m11") == ["F#", "A", "C#", "E", "G#", "B"]
+    assert get_chord_notes("G13") == ["G", "B", "D", "F", "A", "C", "E"]
+    assert get_chord_notes("E5") == ["E", "B"]
+
+    # Suspensions, added, omitted and altered tones
+    assert get_chord_notes("Dsus2") == ["D", "E", "A"]
+    assert get_chord_notes("Dsus4") == get_chord_notes("Dsus") == ["D", "G", "A"]
+    assert get_chord_notes("A7sus4") == ["A", "D", "E", "G"]
+    assert get_chord_notes("Cadd9") == get_chord_notes("C(add9)") == ["C", "E", "G", "D"]
+    assert get_chord_notes("Cmadd9") == ["C", "Eb", "G", "D"]
+    assert get_chord_notes("Eb7no5") == ["Eb", "G", "Db"]
+    assert get_chord_notes("C7b5") == ["C", "E", "Gb", "Bb"]
+    assert get_chord_notes("Bb13#11") == ["Bb", "D", "F", "Ab", "C", "E", "G"]
+    assert get_chord_notes("C7b9#9") == ["C", "E", "G", "Bb", "Db", "D#"]
+    assert get_chord_notes("C7(b9,#11)") == ["C", "E", "G", "Bb", "Db", "F#"]
+
+    # Slash chords start with their bass note
+    assert get_chord_notes("C/E") == ["E", "G", "C"]
+    assert get_chord_notes("Am7/G") == ["G", "A", "C", "E"]
+    assert get_chord_notes("C/Bb") == ["Bb", "C", "E", "G"]
+
+    for chord in [
+        "Cxyz",
+        "Cmm",
+        "C7add12",
+        "Csus3",
+        "C7b",
+        "Cno1",
+        "C/H",
+        "H7",
+        "",
+        "C(",
+        "Cm(",
+        "C7(b9",
+        "C)",
+        "Cm7)",
+        "C((7))",
+    ]:
+        with pytest.raises(ValueError):
+            get_chord_notes(chord)
+
+
+def test_get_voicings():
+    # Close and open voicings, lowest first, every note of the chord within the span
+    assert list(get_voicings("C", 4, low=48, high=72, max_span=12)) == [
+        (48, 52, 55, 60),
+        (52, 55, 60, 64),
+        (55, 60, 64, 67),
+        (60, 64, 67, 72),
+    ]
+    assert Music_Theory.name_voicing("C", (52, 55, 60)) == ["E3", "G3", "C4"]
+    assert Music_Theory.name_voicing("G#", (56, 60, 63)) == ["G#3", "B#3", "D#4"]
+
+    # Inversions, slash chords and doublings
+    assert all(voicing[0] % 12 == 11 for voicing in get_voicings("Cmaj7", 4, inversion=3))
+    assert all(voicing[0] % 12 == 10 for voicing in get_voicings("C/Bb", 5))
+    assert next(get_voicings("C/E", 3, low=48)) == (52, 55, 60)
+    assert all(len(set(note % 12 for note in voicing)) == 4 for voicing in get_voicings("C7", 4))
+    for voicing in get_voicings("C", 5, doubling=["C"]):
+        assert [note % 12 for note in voicing].count(4) == [note % 12 for note in voicing].count(7) == 1
+    assert list(get_voicings("C9", 4)) == []
+
+    # Lazy: the first voicings of a large search are found without enumerating the others
+    voicings = get_voicings("C", 6, low=0, high=127, max_span=127)
+    assert next(voicings) == (0, 4, 7, 12, 16, 19)
+
+    with pytest.raises(ValueError):
+        get_voicings("C", 4, inversion=3)
+    with pytest.raises(ValueError):
+        get_voicings("C", 4, doubling=["D"])
+    with pytest.raises(ValueError):
+        get_voicings("C", 4, low=60, high=48)
+    with pytest.raises(ValueError):
+        Music_Theory.name_voicing("C", [61])
+
+
+def test_compile_chord_formula():
+    # Each suffix is tokenized and compiled once, to (letter steps, half-steps) from the root
+    assert Music_Theory.tokenize_chord_suffix("mM7") == ("mmaj7", [])
+    assert Music_Theory.tokenize_chord_suffix("7sus4(b9)") == ("7", [("sus", 4), ("b", 9)])
+    assert Music_Theory.compile_chord_formula("m7") == ((0, 0), (2, 3), (4, 7), (6, 10))
+    assert Music_Theory.compile_chord_formula("m7") is Music_Theory.compile_chord_formula("m7")
+
+    # The cache is bounded, whatever the number of suffixes compiled
+    cache = Music_Theory._chord_formula_cache
+    limit = Music_Theory.CHORD_FORMULA_LIMIT
+    Music_Theory.CHORD_FORMULA_LIMIT = len(cache)
+    try:
+        assert Music_Theory.compile_chord_formula("7b9#9#11b13") == Music_Theory.compile_chord_formula(
+            "7b9#9#11b13"
+        )
+        assert "7b9#9#11b13" not in cache
+    finally:
+        Music_Theory.CHORD_FORMULA_LIMIT = limit
+
+    # Adding a quality to the registry is enough to support it
+    with pytest.raises(ValueError):
+        get_chord_notes("CmM11")
+    Music_Theory.CHORD_FORMULAS["mmaj11"] = ((1, 0), (3, -1), (5, 0), (7, 0), (9, 0), (11, 0))
+    try:
+        assert get_chord_notes("CmM11") == ["C", "Eb", "G", "B", "D", "F"]
+    finally:
+        del Music_Theory.CHORD_FORMULAS["mmaj11"]
+        Music_Theory._chord_formula_cache.pop("mM11", None)
+
+
 def test_prepare_pretty_display():
     # Test a few regular cases and a few special cases, with and without verbose
 
@@ -314,7 +557,70 @@ def test_prepare_pretty_display():
     assert prepare_pretty_display("Am", verbose=True) == "Am (min)"
     assert prepare_pretty_display("Abo", verbose=True) == "Ab° (dim)"
     assert prepare_pretty_display("Ab-", verbose=True) == "Ab° (dim)"
+    # The quality comes from the chord parser, whatever its spelling
+    assert prepare_pretty_display("Cdim", verbose=True) == "Cdim (dim)"
+    assert prepare_pretty_display("C°", verbose=True) == "C° (dim)"
+    assert prepare_pretty_display("Caug", verbose=True) == "Caug (aug)"
+    assert prepare_pretty_display("Cmin", verbose=True) == "Cmin (min)"
+    assert prepare_pretty_display("Cm7", verbose=True) == "Cm7"
+    assert prepare_pretty_display("Cmaj", verbose=True) == "Cmaj"
+    assert prepare_pretty_display("Dm/F", verbose=True) == "Dm/F (min)"
     assert prepare_pretty_display("Gbm+", verbose=True) == "Gbm⁺ (aug)"
+    assert prepare_pretty_display("viio", verbose=True, quality="o") == "vii° (dim)"
+    assert prepare_pretty_display("ii", verbose=True, quality="m", label=False) == "ii"
+
+
+def test_render_table():
+    # Same output as tabulate, for the three tables
+    from tabulate import tabulate
+
+    tables = [
+        ([["1", "2", "3", "4", "5", "6", "7"], get_scale("C#", "blues")], "center"),
+        ([["Degree", "Chord", "Triad"], ["vii\u00b0 (dim)", "B#\u00b0 (dim)", "B# - D# - F#"]], "left"),
+        ([["Chord", "Notes"], ["C\u266fm7", "C# - E - G# - B"]], "left"),
+        ([["Degree", "Chord", "Triad"]], "left"),
+    ]
+    for rows, align in tables:
+        assert render_table(rows, centered=align == "center") == tabulate(
+            rows, headers="firstrow", tablefmt="fancy_outline", stralign=align
+        )
+    assert (
+        render_table([["1", "2"], ["C#", "Db"]], centered=True).splitlines()[3]
+        == "\u2502 C#  \u2502 Db  \u2502"
+    )
+
+
+def test_display_tables(capsys):
+    # Each table is rendered once, then printed from the cache
+    for _ in range(2):
+        display_scale("Eb", "harmonic minor")
+        display_diatonic_chords("Eb", "harmonic minor", verbose=True)
+        display_chord("Ebm7")
+    first, second = capsys.readouterr().out.split("\nNotes for the Eb")[1:]
+    assert first == second
+    assert "\u2502 Eb  \u2502  F  \u2502 Gb  \u2502" in first
+    assert "\u2502 III\u207a (aug) \u2502 Gb\u207a (aug) \u2502 Gb - Bb - D  \u2502" in first
+    assert first.endswith(
+        "\u2502 Ebm7    \u2502 Eb - Gb - Bb - Db \u2502\n\u2558"
+        + "\u2550" * 9
+        + "\u2567"
+        + "\u2550" * 19
+        + "\u255b\n\n"
+    )
+
+
+def test_display_chord_verbose():
+    # The quality label of the other spellings of the triads (-v)
+    for chord, name in [
+        ("Cdim", "Cdim (dim)"),
+        ("C°", "C° (dim)"),
+        ("Caug", "Caug (aug)"),
+        ("Cmin", "Cmin (min)"),
+    ]:
+        result = subprocess.run(
+            [sys.executable, "project.py", "-c", chord, "-v"], capture_output=True, text=True, check=True
+        )
+        assert f"Notes in chord {name}:" in result.stdout
 
 
 def test_prepare_display_chord_notes():
@@ -339,6 +645,14 @@ def test_get_enharmonic_note():
     assert Music_Theory.get_enharmonic_note("F", "E") == "E#"
     assert Music_Theory.get_enharmonic_note("G", "A") == "Abb"
     assert Music_Theory.get_enharmonic_note("A", "G") == "G##"
+    assert Music_Theory.get_enharmonic_note("D", None) == "C##"
+    assert Music_Theory.get_enharmonic_note("G#", None) == "Ab"
+    assert Music_Theory.get_enharmonic_note("E###", "G") == "G"
+    assert Music_Theory.get_enharmonic_note("E###", "F") == "F##"
+    with pytest.raises(ValueError):
+        Music_Theory.get_enharmonic_note("H", None)
+    with pytest.raises(ValueError):
+        Music_Theory.get_enharmonic_note("C", "H")
 
 
 def test_get_next_expected_note():
@@ -385,3 +699,538 @@ def test_flatten():
     assert Music_Theory.flatten("C##") == "C#"
     assert Music_Theory.flatten(Music_Theory.flatten("C##")) == "C"
     assert Music_Theory.flatten(Music_Theory.flatten(Music_Theory.flatten("C##"))) == "Cb"
+
+
+def test_lookup_scale():
+    # The cached scales are immutable, and get_scale() always hands out a fresh copy
+    Music_Theory.clear_scale_cache()
+    assert Music_Theory.lookup_scale("D", "minor") == ("D", "E", "F", "G", "A", "Bb", "C", "D")
+    assert Music_Theory.lookup_scale("D", "natural minor") is Music_Theory.lookup_scale("D", "minor")
+    assert Music_Theory.get_scale_cache_info() == {"hits": 2, "misses": 1, "size": 1}
+
+    notes = get_scale("D", "minor")
+    notes[0] = "X"
+    assert get_scale("D", "minor")[0] == "D"
+
+    with pytest.raises(ValueError):
+        Music_Theory.lookup_scale("D", "invalid")
+
+
+def test_precompute_scales():
+    Music_Theory.clear_scale_cache()
+    size = Music_Theory.precompute_scales()
+    assert size == Music_Theory.get_scale_cache_info()["size"]
+    assert ("Cb", "major") in Music_Theory._scale_cache
+    assert ("G#", "harmonic minor") in Music_Theory._scale_cache
+
+    # Everything is now served from the cache
+    get_scale("Cb", "major")
+    get_diatonic_chords("G#", "harmonic minor")
+    assert Music_Theory.get_scale_cache_info()["misses"] == 0
+    Music_Theory.clear_scale_cache()
+
+
+def test_note():
+    # Notes are stored as a letter index and a signed number of accidentals
+    assert Note.parse("C") == Note(0, 0)
+    assert Note.parse("Ebb") == Note(2, -2)
+    assert Note.parse("F###") == Note(3, 3)
+    assert Note.parse("Ab").pitch == 8
+    assert Note.parse("B#").pitch == 0
+    assert Note.parse("Cb").pitch == 11
+    assert str(Note(6, -1)) == "Bb"
+    assert str(Note(4, 4)) == "G####"
+    assert str(Note.parse("E###").respell(4)) == "G"
+    assert str(Note.parse("C#").transpose(2, 4)) == "E#"
+    assert str(Note.parse("Db").transpose(4, 6)) == "Abb"
+    for name in ["", "H", "c", "C#b", "Cbx", "#C"]:
+        with pytest.raises(ValueError):
+            Note.parse(name)
+
+    # Unicode accidentals, and the spelling of the notes typed by users
+    assert Note.parse("F\u266f") == Note.parse("F#")
+    assert Note.parse("B\u266d\u266d") == Note(6, -2)
+    assert Note.parse("Db") is Note.parse("Db")
+    assert Note.normalize("eB") == Note.normalize("e\u266d") == "Eb"
+    assert Note.normalize("f#") == "F#"
+    with pytest.raises(ValueError):
+        Note.normalize("h")
+
+
+def test_parse_chord():
+    # Chord names are parsed once into a root, a suffix (quality and modifiers) and a bass note
+    symbol = Music_Theory.parse_chord("Bb13#11/D")
+    assert (str(symbol.root), symbol.suffix, symbol.quality, symbol.modifiers) == (
+        "Bb",
+        "13#11",
+        "13",
+        (("#", 11),),
+    )
+    assert str(symbol.bass) == "D"
+    assert symbol.formula == Music_Theory.compile_chord_formula("13#11")
+    assert Music_Theory.parse_chord("C6/9").bass is None
+
+    # Parsed names are remembered, and spellings with Unicode symbols share the same object
+    assert Music_Theory.parse_chord("C#m7") is Music_Theory.parse_chord("C#m7")
+    assert Music_Theory.parse_chord("C\u266fm7") is Music_Theory.parse_chord("C#m7")
+    assert Music_Theory.parse_chord("E\u266d/B\u266d").name == "Eb/Bb"
+    assert get_chord_notes("B\u266d\u00b0") == get_chord_notes("Bbo") == ["Bb", "Db", "Fb"]
+    assert get_chord_notes("C\u00f8") == get_chord_notes("Cm7b5")
+    assert get_chord_notes("G7\u266d9") == get_chord_notes("G7b9")
+    assert transpose_chord("C\u266f/E\u266f", 1, 2) == "D#/F##"
+
+    # Triads are recognized whatever the spelling of their quality
+    assert [
+        Music_Theory.parse_chord_symbol(chord) for chord in ["Cmin", "C-", "Cdim", "C\u00b0", "Caug", "C"]
+    ] == [
+        (0, "m"),
+        (0, "o"),
+        (0, "o"),
+        (0, "o"),
+        (0, "+"),
+        (0, "M"),
+    ]
+    assert Music_Theory.parse_chord_symbol("Dbdim/Fb") == (1, "o")
+    assert Music_Theory.parse_chord_symbol("C7") is None
+    assert Music_Theory.parse_chord_symbol("Cadd9") is None
+
+    # Triads and seventh chords are classified from their notes
+    assert Music_Theory.classify_chord("Cmin") == (0, "m")
+    assert Music_Theory.classify_chord("Cmb5") == (0, "o")
+    assert Music_Theory.classify_chord("Dbm7b5/Fb") == (1, "\u00f87")
+    assert Music_Theory.classify_chord("CmM7") == (0, "mmaj7")
+    for chord in ("C7sus4", "C6", "C9", "C7b5", "C5", "Cx"):
+        assert Music_Theory.classify_chord(chord) is None
+
+    for chord in ["", "c", "Cxyz", "C/H", "H/C", "C#b"]:
+        with pytest.raises(ValueError):
+            Music_Theory.parse_chord(chord)
+
+
+def test_parse_query():
+    # Queries use either the command-line options or a JSON object
+    args = parse_query("-s C -t harmonic -d")
+    assert (args.scale, args.type, args.diatonic_chords, args.chord, args.verbose) == (
+        "C",
+        "harmonic",
+        True,
+        None,
+        False,
+    )
+    args = parse_query('{"chord": "Ab+", "verbose": true}')
+    assert (args.scale, args.type, args.diatonic_chords, args.chord, args.verbose) == (
+        None,
+        None,
+        False,
+        "Ab+",
+        True,
+    )
+    for line in [
+        "-s C -t invalid",
+        "-x",
+        "-b file",
+        "{bad json",
+        "[1, 2]",
+        '{"note": "C"}',
+        '{"scale": "C", "type": "x"}',
+        '{"scale": 5, "type": "major"}',
+        '{"chord": ["C"]}',
+        '{"scale": "C", "type": {"major": 1}}',
+        '{"chord": "C", "format": ["json"]}',
+        '{"chord": "C", "verbose": 1}',
+        '{"scale": "C", "type": "major", "diatonic": "yes"}',
+    ]:
+        with pytest.raises(ValueError):
+            parse_query(line)
+
+
+def test_run_batch(capsys):
+    # Every query is answered, bad queries are reported with their line number on stderr
+    lines = ["-c C", "", "# comment", '{"chord": "Xm"}', "-s C", '{"scale": "A", "type": "minor"}']
+    assert run_batch(lines) == 1
+    captured = capsys.readouterr()
+    assert "Notes in chord C:" in captured.out
+    assert "Notes for the A Natural Minor scale:" in captured.out
+    assert (
+        captured.err
+        == "Line 4: Unable to generate the chord: Invalid note: X\nLine 5: Invalid combination of arguments\n"
+    )
+
+    assert run_batch(["-c Cm", "-c Co -v"]) == 0
+
+    # Values of the wrong type in a JSON query only fail their own line
+    capsys.readouterr()
+    assert run_batch(['{"chord": ["C"]}', '{"scale": 5, "type": "major"}', "-c C"]) == 1
+    captured = capsys.readouterr()
+    assert "Notes in chord C:" in captured.out
+    assert (
+        captured.err.startswith("Line 1: Invalid value for chord")
+        and "Line 2: Invalid value for scale" in captured.err
+    )
+
+    # Queries have no help: it would be printed in the middle of the results
+    assert run_batch(["-h", "-c C -f csv", "--help"]) == 1
+    captured = capsys.readouterr()
+    assert captured.out == "Chord,Triad\nC,C - E - G\n"
+    assert captured.err == "Line 1: unrecognized arguments: -h\nLine 3: unrecognized arguments: --help\n"
+
+    # The format given for the whole batch applies to the queries without a format
+    capsys.readouterr()
+    assert run_batch(["-c Cm", '{"chord": "C+", "format": "csv"}'], "ndjson") == 0
+    assert (
+        capsys.readouterr().out == '{"chord": "Cm", "triad": ["C", "Eb", "G"]}\nChord,Triad\nC+,C - E - G#\n'
+    )
+
+
+def test_lazy_imports():
+    # Importing the project and using the Music_Theory class must not load the modules only
+    # needed to parse a command line or to display a table, as they dominate the startup time
+    code = "import project, sys; project.get_diatonic_chords('C'); print(sorted({'argparse', 'json', 're', 'tabulate', 'typing'} & set(sys.modules)))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout == "[]\n"
+
+
+def test_write_scale(capsys):
+    # Machine-readable formats, with and without the diatonic chords
+    write_scale("A", "harmonic minor", False, "json")
+    assert json.loads(capsys.readouterr().out) == {
+        "scale": "A",
+        "type": "harmonic minor",
+        "notes": ["A", "B", "C", "D", "E", "F", "G#", "A"],
+    }
+
+    write_scale("A", "harmonic minor", True, "json")
+    output = json.loads(capsys.readouterr().out)
+    assert len(output["diatonic_chords"]) == 7
+    assert output["diatonic_chords"][6] == {"degree": "viio", "chord": "G#o", "triad": ["G#", "B", "D"]}
+
+    write_scale("A", "harmonic minor", True, "ndjson")
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 8
+    assert json.loads(lines[0])["notes"] == ["A", "B", "C", "D", "E", "F", "G#", "A"]
+    assert json.loads(lines[3]) == {
+        "scale": "A",
+        "type": "harmonic minor",
+        "degree": "III+",
+        "chord": "C+",
+        "triad": ["C", "E", "G#"],
+    }
+
+    write_scale("A", "harmonic minor", True, "csv")
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[:4] == ["1,2,3,4,5,6,7,8", "A,B,C,D,E,F,G#,A", "", "Degree,Chord,Triad"]
+    assert lines[4] == "i,Am,A - C - E"
+    assert len(lines) == 11
+
+    with pytest.raises(ValueError):
+        write_scale("H", "major", False, "json")
+    assert capsys.readouterr().out == ""
+
+
+def test_write_chord(capsys):
+    write_chord("Db-", "json")
+    assert json.loads(capsys.readouterr().out) == {"chord": "Db-", "triad": ["Db", "Fb", "Abb"]}
+    write_chord("Db-", "csv")
+    assert capsys.readouterr().out == "Chord,Triad\nDb-,Db - Fb - Abb\n"
+    write_chord("C7(b9,#11)", "csv")
+    assert capsys.readouterr().out == 'Chord,Triad\n"C7(b9,#11)",C - E - G - Bb - Db - F#\n'
+
+
+def test_machine_formats_without_tabulate():
+    # The machine-readable formats must never load tabulate
+    code = "import project, sys; sys.argv = ['project.py', '-s', 'C', '-t', 'major', '-d', '-f', 'json']\ntry:\n    project.main()\nexcept SystemExit:\n    pass\nprint('tabulate' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.splitlines()[-1] == "False"
+
+
+def test_get_scales():
+    # The vectorized version must give exactly the same results as get_scale()
+    tonics = ["C", "F#", "Cb", "E###", "Dbb", "C"]
+    variants = [
+        scale for scale in Music_Theory.SUPPORTED_SCALES if len(Music_Theory.get_intervals(scale)) == 7
+    ]
+    table = get_scales(tonics, ["major", "minor", *variants])
+    assert len(table) == len(tonics) * (len(variants) + 2)
+    assert table.letters.shape == table.accidentals.shape == (len(table), 8)
+    for row, notes in enumerate(table.to_lists()):
+        assert notes == table.notes(row) == get_scale(*table.key(row))
+
+    assert table.key(1) == ("C", "natural minor")
+    assert table.to_dict()[("Cb", "major")] == ["Cb", "Db", "Eb", "Fb", "Gb", "Ab", "Bb", "Cb"]
+    assert get_scales([], ["major"]).to_lists() == []
+    with pytest.raises(ValueError):
+        get_scales(["C"], ["invalid"])
+
+    # Scale types of other sizes, but not mixed with each other
+    table = get_scales(tonics, ["blues", "major blues"])
+    assert table.letters.shape == (len(tonics) * 2, 7)
+    assert [table.notes(row) for row in range(len(table))] == [get_scale(*key) for key in table.keys()]
+    with pytest.raises(ValueError):
+        get_scales(["C"], ["major", "blues"])
+    with pytest.raises(ValueError):
+        get_scales(["H"], ["major"])
+
+
+def test_identify_chord():
+    # Notes in any order (or inversion), exact spelling first
+    assert identify_chord(["C", "E", "G"]) == [("C", "M")]
+    assert identify_chord(["G", "C", "E"]) == [("C", "M")]
+    assert identify_chord(["E", "G", "C", "C"]) == [("C", "M")]
+    assert identify_chord(["F#", "A", "C#"]) == [("F#m", "m")]
+    assert identify_chord(["Ab", "Cb", "Ebb"]) == [("Abo", "o")]
+    assert identify_chord(["G#", "C", "E"]) == [("C+", "+")]
+    assert identify_chord(["Ab", "C", "E"]) == [("Ab+", "+")]
+
+    # Otherwise, every chord with the same pitches, simplest spellings first
+    assert identify_chord(["C", "Fb", "G"]) == [("C", "M"), ("B#", "M"), ("Dbb", "M")]
+    # Augmented triads are symmetrical: the same pitches give several roots
+    matches = identify_chord(["C", "Fb", "G#"])
+    assert matches[:3] == [("C+", "+"), ("Ab+", "+"), ("E+", "+")]
+    assert len(matches) > 3
+
+    # Not a triad
+    assert identify_chord(["C", "D", "E"]) == []
+    assert identify_chord(["C", "E"]) == []
+    with pytest.raises(ValueError):
+        identify_chord(["C", "H", "G"])
+
+
+def test_get_pitch_class_mask():
+    assert Music_Theory.get_pitch_class_mask([]) == 0
+    assert Music_Theory.get_pitch_class_mask(["C", "E", "G"]) == 0b000010010001
+    assert Music_Theory.get_pitch_class_mask(["B#", "Fb", "G", "C"]) == 0b000010010001
+    assert Music_Theory.get_pitch_class_mask(["B"]) == 1 << 11
+
+
+def test_find_scales():
+    # Every scale containing all the notes, best fit first
+    hits = find_scales(["C", "E", "G", "B"])
+    assert hits[0] == ("C", "major", ["C", "D", "E", "F", "G", "A", "B", "C"])
+    assert ("E", "natural minor", get_scale("E", "minor")) in hits
+    for tonic, scale, notes in hits:
+        assert notes == get_scale(tonic, scale)
+        assert (
+            Music_Theory.get_pitch_class_mask(["C", "E", "G", "B"])
+            & ~Music_Theory.get_pitch_class_mask(notes)
+            == 0
+        )
+
+    # The spelling of the notes is used to rank enharmonic scales
+    assert find_scales(["Db", "Gb", "Ab", "C"])[0][:2] == ("Db", "major")
+    assert find_scales(["C#", "E#", "G#", "B#"])[0][:2] == ("C#", "major")
+    assert find_scales(["Gb", "Bbb", "F"])[0][:2] == ("Gb", "melodic minor")
+
+    # Chromatic clusters of four notes are not in any supported scale (blues scales have three)
+    assert find_scales(["C", "C#", "D", "D#"]) == []
+    assert find_scales(["C", "C#", "D"])[0][:2] == ("G", "blues")
+    with pytest.raises(ValueError):
+        find_scales(["X"])
+
+
+def test_get_chord_degree():
+    # Degrees come from SCALE_CHORD_QUALITIES, for the chords returned by get_diatonic_chords()
+    for tonic, variant in [
+        ("C", "major"),
+        ("Eb", "natural minor"),
+        ("G#", "harmonic minor"),
+        ("Bb", "melodic minor"),
+    ]:
+        chords = get_diatonic_chords(tonic, variant)
+        degrees = [get_chord_degree(chord, tonic, variant) for chord in chords]
+        assert degrees == Music_Theory.SCALE_CHORD_QUALITIES[variant][1]
+
+    # Other spellings of the same triads, slash chords, and chords out of key
+    assert get_chord_degree("D#m", "Db") == "ii"
+    assert get_chord_degree("B-", "C") == "viio"
+    assert get_chord_degree("C/G", "C") == "I"
+    assert get_chord_degree("Cm", "C") is None
+
+    # Seventh chords, from the diatonic seventh chords, whatever their spelling
+    assert [get_chord_degree(chord, "C") for chord in ["G7", "Dm7", "Cmaj7", "CM7", "Bm7b5", "B\u00f87"]] == [
+        "V7",
+        "ii7",
+        "Imaj7",
+        "Imaj7",
+        "vii\u00f87",
+        "vii\u00f87",
+    ]
+    assert get_chord_degree("E7", "A", "harmonic minor") == "V7"
+    assert get_chord_degree("C7", "C") is None
+    assert get_chord_degree("Gsus4", "C") is None
+    assert get_chord_degree("G9", "C") is None
+    assert get_chord_degree("G7", "C", "blues") is None
+    assert get_chord_degree("Hm", "C") is None
+    assert get_chord_degree("", "C") is None
+
+    # The table is built once per key
+    assert Music_Theory.get_degree_table("C", "major") is Music_Theory.get_degree_table("C", "major")
+    with pytest.raises(ValueError):
+        get_chord_degree("C", "H")
+    with pytest.raises(ValueError):
+        get_chord_degree("C", "C", "bebop")
+
+
+def test_detect_key():
+    # The number of chords in the key comes first, then starting and ending on the tonic chord
+    assert detect_key(["C", "F", "G", "C"]) == ("C", "major", 1.0)
+    assert detect_key(["Am", "F", "C", "G"]) == ("A", "natural minor", 1.0)
+    assert detect_key(["C", "F", "G", "Am"]) == ("C", "major", 1.0)
+    assert detect_key(["Bb", "Eb", "F7", "Bb"]) == ("Bb", "major", 0.75)
+
+    # Then the spelling of the chords, then the fewest accidentals
+    assert detect_key(["C#", "F#", "G#", "C#"])[0] == "C#"
+    assert detect_key(["Db", "Gb", "Ab", "Db"])[0] == "Db"
+    assert detect_key(["Am", "Dm", "Em", "Am"])[:2] == ("A", "natural minor")
+    assert detect_key(["Am", "Dm", "E", "Am"])[:2] == ("A", "harmonic minor")
+    assert detect_key(["Am", "D", "E", "Am"])[:2] == ("A", "melodic minor")
+
+    # Every candidate key is ranked
+    ranked = Music_Theory.detect_key(["G/B", "C", "D7", "G"])
+    assert len(ranked) == Music_Theory.build_key_index() == 21 * 4
+    assert ranked[0] == ("G", "major", 0.75)
+    with pytest.raises(ValueError):
+        detect_key([])
+
+
+def test_profiling():
+    original = Music_Theory.__dict__["get_chord_notes"]
+    Music_Theory.clear_scale_cache()
+    Music_Theory.reset_profile()
+    Music_Theory.enable_profiling()
+    try:
+        assert Music_Theory.is_profiling()
+        get_scale("D", "minor")
+        get_scale("D", "minor")
+        get_chord_notes("C#o")
+        Music_Theory.get_enharmonic_note("C#", None)
+        Music_Theory.get_enharmonic_note("C#", "D")
+        with pytest.raises(ValueError):
+            get_chord_notes("H")
+    finally:
+        Music_Theory.disable_profiling()
+
+    # The original methods are restored, and nothing is counted anymore
+    assert Music_Theory.__dict__["get_chord_notes"] is original
+    get_chord_notes("C")
+
+    profile = Music_Theory.get_profile()
+    assert profile["methods"]["get_scale"]["calls"] == 2
+    assert profile["methods"]["get_chord_notes"]["calls"] == 2
+    assert profile["methods"]["compute_scale"]["calls"] == 1
+    assert profile["methods"]["get_scale"]["seconds"] > 0
+    assert profile["enharmonic_fallbacks"] == 1
+    assert profile["scale_cache"] == {"hits": 1, "misses": 1, "size": 1, "hit_rate": 0.5}
+
+    output = io.StringIO()
+    write_profile("json", output)
+    assert json.loads(output.getvalue()) == json.loads(json.dumps(profile))
+    output = io.StringIO()
+    write_profile("table", output)
+    assert "get_chord_notes" in output.getvalue() and "50.0% hit rate" in output.getvalue()
+
+    Music_Theory.reset_profile()
+    assert Music_Theory.get_profile()["methods"] == {}
+    Music_Theory.clear_scale_cache()
+
+
+def test_profile_option():
+    # The report goes to stderr, so that it never mixes with the output
+    command = [sys.executable, "project.py", "-c", "Ab+", "-f", "json"]
+    result = subprocess.run(command + ["--profile", "json"], capture_output=True, text=True)
+    assert json.loads(result.stdout) == {"chord": "Ab+", "triad": ["Ab", "C", "E"]}
+    assert json.loads(result.stderr)["methods"]["get_chord_notes"]["calls"] == 1
+
+    environment = dict(os.environ, MUSIC_THEORY_PROFILE="1")
+    result = subprocess.run(command, capture_output=True, text=True, env=environment)
+    assert "get_chord_notes" in result.stderr and "Enharmonic fallbacks: 0" in result.stderr
+
+
+def test_scale_registry():
+    # Modes, aliases and spellings derived from the intervals
+    assert get_scale("D", "dorian") == ["D", "E", "F", "G", "A", "B", "C", "D"]
+    assert get_scale("C", "Lydian Dominant") == ["C", "D", "E", "F#", "G", "A", "Bb", "C"]
+    assert get_scale("C", "altered") == ["C", "Db", "Eb", "Fb", "Gb", "Ab", "Bb", "C"]
+    assert Music_Theory.normalize_scale_type("aeolian") == "natural minor"
+    assert Music_Theory.normalize_scale_type("ionian") == "major"
+    assert Music_Theory.get_intervals("locrian") == [1, 2, 2, 1, 2, 2, 2]
+
+    # Scales of other sizes are spelled as alterations of the major scale
+    assert get_scale("A", "minor pentatonic") == ["A", "C", "D", "E", "G", "A"]
+    assert get_scale("C", "blues") == ["C", "Eb", "F", "Gb", "G", "Bb", "C"]
+    assert get_scale("A", "major blues") == ["A", "B", "C", "C#", "E", "F#", "A"]
+
+    # Diatonic chords and their degrees
+    assert get_diatonic_chords("E", "phrygian") == ["Em", "F", "G", "Am", "Bo", "C", "Dm"]
+    assert Music_Theory.SCALE_CHORD_QUALITIES["mixolydian"][1] == ["I", "ii", "iiio", "IV", "v", "vi", "VII"]
+    assert get_diatonic_chords("C", "major pentatonic") == ["C", "Am"]
+    assert get_diatonic_chords("A", "minor pentatonic") == ["Am", "C"]
+    assert Music_Theory.SCALE_CHORD_QUALITIES["minor pentatonic"][1] == ["i", "bIII"]
+    assert get_chord_degree("Eb", "C", "blues") == "bIII"
+
+    # Sharp or flat keys, depending on the scale type
+    assert Music_Theory.get_preferred_tonic("C#", "major") == "Db"
+    assert Music_Theory.get_preferred_tonic("Db", "minor") == "C#"
+    assert Music_Theory.get_preferred_tonic("A#", "dorian") == "Bb"
+    assert Music_Theory.get_preferred_tonic("E#", "lydian") == "F"
+
+    # Registering the same intervals again only adds an alias
+    assert Music_Theory.register_scale("Hypodorian", [2, 1, 2, 2, 1, 2, 2]) == "natural minor"
+    assert get_scale("A", "hypodorian") == get_scale("A", "minor")
+    for name, intervals in [
+        ("major", [2, 2, 2, 2, 2, 2]),
+        ("whole tone", [2, 2, 2, 2, 2, 1]),
+        ("whole tone", [2, 2, 2, 2, 2, 2.0]),
+        ("whole tone", [12]),
+        ("", [2, 2, 2, 2, 2, 2]),
+    ]:
+        with pytest.raises(ValueError):
+            Music_Theory.register_scale(name, intervals)
+    with pytest.raises(ValueError):
+        Music_Theory.register_modes("blues", ["a", "b", "c", "d", "e", "f"])
+
+
+def test_load_scales(tmp_path):
+    lines = [
+        "# Scales from eastern Europe",
+        "",
+        "hungarian minor: 2 1 3 1 1 3 1 | oriental, ionian #2 #5, locrian bb3 bb7",
+        "whole tone: 2 2 2 2 2 2",
+    ]
+    assert Music_Theory.load_scales(lines) == [
+        "hungarian minor",
+        "oriental",
+        "ionian #2 #5",
+        "locrian bb3 bb7",
+        "whole tone",
+    ]
+    assert get_scale("A", "hungarian minor") == ["A", "B", "C", "D#", "E", "F", "G#", "A"]
+    # (no chord on the second degree: "B D# F" is not a supported triad)
+    assert get_diatonic_chords("A", "hungarian minor")[:3] == ["Am", "C+", "E"]
+    assert Music_Theory.SCALE_CHORD_QUALITIES["hungarian minor"][1][:3] == ["i", "III+", "V"]
+    assert get_scale("C", "whole tone") == ["C", "D", "E", "Gb", "Ab", "Bb", "C"]
+    assert get_diatonic_chords("C", "whole tone") == ["C+", "D+", "E+", "Gb+", "Ab+", "Bb+"]
+
+    for line in ["no colon", "x: 2 2 two", "y: 5 5 1", "z: 12 | a, b"]:
+        with pytest.raises(ValueError, match="Line 2: "):
+            Music_Theory.load_scales(["# comment", line])
+
+    # From the command line
+    path = tmp_path / "scales.txt"
+    path.write_text("double harmonic: 1 3 1 2 1 3 1\n")
+    command = [sys.executable, "project.py", "--scales", str(path), "-s", "C", "-t", "Double Harmonic"]
+    result = subprocess.run(command + ["-f", "csv"], capture_output=True, text=True)
+    assert result.stdout == "1,2,3,4,5,6,7,8\nC,Db,E,F,G,Ab,B,C\n"
+    result = subprocess.run(command[:4] + ["-s", "C", "-t", "bebop"], capture_output=True, text=True)
+    assert result.returncode == 1 and result.stdout == "Unable to generate scale: Unsupported scale\n"
+
+
+def test_transpose_chord():
+    # The spelling follows the interval: up a minor third is 2 letters and 3 half-steps
+    assert transpose_chord("C", 2, 3) == "Eb"
+    assert transpose_chord("F#m7", 2, 3) == "Am7"
+    assert transpose_chord("Bb13#11/D", 2, 3) == "Db13#11/F"
+    assert transpose_chord("C6/9", 2, 3) == "Eb6/9"
+    assert transpose_chord("G#o", 0, 11) == "Go"
+    for chord in ["", "Xm", "C/", "Cx", "C/H"]:
+        with pytest.raises(ValueError):
+            transpose_chord(chord, 1, 2)
@@ -0,0 +1,159 @@
+#!/usr/bin/env pytest
+# -*- coding: utf-8 -*-
+
+from server import Theory_Server, parse_address, run_load
+import asyncio
+import json
+import os
+import pytest
+import subprocess
+import sys
+import time
+
+
+def test_answer():
+    # Requests and responses are JSON objects, errors are reported for that request only
+    server = Theory_Server()
+
+    def answer(request):
+        return json.loads(server.answer(json.dumps(request).encode()))
+
+    assert answer({"id": 1, "method": "get_scale", "params": {"tonic": "D", "variant": "minor"}}) == {
+        "id": 1,
+        "result": ["D", "E", "F", "G", "A", "Bb", "C", "D"],
+    }
+    assert answer(
+        {"id": 2, "method": "get_diatonic_chords", "params": {"tonic": "C", "variant": "harmonic"}}
+    ) == {
+        "id": 2,
+        "result": ["Cm", "Do", "Eb+", "Fm", "G", "Ab", "Bo"],
+    }
+    assert answer({"id": 3, "method": "get_chord_notes", "params": {"chord": "Db-"}}) == {
+        "id": 3,
+        "result": ["Db", "Fb", "Abb"],
+    }
+    # Spellings that were not precomputed are still supported
+    assert answer({"id": 4, "method": "get_chord_notes", "params": {"chord": "E###"}})["result"] == [
+        "E###",
+        "G####",
+        "B###",
+    ]
+
+    assert answer({"id": 5, "method": "get_notes", "params": {}}) == {
+        "id": 5,
+        "error": "Unknown method: get_notes",
+    }
+    assert answer({"id": 6, "method": "get_scale", "params": {}}) == {
+        "id": 6,
+        "error": "Missing parameter: tonic",
+    }
+    assert "error" in answer({"id": 7, "method": "get_scale", "params": {"tonic": "C", "variant": "x"}})
+    assert "error" in json.loads(server.answer(b"not json"))
+    for params in ({"chord": 5}, {"tonic": [1]}, {"tonic": "C", "variant": [1]}):
+        method = "get_chord_notes" if "chord" in params else "get_scale"
+        response = answer({"id": 8, "method": method, "params": params})
+        assert response["id"] == 8 and response["error"].startswith("Invalid parameter")
+    assert answer({"id": 9, "method": ["get_scale"], "params": {}}) == {
+        "id": 9,
+        "error": "Unknown method: ['get_scale']",
+    }
+
+
+def test_handle_client(tmp_path):
+    # A bad request is answered with an error, and the requests pipelined after it on the same
+    # connection are still answered
+    address = f"unix:{tmp_path / 'server.sock'}"
+
+    async def run():
+        server = await Theory_Server().start(address)
+        async with server:
+            reader, writer = await asyncio.open_unix_connection(address[5:])
+            writer.write(
+                b'{"id": 1, "method": "get_chord_notes", "params": {"chord": 5}}\n'
+                b'{"id": 2, "method": "get_chord_notes", "params": {"chord": "Am"}}\n'
+            )
+            await writer.drain()
+            responses = [json.loads(await reader.readline()) for _ in range(2)]
+            writer.close()
+            await writer.wait_closed()
+            return responses
+
+    responses = asyncio.run(run())
+    assert responses[0]["id"] == 1 and "error" in responses[0]
+    assert responses[1] == {"id": 2, "result": ["A", "C", "E"]}
+
+    # A line longer than the limit of the reader is answered with an error, then the
+    # connection is closed
+    async def run_long_line():
+        server = await Theory_Server().start(address)
+        async with server:
+            reader, writer = await asyncio.open_unix_connection(address[5:])
+            writer.write(b"x" * 100_000 + b"\n")
+            await writer.drain()
+            response = json.loads(await reader.readline())
+            end = await reader.read()
+            writer.close()
+            await writer.wait_closed()
+            return response, end
+
+    assert asyncio.run(run_long_line()) == ({"id": None, "error": "Invalid request: line too long"}, b"")
+
+
+def test_serve_scales(tmp_path):
+    # The server started by project.py answers from its Music_Theory class, with the scale types
+    # registered on the command line
+    scales = tmp_path / "scales.txt"
+    scales.write_text("hungarian minor: 2 1 3 1 1 3 1\n")
+    socket = tmp_path / "server.sock"
+    command = [sys.executable, "project.py", "--scales", str(scales), "--serve", f"unix:{socket}"]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 30
+        while not os.path.exists(socket) and process.poll() is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        async def run():
+            reader, writer = await asyncio.open_unix_connection(str(socket))
+            writer.write(
+                b'{"id": 1, "method": "get_scale", "params": {"tonic": "A", "variant": "hungarian minor"}}\n'
+            )
+            await writer.drain()
+            response = json.loads(await reader.readline())
+            writer.close()
+            await writer.wait_closed()
+            return response
+
+        response = asyncio.run(run())
+    finally:
+        process.terminate()
+        process.wait()
+    assert response == {"id": 1, "result": ["A", "B", "C", "D#", "E", "F", "G#", "A"]}
+
+
+def test_parse_address():
+    assert parse_address("8765") == ("127.0.0.1", 8765)
+    assert parse_address("localhost:8765") == ("localhost", 8765)
+    with pytest.raises(ValueError):
+        parse_address("localhost")
+    with pytest.raises(ValueError):
+        parse_address("99999")
+
+
+def test_run_load(tmp_path):
+    # Several pipelining clients, all served concurrently by the same server
+    address = f"unix:{tmp_path / 'server.sock'}"
+
+    async def run():
+        server = await Theory_Server().start(address)
+        async with server:
+            return await run_load(address, clients=4, requests=50, pipeline=8)
+
+    stats = asyncio.run(run())
+    assert stats["requests"] == 200
+    assert stats["requests_per_second"] > 0
+    assert stats["p99_ms"] >= stats["p50_ms"]
+
+    # Nothing to measure without clients or requests
+    for clients, requests in ((0, 10), (4, 0)):
+        with pytest.raises(ValueError):
+            asyncio.run(run_load(address, clients=clients, requests=requests, pipeline=8))
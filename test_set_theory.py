@@ -0,0 +1,145 @@
+#!/usr/bin/env pytest
+# -*- coding: utf-8 -*-
+
+from set_theory import (
+    FORTE_NAMES,
+    SET_CLASSES,
+    find_interval_vector,
+    find_normal_form,
+    find_prime_form,
+    get_forte_name,
+    get_forte_names,
+    get_interval_vector,
+    get_interval_vectors,
+    get_normal_form,
+    get_notes_mask,
+    get_prime_form,
+    get_prime_masks,
+    get_set_class,
+    get_set_class_numbers,
+    get_set_mask,
+    get_transposition_masks,
+    invert_set,
+    is_equivalent,
+    is_transposition,
+    transpose_set,
+    transpose_sets,
+)
+from project import get_chord_notes, get_scale
+import numpy as np
+import pytest
+import subprocess
+import sys
+
+
+def test_set_classes():
+    # The 224 set classes of Forte's catalog, with the Z-related pairs
+    assert len(SET_CLASSES) == len(FORTE_NAMES) == 224
+    sizes = [len(set_class.prime_form) for set_class in SET_CLASSES]
+    assert [sizes.count(size) for size in range(13)] == [1, 1, 6, 12, 29, 38, 50, 38, 29, 12, 6, 1, 1]
+    assert [set_class.name for set_class in SET_CLASSES if "Z" in set_class.name][:8] == [
+        "4-Z15",
+        "4-Z29",
+        "5-Z12",
+        "5-Z17",
+        "5-Z18",
+        "5-Z36",
+        "5-Z37",
+        "5-Z38",
+    ]
+    assert FORTE_NAMES["6-Z3"].interval_vector == FORTE_NAMES["6-Z36"].interval_vector
+    assert FORTE_NAMES["6-Z29"].interval_vector == FORTE_NAMES["6-Z50"].interval_vector
+    assert FORTE_NAMES["6-35"].prime_form == (0, 2, 4, 6, 8, 10)
+    assert FORTE_NAMES["2-6"].prime_form == (0, 6)
+    assert FORTE_NAMES["0-1"].prime_form == ()
+    for set_class in SET_CLASSES:
+        assert SET_CLASSES[set_class.number] is set_class
+        assert find_prime_form(get_set_mask(set_class.prime_form)) == set_class.prime_form
+
+
+def test_scales_and_chords():
+    # Sets of the notes of scales and chords
+    major = get_notes_mask(get_scale("Eb", "major"))
+    assert get_forte_name(major) == "7-35"
+    assert get_prime_form(major) == (0, 1, 3, 5, 6, 8, 10)
+    assert get_interval_vector(major) == (2, 5, 4, 3, 6, 1)
+    assert get_normal_form(major) == (2, 3, 5, 7, 8, 10, 0)
+
+    assert get_forte_name(get_notes_mask(get_scale("A", "major pentatonic"))) == "5-35"
+    assert get_forte_name(get_notes_mask(get_scale("C", "melodic minor"))) == "7-34"
+    assert get_forte_name(get_notes_mask(get_scale("C", "harmonic minor"))) == "7-32"
+    assert get_forte_name(get_notes_mask(get_chord_notes("C"))) == "3-11"
+    assert get_forte_name(get_notes_mask(get_chord_notes("Dbo7"))) == "4-28"
+    assert get_forte_name(get_notes_mask(get_chord_notes("C#ø7"))) == "4-27"
+    assert get_forte_name(get_notes_mask(get_chord_notes("G7"))) == "4-27"
+    assert get_forte_name(get_notes_mask(get_chord_notes("Bb7b9"))) == "5-31"
+    assert get_set_class(get_notes_mask(["C", "E", "G#"])).interval_vector == (0, 0, 0, 3, 0, 0)
+
+
+def test_normal_and_prime_forms():
+    # Packed to the left, as in Forte's catalog (5-20 is (01378), not (01568))
+    assert find_normal_form(get_set_mask([8, 1, 5, 6, 0])) == (5, 6, 8, 0, 1)
+    assert get_prime_form(get_set_mask([0, 1, 5, 6, 8])) == (0, 1, 3, 7, 8)
+    assert find_normal_form(get_set_mask([0, 4, 8])) == (0, 4, 8)
+    assert find_normal_form(get_set_mask([1, 7])) == (1, 7)
+    assert find_normal_form(0) == get_normal_form(0) == ()
+    assert find_interval_vector(get_set_mask([0, 1, 4, 6])) == (1, 1, 1, 1, 1, 1)
+
+    # Every set has the properties of its set class
+    for mask in range(0, 4096, 7):
+        assert get_normal_form(mask) == find_normal_form(mask)
+        assert get_prime_form(mask) == find_prime_form(mask)
+        assert get_interval_vector(mask) == find_interval_vector(mask)
+
+    with pytest.raises(ValueError):
+        get_set_class(4096)
+    with pytest.raises(ValueError):
+        get_normal_form(-1)
+
+
+def test_equivalence():
+    c_major = get_notes_mask(["C", "E", "G"])
+    a_minor = get_notes_mask(["A", "C", "E"])
+    assert transpose_set(c_major, 2) == get_notes_mask(["D", "F#", "A"])
+    assert transpose_set(c_major, -12) == c_major
+    assert invert_set(c_major) == get_notes_mask(["C", "Ab", "F"])
+    assert invert_set(c_major, 4) == get_notes_mask(["E", "C", "A"])
+    assert is_transposition(c_major, transpose_set(c_major, 5))
+    assert not is_transposition(c_major, a_minor)
+    assert is_equivalent(c_major, a_minor)
+    assert not is_equivalent(c_major, get_notes_mask(["C", "Eb", "Gb"]))
+
+
+def test_batch():
+    masks = np.array([[get_notes_mask(["C", "E", "G"]), 0], [4095, get_notes_mask(get_scale("D", "dorian"))]])
+    assert get_forte_names(masks).tolist() == [["3-11", "0-1"], ["12-1", "7-35"]]
+    assert get_interval_vectors(masks).shape == (2, 2, 6)
+    assert get_interval_vectors(masks)[1, 1].tolist() == [2, 5, 4, 3, 6, 1]
+    assert get_prime_masks(masks)[0, 0] == get_set_mask((0, 3, 7))
+    assert get_set_class_numbers(masks)[0, 0] == FORTE_NAMES["3-11"].number
+
+    # The same as the functions on a single set, for every set
+    every = np.arange(4096)
+    assert get_set_class_numbers(every).tolist() == [get_set_class(mask).number for mask in range(4096)]
+    transposed = transpose_sets(every, 5)
+    assert transposed.tolist() == [transpose_set(mask, 5) for mask in range(4096)]
+    assert (get_transposition_masks(transposed) == get_transposition_masks(every)).all()
+    assert (get_set_class_numbers([]) == np.array([])).all()
+
+    for invalid in ([4096], [-1], [1.5]):
+        with pytest.raises(ValueError):
+            get_forte_names(invalid)
+
+
+def test_main():
+    command = [sys.executable, "set_theory.py"]
+    result = subprocess.run(command + ["-s", "d", "-t", "dorian"], capture_output=True, text=True)
+    assert result.returncode == 0
+    assert result.stdout.splitlines()[1:] == [
+        "Normal form: (E024579)",
+        "Prime form: (013568T)",
+        "Forte name: 7-35",
+        "Interval vector: <254361>",
+    ]
+    result = subprocess.run(command + ["-n", "C H"], capture_output=True, text=True)
+    assert result.returncode == 1 and "Invalid note: H" in result.stderr
@@ -0,0 +1,93 @@
+#!/usr/bin/env pytest
+# -*- coding: utf-8 -*-
+
+from snapshot import Theory_Snapshot, build_snapshot, get_registry_checksum, open_snapshot
+from project import Music_Theory, get_chord_notes, get_diatonic_harmony, get_scale
+import os
+import subprocess
+import sys
+
+
+def get_checksum():
+    return get_registry_checksum(Music_Theory.INTERVALS, Music_Theory.SCALE_CHORD_QUALITIES)
+
+
+def test_theory_snapshot():
+    snapshot = Theory_Snapshot(build_snapshot(Music_Theory), get_checksum())
+    for tonic in Music_Theory.get_valid_tonics():
+        for scale in Music_Theory.INTERVALS:
+            assert snapshot.get_scale(tonic, scale) == tuple(Music_Theory.compute_scale(tonic, scale))
+            assert snapshot.get_harmony(tonic, scale) == [
+                (chord.degree, chord.name, chord.root, chord.quality, chord.notes)
+                for chord in get_diatonic_harmony(tonic, scale)
+            ]
+        for suffix in ("", "m", "o", "+"):
+            assert list(snapshot.get_triad(tonic + suffix)) == get_chord_notes(tonic + suffix)
+
+    # Anything else is left to the computation
+    assert snapshot.get_scale("E###", "major") is None
+    assert snapshot.get_scale("C", "natural minor ") is None
+    assert snapshot.get_triad("Cm7") is None
+    assert snapshot.get_triad("H") is None
+    assert snapshot.get_triad("") is None
+
+
+def test_open_snapshot(tmp_path):
+    path = str(tmp_path / "theory.snapshot")
+    data = build_snapshot(Music_Theory)
+    with open(path, "wb") as file:
+        file.write(data)
+    assert open_snapshot(path, get_checksum()) is not None
+
+    # Stale (built for other scale types), missing, empty, truncated or damaged
+    assert open_snapshot(path, get_checksum() ^ 1) is None
+    assert open_snapshot(str(tmp_path / "missing"), get_checksum()) is None
+    for damaged in (b"", data[:10], data[:-1], b"X" + data[1:], data + b"\0"):
+        with open(path, "wb") as file:
+            file.write(damaged)
+        assert open_snapshot(path, get_checksum()) is None
+
+
+def test_load_snapshot(tmp_path):
+    path = str(tmp_path / "theory.snapshot")
+    with open(path, "wb") as file:
+        file.write(build_snapshot(Music_Theory))
+
+    expected = get_scale("Gb", "locrian"), get_diatonic_harmony("Gb", "locrian"), get_chord_notes("A#o")
+    Music_Theory.clear_scale_cache()
+    try:
+        assert Music_Theory.load_snapshot(path)
+        harmony = get_diatonic_harmony("Gb", "locrian")
+        assert get_scale("Gb", "locrian") == expected[0]
+        assert [chord.name for chord in harmony] == [chord.name for chord in expected[1]]
+        assert harmony[4].notes == expected[1][4].notes == ("Dbb", "Fb", "Abb")
+        assert get_chord_notes("A#o") == expected[2]
+        # Seventh chords, other tonics and other chords are still computed
+        assert get_diatonic_harmony("Gb", "locrian", sevenths=True)[0].name == "Gbø7"
+        assert get_scale("G###", "major")[1] == "A###"
+        assert get_chord_notes("C/E") == ["E", "G", "C"]
+
+        # A new scale type makes the snapshot stale
+        Music_Theory.register_scale("snapshot test", [1] * 10 + [2])
+        assert Music_Theory._snapshot is None
+        assert not Music_Theory.load_snapshot(path)
+    finally:
+        Music_Theory.load_snapshot(None)
+        Music_Theory.clear_scale_cache()
+
+
+def test_main(tmp_path):
+    path = str(tmp_path / "theory.snapshot")
+    result = subprocess.run([sys.executable, "snapshot.py", "-o", path], capture_output=True, text=True)
+    assert result.returncode == 0 and "bytes written" in result.stderr
+    assert os.listdir(tmp_path) == ["theory.snapshot"]
+
+    # Same output, with or without the snapshot, and with a stale one
+    command = [sys.executable, "project.py", "-s", "F#", "-t", "harmonic minor", "-d", "-v"]
+    outputs = set()
+    for variable, arguments in (("", []), (path, []), (path, ["--scales", str(tmp_path / "scales")])):
+        (tmp_path / "scales").write_text("snapshot test: 1 1 1 1 1 1 6\n")
+        environment = dict(os.environ, MUSIC_THEORY_SNAPSHOT=variable)
+        result = subprocess.run(command + arguments, capture_output=True, env=environment, check=True)
+        outputs.add(result.stdout)
+    assert len(outputs) == 1
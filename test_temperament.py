@@ -0,0 +1,128 @@
+#!/usr/bin/env pytest
+# -*- coding: utf-8 -*-
+
+from temperament import Temperament, get_temperament
+from project import Music_Theory, get_chord_notes, get_diatonic_chords
+import pytest
+import subprocess
+import sys
+
+
+def test_temperament():
+    # Tone, limma and sharp from the fifth closest to 3:2
+    assert [
+        (temperament.fifth, temperament.tone, temperament.limma, temperament.sharp)
+        for temperament in map(get_temperament, (12, 19, 24, 31, 53))
+    ] == [(7, 2, 1, 1), (11, 3, 2, 1), (14, 4, 2, 2), (18, 5, 3, 2), (31, 9, 4, 5)]
+    assert get_temperament(53) is get_temperament(53)
+    assert Temperament(12, fifth=7).naturals.tolist() == [0, 2, 4, 5, 7, 9, 11]
+    assert get_temperament(31).naturals.tolist() == [0, 5, 10, 13, 18, 23, 28]
+
+    # No chain of fifths to spell the notes, or a sharp lowering them
+    for divisions in (4, 5, 9, 13, 1201):
+        with pytest.raises(ValueError):
+            Temperament(divisions)
+
+
+def test_spelling():
+    assert get_temperament(12).get_tonics() == Music_Theory.CHROMATIC_SCALE["sharps"]
+    assert get_temperament(24).get_tonics()[:8] == ["C", "^C", "C#", "vD", "D", "^D", "D#", "vE"]
+    assert get_temperament(31).get_tonics()[:8] == ["C", "^C", "C#", "Db", "vD", "D", "^D", "D#"]
+    assert get_temperament(53).get_tonics()[:6] == ["C", "^C", "^^C", "vDb", "Db", "C#"]
+
+    temperament = get_temperament(24)
+    assert temperament.parse("vEb") == (2, -1, -1)
+    assert temperament.get_pitch("vEb") == 5
+    assert temperament.get_pitch("^^B#") == 2
+    assert temperament.render(2, -1, -1) == "vEb"
+    for name in ("^vC", "v", "^H", "C^"):
+        with pytest.raises(ValueError):
+            temperament.parse(name)
+
+
+def test_12_edo():
+    # The same notes as Music_Theory, for every scale and chord
+    temperament = get_temperament(12)
+    assert len(temperament.step_patterns) == len(Music_Theory.INTERVALS)
+    for tonic in Music_Theory.get_valid_tonics():
+        for scale in Music_Theory.INTERVALS:
+            assert temperament.get_scale(tonic, scale) == Music_Theory.compute_scale(tonic, scale)
+        for suffix in ("", "m", "o", "+", "7", "m7b5", "13#11", "7sus4(b9)", "6/9", "/E", "/Bb"):
+            assert temperament.get_chord_notes(tonic + suffix) == get_chord_notes(tonic + suffix)
+        assert temperament.get_diatonic_chords(tonic, "dorian") == get_diatonic_chords(tonic, "dorian")
+    assert temperament.get_scale("Fb", "major")[3] == "Bbb"
+    assert temperament.get_scale("E###", "Minor") == Music_Theory.compute_scale("E###", "minor")
+
+
+def test_scales():
+    temperament = get_temperament(31)
+    assert temperament.step_patterns["major"] == (5, 5, 3, 5, 5, 5, 3)
+    assert temperament.step_patterns["harmonic minor"] == (5, 3, 5, 5, 3, 7, 3)
+    assert temperament.step_patterns["blues"] == (8, 5, 3, 2, 8, 5)
+    assert temperament.get_scale("vE", "blues") == ["vE", "vG", "vA", "vBb", "vB", "vD", "vE"]
+    assert temperament.get_scale("C", "aeolian") == ["C", "D", "Eb", "F", "G", "Ab", "Bb", "C"]
+    assert temperament.get_diatonic_chords("D", "dorian") == ["Dm", "Em", "F", "G", "Am", "Bo", "C"]
+
+    # The notes of the other scales are spelled on the first letter at or above them
+    temperament = get_temperament(24)
+    assert temperament.register_scale("Rast", [4, 3, 3, 4, 4, 3, 3], ["rast maqam"]) == "rast"
+    assert temperament.get_scale("C", "rast maqam") == ["C", "D", "vE", "F", "G", "A", "vB", "C"]
+    assert temperament.get_scale("G", "rast") == ["G", "A", "vB", "C", "D", "E", "^F", "G"]
+    assert temperament.get_diatonic_chords("C", "rast") == ["Dm", "F"]
+    temperament.register_scale("quarter tones", [3, 3, 4, 3, 3, 8])
+    assert temperament.get_scale("C", "quarter tones") == ["C", "vD", "Eb", "F", "vG", "Ab", "C"]
+
+    for steps in ([4, 4], [24], [12, 12.0], [0, 12, 12]):
+        with pytest.raises(ValueError):
+            temperament.register_scale("invalid", steps)
+    with pytest.raises(ValueError):
+        temperament.register_scale("major", [2] * 12)
+    with pytest.raises(ValueError):
+        temperament.get_scale("C", "unknown")
+
+    # Scale types with notes on the same step are left out
+    assert "blues" not in get_temperament(7).step_patterns
+    assert get_temperament(7).get_scale("C", "harmonic minor") == ["C", "D", "E", "F", "G", "A", "B", "C"]
+
+
+def test_get_scales():
+    temperament = get_temperament(53)
+    tonics = temperament.get_tonics()
+    table = temperament.get_scales(tonics * 2, ["major", "lydian", "altered"])
+    assert len(table) == 53 * 2 * 3
+    assert table.key(3) == ("^C", "major")
+    assert table.notes(3) == ["^C", "^D", "^E", "^F", "^G", "^A", "^B", "^C"]
+    assert table.to_lists() == [temperament.get_scale(tonic, scale) for tonic, scale in table.keys()]
+    assert table.to_dict()[("vEb", "lydian")][3] == "vA"
+    assert temperament.get_scales([], ["major"]).to_lists() == []
+    with pytest.raises(ValueError):
+        temperament.get_scales(["C"], ["major", "blues"])
+
+
+def test_chords():
+    temperament = get_temperament(24)
+    assert temperament.get_chord_notes("vEbm7") == ["vEb", "vGb", "vBb", "vDb"]
+    assert temperament.get_chord_notes("^C#7b9") == ["^C#", "^E#", "^G#", "^B", "^D"]
+    assert temperament.get_chord_notes("C/vE") == ["vE", "C", "E", "G"]
+    assert temperament.get_chord_notes("Bbo7/Ab") == ["Ab", "Bb", "Db", "Fb", "Abb"]
+    assert get_temperament(53).get_chord_notes("C") == ["C", "E", "G"]
+    for chord in ("H", "Cx", "^", "C/^H"):
+        with pytest.raises(ValueError):
+            temperament.get_chord_notes(chord)
+
+
+def test_main():
+    command = [sys.executable, "temperament.py", "-e", "24"]
+    result = subprocess.run(
+        command + ["-s", "C", "--steps", "4 3 3 4 4 3 3", "-d"], capture_output=True, text=True
+    )
+    assert result.stdout == "C D vE F G A vB | Dm F\n"
+    result = subprocess.run(command + ["-a", "-t", "major pentatonic"], capture_output=True, text=True)
+    assert result.stdout.splitlines()[1] == "^C: ^C ^D ^E ^G ^A"
+    assert len(result.stdout.splitlines()) == 24
+    result = subprocess.run(command + ["-c", "vEbm7"], capture_output=True, text=True)
+    assert result.stdout == "vEb vGb vBb vDb\n"
+    result = subprocess.run(
+        [sys.executable, "temperament.py", "-e", "13", "-s", "C"], capture_output=True, text=True
+    )
+    assert result.returncode == 1 and "13-EDO" in result.stderr
@@ -0,0 +1,115 @@
+#!/usr/bin/env pytest
+# -*- coding: utf-8 -*-
+
+from transpose import (
+    Sheet_Transposer,
+    detect_sheet_key,
+    get_interval,
+    get_target_tonics,
+    read_sheet,
+    write_transposed,
+)
+import io
+import os
+import subprocess
+import sys
+
+SHEET = b"""key: G major
+G       D/F#    Em      C
+Amazing grace, how sweet the sound
+G          Bm7      C6/9  |  D7sus4\r
+[G]I once was [D]lost, but [Em]now am [X]found
+A man said hello
+"""
+
+
+def test_transpose_line():
+    # Up a major third (2 letters, 4 half-steps), from G to B
+    transposer = Sheet_Transposer(2, 4)
+    lines = [transposer.transpose_line(line) for line in SHEET.splitlines(keepends=True)]
+    assert b"".join(lines) == (
+        b"key: B major\n"
+        # The spaces after a longer chord absorb the difference, to stay above the same syllable
+        b"B       F#/A#   G#m     E\n"
+        b"Amazing grace, how sweet the sound\n"
+        b"B          D#m7     E6/9  |  F#7sus4\r\n"
+        b"[B]I once was [F#]lost, but [G#m]now am [X]found\n"
+        b"A man said hello\n"
+    )
+    # Shorter chords are padded, and a single space is always kept between two chords
+    assert Sheet_Transposer(0, 11).transpose_line(b"C#m  F#\n") == b"Cm   F\n"
+    assert Sheet_Transposer(0, 1).transpose_line(b"C F\n") == b"C# F#\n"
+    assert Sheet_Transposer(0, 1).transpose_line(b"\n") == b"\n"
+    assert Sheet_Transposer(0, 1).transpose_line(b"key: H major\n") == b"key: H major\n"
+
+    # Unicode sharps and flats take one column, whatever their size in bytes
+    transposer = Sheet_Transposer(1, 2)
+    assert transposer.transpose_line("F\u266fm   B\u266d/D  C\u266f\n".encode()) == b"G#m   C/E   D#\n"
+    assert transposer.transpose_line("key: f\u266f minor\n".encode()) == b"key: G# minor\n"
+
+
+def test_read_sheet(tmp_path):
+    path = tmp_path / "sheet.txt"
+    path.write_bytes(SHEET)
+    assert b"".join(read_sheet(str(path))) == SHEET
+    (tmp_path / "empty.txt").write_bytes(b"")
+    assert list(read_sheet(str(tmp_path / "empty.txt"))) == []
+
+
+def test_detect_sheet_key():
+    assert detect_sheet_key(SHEET.splitlines()) == ("G", "major")
+    assert detect_sheet_key([b"Eb Ab Bb7 Eb", b"lyrics", b"[Cm]more [Ab]lyrics"]) == ("Eb", "major")
+    assert detect_sheet_key([b"no chords at all"]) == ("C", "major")
+
+
+def test_get_target_tonics():
+    assert get_target_tonics(("G", "major"), 1) == ["Ab"]
+    assert get_target_tonics(("G", "minor"), 1) == ["G#"]
+    assert get_target_tonics(("E", "natural minor"), -2) == ["D"]
+    assert get_target_tonics(("C", "major"), all_keys=True) == [
+        "C",
+        "Db",
+        "D",
+        "Eb",
+        "E",
+        "F",
+        "F#",
+        "G",
+        "Ab",
+        "A",
+        "Bb",
+        "B",
+    ]
+    assert get_interval("G", "Ab") == (1, 1)
+    assert get_interval("A", "C") == (2, 3)
+    assert get_interval("C", "B") == (6, 11)
+
+
+def test_write_transposed():
+    output = io.BytesIO()
+    assert write_transposed(SHEET.splitlines(keepends=True), Sheet_Transposer(0, 0), output) == len(SHEET)
+    assert output.getvalue() == SHEET
+
+
+def test_main(tmp_path):
+    path = tmp_path / "grace.txt"
+    path.write_bytes(SHEET)
+    command = [sys.executable, "transpose.py", str(path)]
+    result = subprocess.run(command + ["-t", "Bb"], capture_output=True)
+    assert result.stdout.splitlines()[:2] == [b"key: Bb major", b"Bb      F/A     Gm      Eb"]
+    assert b"MB/s" in result.stderr
+
+    result = subprocess.run(command + ["--all-keys", "-o", str(tmp_path)], capture_output=True)
+    assert result.returncode == 0
+    assert len([name for name in os.listdir(tmp_path) if name.startswith("grace.")]) == 13
+    assert (tmp_path / "grace.G.txt").read_bytes() == SHEET
+    assert (tmp_path / "grace.Db.txt").read_bytes().startswith(b"key: Db major\nDb      Ab/C    Bbm     Gb\n")
+
+    result = subprocess.run(command + ["missing.txt", "-n", "2"], capture_output=True)
+    assert result.returncode == 1 and b"missing.txt" in result.stderr
+    assert result.stdout.startswith(b"key: A major\n")
+
+    # The sheet is not overwritten by its own transposition
+    result = subprocess.run(command + ["-n", "2", "-o", str(tmp_path)], capture_output=True)
+    assert result.returncode == 1 and b"overwrite" in result.stderr
+    assert path.read_bytes() == SHEET
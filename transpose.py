@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import mmap
+import os
+import re
+import sys
+import time
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Tuple
+
+from analysis import SEPARATORS, parse_key
+from project import Music_Theory, Note
+
+# Tokens remembered by a transposer (chords, and the words found not to be chords), and lines
+# of chords remembered with their transposition, up to these numbers, so that memory stays
+# bounded whatever the input
+TOKEN_CACHE_LIMIT = 65536
+LINE_CACHE_LIMIT = 16384
+
+# Number of chords used to detect the key of a file without a "key:" line
+DETECTION_CHORDS = 2000
+
+# Size of the output buffers: the output is written line by line
+OUTPUT_BUFFER = 1 << 20
+
+SEPARATOR_BYTES = {separator.encode() for separator in SEPARATORS}
+
+# Words and runs of whitespace of a chord line, and chords in square brackets (ChordPro)
+SEGMENTS = re.compile(rb"\S+|\s+")
+BRACKETED = re.compile(rb"\[([^\]\s]+)\]")
+
+
+class Sheet_Transposer:
+    """
+    Transposes the chords of a chord sheet by a fixed interval (a number of letters and a
+    number of half-steps, see Music_Theory.transpose_chord), one line (of bytes) at a time.
+
+    Only the chords are rewritten, everything else is copied byte for byte:
+        - lines made only of chords (and bar lines), usually written above the lyrics. When a
+          chord gets longer or shorter, the spaces that follow it absorb the difference, so
+          that the chords stay above the same syllables
+        - chords in square brackets, anywhere in a line (eg: "[Am]Hello [F/C]darkness")
+        - the tonic of the "key: G major" lines (see analysis.py)
+
+    """
+
+    __slots__ = ("steps", "half_steps", "tokens", "lines")
+
+    def __init__(self, steps: int, half_steps: int) -> None:
+        self.steps = steps
+        self.half_steps = half_steps
+        self.tokens: Dict[bytes, bytes | None] = {}
+        # Chord sheets repeat the same few chord lines over and over
+        self.lines: Dict[bytes, bytes] = {}
+
+    def transpose_token(self, token: bytes) -> bytes | None:
+        # The transposed chord, or None if the token is not a chord
+        transposed = self.tokens.get(token, b"")
+        if transposed != b"":
+            return transposed
+
+        try:
+            transposed = Music_Theory.transpose_chord(
+                token.decode("utf-8"), self.steps, self.half_steps
+            ).encode("utf-8")
+        except ValueError:
+            transposed = None
+        if len(self.tokens) < TOKEN_CACHE_LIMIT:
+            self.tokens[token] = transposed
+        return transposed
+
+    def is_chord_line(self, line: bytes) -> bool:
+        # A line of chords and bar lines, with at least one chord. Most lines of lyrics are
+        # rejected on their first word, without splitting the rest of the line.
+        first = line.split(None, 1)
+        if not first or (
+            first[0] not in SEPARATOR_BYTES and self.transpose_token(first[0]) is None
+        ):
+            return False
+
+        chords = False
+        for token in line.split():
+            if token in SEPARATOR_BYTES:
+                continue
+            if self.transpose_token(token) is None:
+                return False
+            chords = True
+        return chords
+
+    def find_chords(self, line: bytes) -> List[bytes]:
+        # The chords of a line, as written
+        if self.is_chord_line(line):
+            return [token for token in line.split() if token not in SEPARATOR_BYTES]
+        if b"[" in line:
+            return [
+                chord
+                for chord in BRACKETED.findall(line)
+                if self.transpose_token(chord) is not None
+            ]
+        return []
+
+    def transpose_line(self, line: bytes) -> bytes:
+        transposed = self.lines.get(line)
+        if transposed is not None:
+            return transposed
+
+        if line[:4].lower() == b"key:":
+            return self.transpose_key_line(line)
+
+        if self.is_chord_line(line):
+            body = line.rstrip(b"\r\n")
+            segments = []
+            # Number of columns the output is ahead of the input (negative when behind)
+            shift = 0
+            for segment in SEGMENTS.findall(body):
+                if segment.isspace():
+                    if shift:
+                        width = max(1, len(segment) - shift)
+                        shift -= len(segment) - width
+                        segment = b" " * width
+                elif segment not in SEPARATOR_BYTES:
+                    # (Every word of a chord line is a chord, see is_chord_line)
+                    transposed = self.transpose_token(segment) or segment
+                    shift += get_width(transposed) - get_width(segment)
+                    segment = transposed
+                segments.append(segment)
+            transposed = b"".join(segments) + line[len(body) :]
+        elif b"[" in line:
+            transposed = BRACKETED.sub(self.transpose_bracketed, line)
+        else:
+            return line
+
+        if len(self.lines) < LINE_CACHE_LIMIT:
+            self.lines[line] = transposed
+        return transposed
+
+    def transpose_bracketed(self, match: re.Match) -> bytes:
+        transposed = self.transpose_token(match.group(1))
+        return match.group(0) if transposed is None else b"[" + transposed + b"]"
+
+    def transpose_key_line(self, line: bytes) -> bytes:
+        # Only the tonic changes, the scale type stays the same. Invalid keys are left as is.
+        try:
+            tonic, _ = parse_key(line[4:].decode("utf-8"))
+        except ValueError:
+            return line
+        start = 4 + len(line[4:]) - len(line[4:].lstrip())
+        # (The tonic as written, which may be spelled differently, eg: "f\u266F")
+        end = start + len(line[start:].split(None, 1)[0])
+        transposed = Note.parse(tonic).transpose(self.steps, self.half_steps)
+        return line[:start] + str(transposed).encode() + line[end:]
+
+
+def get_width(token: bytes) -> int:
+    # Number of columns taken by a token: chords may be written with "\u266F" or "\u266D",
+    # which take one column but three bytes
+    return len(token) if token.isascii() else len(token.decode("utf-8"))
+
+
+def read_sheet(path: str) -> Iterator[bytes]:
+    # The lines of a file, read through a memory map: the file is never loaded as a whole,
+    # and the pages are shared by every pass over the same file (eg: one per target key)
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            # (Empty files can't be mapped)
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield from iter(data.readline, b"")
+
+
+def detect_sheet_key(lines: Iterable[bytes]) -> Tuple[str, str]:
+    # The key of a chord sheet: the first "key:" line, or the key detected from the first
+    # chords of the sheet. A sheet without any chord is in C major (it doesn't matter, as
+    # there is nothing to transpose).
+    finder = Sheet_Transposer(0, 0)
+    chords: List[str] = []
+    for line in lines:
+        if line[:4].lower() == b"key:":
+            try:
+                return parse_key(line[4:].decode("utf-8"))
+            except ValueError:
+                continue
+        chords.extend(chord.decode("utf-8") for chord in finder.find_chords(line))
+        if len(chords) >= DETECTION_CHORDS:
+            break
+
+    if not chords:
+        return "C", "major"
+    tonic, scale, _ = Music_Theory.detect_key(chords)[0]
+    return tonic, scale
+
+
+def get_target_tonics(
+    key: Tuple[str, str], semitones: int | None = None, all_keys: bool = False
+) -> List[str]:
+    # The tonic of the key that is a number of half-steps above the given key (or of all 12
+    # keys, starting with the given one), spelled with the fewest accidentals for its scale
+    # type (eg: "Db" rather than "C#" for a major key, but "C#" for a minor key)
+    tonic, scale = key
+    root = Note.parse(tonic)
+    return [
+        Music_Theory.get_preferred_tonic(str(root.transpose(0, half_steps)), scale)
+        for half_steps in (range(12) if all_keys else [semitones or 0])
+    ]
+
+
+def get_interval(tonic: str, target: str) -> Tuple[int, int]:
+    # (letters, half-steps) from a tonic up to another one
+    source = Note.parse(tonic)
+    destination = Note.parse(target)
+    return (
+        (destination.letter - source.letter) % 7,
+        (destination.pitch - source.pitch) % 12,
+    )
+
+
+def write_transposed(
+    lines: Iterable[bytes], transposer: Sheet_Transposer, output: BinaryIO
+) -> int:
+    # Transpose the lines as they are read, and write them to output as soon as they are
+    # transposed. Returns the number of bytes read.
+    size = 0
+    write = output.write
+    transpose_line = transposer.transpose_line
+    for line in lines:
+        size += len(line)
+        write(transpose_line(line))
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Transpose chord sheets: chord lines (above the lyrics), chords in square brackets ('[Am]') and 'key:' lines are rewritten, with the spelling of the destination key. Everything else is copied unchanged. Files are read through memory maps, so they can be of any size."
+    )
+    parser.add_argument("files", nargs="+", metavar="FILE", help="Chord sheets")
+    parser.add_argument(
+        "-k",
+        "--key",
+        dest="key",
+        help="KEY of the sheets (eg: 'Eb major', 'C# minor'). Default: the first 'key:' line of each sheet, or the key detected from its chords",
+    )
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument(
+        "-t",
+        "--to",
+        dest="to",
+        metavar="TONIC",
+        help="TONIC of the destination key (the scale type stays the same)",
+    )
+    target.add_argument(
+        "-n",
+        "--semitones",
+        dest="semitones",
+        type=int,
+        help="Transpose up by this number of SEMITONES (negative to go down)",
+    )
+    target.add_argument(
+        "--all-keys",
+        dest="all_keys",
+        action="store_true",
+        help="Transpose into ALL 12 KEYS (requires -o), one file per key: NAME.TONIC.EXT",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        dest="output",
+        metavar="DIRECTORY",
+        help="Write the transposed sheets to DIRECTORY (default: stdout)",
+    )
+    args = parser.parse_args()
+
+    if args.all_keys and not args.output:
+        parser.error("--all-keys requires an output directory (-o)")
+
+    try:
+        key = parse_key(args.key) if args.key else None
+        if args.to:
+            args.to = Note.normalize(args.to)
+    except ValueError as e:
+        print(f"Invalid key: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    # Transposers are shared by the files transposed by the same interval, with their cache
+    transposers: Dict[Tuple[int, int], Sheet_Transposer] = {}
+    size = errors = 0
+    started = time.perf_counter()
+    stdout = open(sys.stdout.fileno(), "wb", buffering=OUTPUT_BUFFER, closefd=False)
+
+    for path in args.files:
+        try:
+            file_key = key or detect_sheet_key(read_sheet(path))
+            if args.to:
+                targets = [args.to]
+            else:
+                targets = get_target_tonics(file_key, args.semitones, args.all_keys)
+
+            for target in targets:
+                interval = get_interval(file_key[0], target)
+                transposer = transposers.get(interval)
+                if transposer is None:
+                    transposer = transposers[interval] = Sheet_Transposer(*interval)
+
+                if not args.output:
+                    size += write_transposed(read_sheet(path), transposer, stdout)
+                    continue
+
+                name = os.path.basename(path)
+                if args.all_keys:
+                    stem, extension = os.path.splitext(name)
+                    name = f"{stem}.{target}{extension}"
+                # Opening the output truncates it: it must not be the sheet being read
+                destination = os.path.join(args.output, name)
+                if os.path.exists(destination) and os.path.samefile(path, destination):
+                    raise ValueError(
+                        f"the output would overwrite the sheet: {destination}"
+                    )
+                with open(destination, "wb", buffering=OUTPUT_BUFFER) as output:
+                    size += write_transposed(read_sheet(path), transposer, output)
+        except (OSError, ValueError) as e:
+            print(f"{path}: {e}", file=sys.stderr)
+            errors += 1
+
+    stdout.flush()
+    elapsed = time.perf_counter() - started
+
+    # The throughput goes to stderr, along with the errors, to keep the output clean
+    print(
+        f"{len(args.files)} files, {size / 1e6:.1f} MB transposed in {elapsed:.2f}s: "
+        f"{size / 1e6 / elapsed:.1f} MB/s",
+        file=sys.stderr,
+    )
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()